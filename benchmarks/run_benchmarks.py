@@ -0,0 +1,180 @@
+"""End-to-end benchmarks of the sync paths against the in-process fake Clockify and Library servers.
+
+    python -m benchmarks.run_benchmarks [--sizes small,medium,large] [--repeat 3] [--json results.json]
+
+Every benchmark runs offline.  Requests go over real HTTP to localhost, so the numbers include serialization and
+connection handling, plus any latency configured on the fake servers."""
+import argparse
+from collections import namedtuple
+import contextlib
+from datetime import date, timedelta
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+from fake_servers.fake_clockify_server import FakeClockifyServer
+from fake_servers.fake_polarion_server import FakePolarionServer
+from time_entry_tools.clockify_task_sync_service import ClockifyTaskSyncService
+from time_entry_tools.rate_limiter import TokenBucketRateLimiter
+from time_entry_tools.session_token_cache import SessionTokenCache
+from time_entry_tools.sync_snapshot_store import SyncSnapshotStore
+from time_entry_tools.workrecord import WorkRecord
+
+BenchmarkSize = namedtuple("BenchmarkSize", "name projects tasks_per_project records")
+BenchmarkResult = namedtuple("BenchmarkResult", "benchmark size items seconds requests")
+
+SIZES = {
+    "small": BenchmarkSize("small", 5, 20, 50),
+    "medium": BenchmarkSize("medium", 20, 50, 250),
+    "large": BenchmarkSize("large", 50, 100, 1000),
+}
+# Far above Clockify's real limit, so the benchmarks measure the tools rather than the rate limit
+UNLIMITED_REQUESTS_PER_SECOND = 100000
+
+
+def create_clockify_client(clockify_server: FakeClockifyServer, requests_per_second: float):
+    """Clockify client with its own rate limiter, so benchmarks do not share one"""
+    return clockify_server.create_client(rate_limiter=TokenBucketRateLimiter(requests_per_second,
+                                                                             max(1.0, requests_per_second / 10)))
+
+
+def populate_task_sync(library_server: FakePolarionServer, clockify_server: FakeClockifyServer,
+                       size: BenchmarkSize) -> None:
+    """Library work items for every task, with Clockify two thirds in sync: some tasks missing, some done"""
+    for project_index in range(size.projects):
+        project_name = "Project %d" % project_index
+        project = clockify_server.add_project(project_name)
+        for task_index in range(size.tasks_per_project):
+            workitem_id = "P%d-%d" % (project_index, task_index)
+            library_server.add_workitem(workitem_id, "Task %d" % task_index, project_name, library_server.user_name)
+            if task_index % 3 == 1:
+                clockify_server.add_task(project["id"], "%s - Task %d" % (workitem_id, task_index), "DONE")
+            elif task_index % 3 == 2:
+                clockify_server.add_task(project["id"], "%s - Task %d" % (workitem_id, task_index))
+
+
+def populate_time_entries(clockify_server: FakeClockifyServer, size: BenchmarkSize, days: int) -> None:
+    """Time entries spread over the days, a few per task and day"""
+    start = date(2021, 1, 1)
+    for index in range(size.records):
+        clockify_server.add_time_entry((start + timedelta(days=index % days)).isoformat(),
+                                       "WI-%d - Task" % (index % size.tasks_per_project), "entry %d" % index,
+                                       900 + index % 8 * 450)
+
+
+def timed(function: Callable[[], object]) -> float:
+    """Seconds taken by the function, with its progress output silenced"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        function()
+        return time.perf_counter() - started
+
+
+def bench_task_sync(size: BenchmarkSize, directory: str, latency_seconds: float,
+                    requests_per_second: float) -> List[BenchmarkResult]:
+    """ClockifyTaskSyncService.sync: a first sync that makes changes, then a resync with nothing to change"""
+    with FakePolarionServer(latency_seconds) as library_server, FakeClockifyServer(
+            latency_seconds=latency_seconds) as clockify_server:
+        populate_task_sync(library_server, clockify_server, size)
+        library_client = library_server.create_client(
+            session_token_cache=SessionTokenCache(os.path.join(directory, "sessions_%s.json" % size.name)))
+        clockify_client = create_clockify_client(clockify_server, requests_per_second)
+        snapshot_store = SyncSnapshotStore(os.path.join(directory, "snapshot_%s.db" % size.name))
+        items = size.projects * size.tasks_per_project
+        results = []
+        for benchmark in ("task_sync_initial", "task_sync_resync"):
+            requests_before = clockify_server.request_count + sum(library_server.operation_counts.values())
+            seconds = timed(ClockifyTaskSyncService(library_client, clockify_client, snapshot_store).sync)
+            results.append(BenchmarkResult(benchmark, size.name, items, seconds, clockify_server.request_count + sum(
+                library_server.operation_counts.values()) - requests_before))
+        snapshot_store.close()
+        clockify_client.close()
+        return results
+
+
+def bench_get_work_records(size: BenchmarkSize, latency_seconds: float,
+                           requests_per_second: float) -> List[BenchmarkResult]:
+    """ClockifyTimeEntryProvider.get_work_records over a quarter"""
+    with FakeClockifyServer(latency_seconds=latency_seconds) as clockify_server:
+        populate_time_entries(clockify_server, size, days=90)
+        clockify_client = create_clockify_client(clockify_server, requests_per_second)
+        work_records = []
+        seconds = timed(lambda: work_records.extend(clockify_client.get_work_records("2021-01-01T00:00:00",
+                                                                                     "2021-03-31T23:59:59.999999")))
+        clockify_client.close()
+        return [BenchmarkResult("get_work_records", size.name, len(work_records), seconds,
+                                clockify_server.request_count)]
+
+
+def bench_save_work_records(size: BenchmarkSize, directory: str, latency_seconds: float,
+                            save_workers: int) -> List[BenchmarkResult]:
+    """LibraryTimeEntryProvider.save_work_records, then saving the same records again (all already present)"""
+    with FakePolarionServer(latency_seconds) as library_server:
+        for task_index in range(size.tasks_per_project):
+            library_server.add_workitem("WI-%d" % task_index, "Task", "Project", library_server.user_name)
+        library_client = library_server.create_client(
+            save_workers=save_workers, reconcile_existing=True,
+            session_token_cache=SessionTokenCache(os.path.join(directory, "save_sessions_%s.json" % size.name)))
+        work_records = [WorkRecord((date(2021, 1, 1) + timedelta(days=index % 90)).isoformat(),
+                                   0.25 + index % 8 * 0.25, "WI-%d" % (index % size.tasks_per_project),
+                                   "entry %d" % index) for index in range(size.records)]
+        results = []
+        for benchmark in ("save_work_records", "save_work_records_existing"):
+            requests_before = sum(library_server.operation_counts.values())
+            seconds = timed(lambda: library_client.save_work_records(work_records))
+            results.append(BenchmarkResult(benchmark, size.name, len(work_records), seconds,
+                                           sum(library_server.operation_counts.values()) - requests_before))
+        return results
+
+
+def run_benchmarks(sizes: List[BenchmarkSize], repeat: int, latency_seconds: float, requests_per_second: float,
+                   save_workers: int) -> List[BenchmarkResult]:
+    """Run every benchmark for every size, keeping the fastest of the repeats"""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            runs = []
+            for run in range(repeat):
+                run_directory = os.path.join(directory, "%s_run%d" % (size.name, run))
+                os.makedirs(run_directory)
+                runs.append(bench_task_sync(size, run_directory, latency_seconds, requests_per_second) +
+                            bench_get_work_records(size, latency_seconds, requests_per_second) +
+                            bench_save_work_records(size, run_directory, latency_seconds, save_workers))
+            for repeats in zip(*runs):
+                results.append(min(repeats, key=lambda result: result.seconds))
+                print_result(results[-1], statistics.median(result.seconds for result in repeats))
+    return results
+
+
+def print_result(result: BenchmarkResult, median_seconds: float) -> None:
+    """One line per benchmark: time, throughput and request count"""
+    print("%-28s %-7s %7d items %9.3fs best %9.3fs median %10.1f items/s %6d requests" % (
+        result.benchmark, result.size, result.items, result.seconds, median_seconds,
+        result.items / result.seconds if result.seconds else 0.0, result.requests), flush=True)
+
+
+def main(argv=None) -> int:
+    """Main Program"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run_benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="small,medium", help="Comma separated sizes: %s" % ", ".join(SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each benchmark; the fastest is reported")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latency of every fake server request, seconds")
+    parser.add_argument("--requests_per_second", type=float, default=UNLIMITED_REQUESTS_PER_SECOND,
+                        help="Client side Clockify rate limit.  Use 10 to include Clockify's real limit.")
+    parser.add_argument("--save_workers", type=int, default=4, help="Concurrent Library writes")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+    results = run_benchmarks([SIZES[name] for name in args.sizes.split(",")], args.repeat, args.latency,
+                             args.requests_per_second, args.save_workers)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump([result._asdict() for result in results], file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
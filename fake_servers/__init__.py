@@ -0,0 +1 @@
+"""In-process stand-ins for the Clockify and Library servers, for tests and benchmarks.  Not part of the tools."""
@@ -0,0 +1,211 @@
+"""In-process stand-in for the Clockify REST API, for tests and benchmarks that must run offline"""
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import re
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from time_entry_tools.clockify_time_entry_provider import ClockifyTimeEntryProvider, TASK_STATUS_ACTIVE, \
+    TASK_STATUS_DONE
+
+_PROJECTS_PATH = re.compile(r"^/api/v1/workspaces/([^/]+)/projects$")
+_TASKS_PATH = re.compile(r"^/api/v1/workspaces/([^/]+)/projects/([^/]+)/tasks$")
+_TASK_PATH = re.compile(r"^/api/v1/workspaces/([^/]+)/projects/([^/]+)/tasks/([^/]+)$")
+_SUMMARY_REPORT_PATH = re.compile(r"^/reports/v1/workspaces/([^/]+)/reports/summary$")
+
+
+class FakeClockifyServer:
+    """Serves a single Clockify workspace over HTTP on localhost.
+    Supports the endpoints ClockifyTimeEntryProvider uses, with page/page-size pagination, a per API key request
+    limit answered with 429 Too Many Requests and Retry-After, and a configurable latency per request."""
+
+    def __init__(self, requests_per_second: float = None, latency_seconds: float = 0.0):
+        self.requests_per_second = requests_per_second
+        self.latency_seconds = latency_seconds
+        self.projects: List[dict] = []
+        self.tasks: Dict[str, List[dict]] = {}
+        self.time_entries: List[dict] = []
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self._ids = itertools.count(1)
+        self._recent_requests: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._http_server = ThreadingHTTPServer(("127.0.0.1", 0), self._create_handler())
+        self._http_server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server"""
+        return "http://127.0.0.1:%d" % self._http_server.server_address[1]
+
+    def start(self) -> "FakeClockifyServer":
+        """Start serving on a background thread"""
+        self._thread = threading.Thread(target=self._http_server.serve_forever, name="fake-clockify", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving"""
+        self._http_server.shutdown()
+        self._http_server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def create_client(self, api_key: str = "fake-api-key", workspace_id: str = "fake-workspace",
+                      **kwargs) -> ClockifyTimeEntryProvider:
+        """A ClockifyTimeEntryProvider talking to this server"""
+        return ClockifyTimeEntryProvider(api_key, workspace_id, api_url=self.url + "/api/v1",
+                                         reports_url=self.url + "/reports/v1", **kwargs)
+
+    def _new_id(self) -> str:
+        return "%024x" % next(self._ids)
+
+    def add_project(self, name: str) -> dict:
+        """Add a project to the workspace"""
+        with self._lock:
+            project = {"id": self._new_id(), "name": name}
+            self.projects.append(project)
+            self.tasks[project["id"]] = []
+        return project
+
+    def add_task(self, project_id: str, name: str, status: str = TASK_STATUS_ACTIVE) -> dict:
+        """Add a task to a project"""
+        with self._lock:
+            task = {"id": self._new_id(), "name": name, "projectId": project_id, "status": status}
+            self.tasks[project_id].append(task)
+        return task
+
+    def add_time_entry(self, date: str, task_name: str, description: str, duration_seconds: int) -> None:
+        """Add a time entry, shown in the summary report of its date (YYYY-MM-DD)"""
+        with self._lock:
+            self.time_entries.append({"date": date, "task_name": task_name, "description": description,
+                                      "duration": duration_seconds})
+
+    def _is_rate_limited(self, api_key: str) -> float:
+        """Seconds until the API key may send again, or 0 if this request is allowed"""
+        if not self.requests_per_second:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            recent = self._recent_requests.setdefault(api_key, deque())
+            while recent and now - recent[0] >= 1.0:
+                recent.popleft()
+            if len(recent) >= self.requests_per_second:
+                self.rate_limited_count += 1
+                return 1.0 - (now - recent[0])
+            recent.append(now)
+            return 0.0
+
+    def _get_summary_report(self, json_request: dict) -> dict:
+        first_date = json_request["dateRangeStart"][:10]
+        last_date = json_request["dateRangeEnd"][:10]
+        dates: Dict[str, Dict[str, list]] = {}
+        with self._lock:
+            for time_entry in self.time_entries:
+                if first_date <= time_entry["date"] <= last_date:
+                    dates.setdefault(time_entry["date"], {}).setdefault(time_entry["task_name"], []).append(
+                        {"name": time_entry["description"], "duration": time_entry["duration"]})
+        return {"groupOne": [{"name": date, "duration": sum(entry["duration"] for entries in tasks.values()
+                                                             for entry in entries),
+                              "children": [{"name": task_name, "duration": sum(entry["duration"] for entry in entries),
+                                            "children": entries}
+                                           for task_name, entries in tasks.items()]}
+                             for date, tasks in sorted(dates.items())]}
+
+    def _handle(self, method: str, path: str, query: Dict[str, List[str]], body: dict):
+        """Route a request.  Returns (status code, JSON response)."""
+        match = _PROJECTS_PATH.match(path)
+        if match and method == "GET":
+            return 200, self._get_page(self.projects, query)
+        if match and method == "POST":
+            return 201, self.add_project(body["name"])
+        match = _TASKS_PATH.match(path)
+        if match and match.group(2) not in self.tasks:
+            return 404, {"message": "Project not found"}
+        if match and method == "GET":
+            tasks = self.tasks[match.group(2)]
+            if "is-active" in query:
+                status = TASK_STATUS_ACTIVE if query["is-active"][0] == "true" else TASK_STATUS_DONE
+                tasks = [task for task in tasks if task["status"] == status]
+            return 200, self._get_page(tasks, query)
+        if match and method == "POST":
+            return 201, self.add_task(match.group(2), body["name"])
+        match = _TASK_PATH.match(path)
+        if match:
+            with self._lock:
+                tasks = self.tasks.get(match.group(2), [])
+                task = next((task for task in tasks if task["id"] == match.group(3)), None)
+                if task is None:
+                    return 404, {"message": "Task not found"}
+                if method == "PUT":
+                    task.update(name=body.get("name", task["name"]), status=body.get("status", task["status"]))
+                    return 200, task
+                if method == "DELETE":
+                    tasks.remove(task)
+                    return 200, task
+        if _SUMMARY_REPORT_PATH.match(path) and method == "POST":
+            return 200, self._get_summary_report(body)
+        return 404, {"message": "Not found"}
+
+    @staticmethod
+    def _get_page(items: list, query: Dict[str, List[str]]) -> list:
+        page = int(query.get("page", ["1"])[0])
+        page_size = int(query.get("page-size", ["50"])[0])
+        return items[(page - 1) * page_size:page * page_size]
+
+    def _create_handler(self):
+        fake_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Headers and body are written separately; do not wait on delayed ACKs
+
+            def _respond(self, method: str) -> None:
+                with fake_server._lock:
+                    fake_server.request_count += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                if fake_server.latency_seconds:
+                    time.sleep(fake_server.latency_seconds)
+                retry_after = fake_server._is_rate_limited(self.headers.get("x-api-key", ""))
+                if retry_after:
+                    status, response, headers = 429, {"message": "Too many requests"}, {
+                        "Retry-After": "%.3f" % retry_after}
+                else:
+                    url = urlparse(self.path)
+                    status, response = fake_server._handle(method, url.path, parse_qs(url.query), body)
+                    headers = {}
+                content = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def do_PUT(self):
+                self._respond("PUT")
+
+            def do_DELETE(self):
+                self._respond("DELETE")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
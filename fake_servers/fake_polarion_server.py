@@ -0,0 +1,373 @@
+"""In-process stand-in for the Library (Polarion) SOAP web services, for tests and benchmarks that must run offline"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from time_entry_tools.library_time_entry_provider import LibraryTimeEntryProvider
+
+SOAP_ENVELOPE_NAMESPACE = "http://schemas.xmlsoap.org/soap/envelope/"
+SESSION_HEADER_NAMESPACE = "http://ws.polarion.com/session"
+SERVICES_PATH = "/polarion/ws/services/"
+
+# Element types: (name, XSD type, repeated).  Types without an "xsd:" prefix are complex types of the service.
+_COMPLEX_TYPES = {
+    "Project": [("id", "xsd:string", False), ("name", "xsd:string", False)],
+    "User": [("id", "xsd:string", False), ("name", "xsd:string", False), ("uri", "xsd:string", False)],
+    "EnumOptionId": [("id", "xsd:string", False)],
+    "DurationTime": [("literal", "xsd:string", False)],
+    "WorkRecord": [("comment", "xsd:string", False), ("date", "xsd:date", False),
+                   ("timeSpent", "DurationTime", False), ("type", "EnumOptionId", False),
+                   ("uri", "xsd:string", False), ("user", "User", False)],
+    "ArrayOfWorkRecord": [("WorkRecord", "WorkRecord", True)],
+    "WorkItem": [("id", "xsd:string", False), ("project", "Project", False), ("title", "xsd:string", False),
+                 ("updated", "xsd:dateTime", False), ("uri", "xsd:string", False),
+                 ("workRecords", "ArrayOfWorkRecord", False)],
+}
+
+# Operations of each service: name -> (input elements, output element or None)
+_SERVICES = {
+    "SessionWebService": {
+        "logIn": ([("userName", "xsd:string", False), ("password", "xsd:string", False)], None),
+        "endSession": ([], None),
+    },
+    "TrackerWebService": {
+        "queryWorkItems": ([("query", "xsd:string", False), ("sort", "xsd:string", False),
+                            ("fields", "xsd:string", True)], ("queryWorkItemsReturn", "WorkItem", True)),
+        "queryWorkItemUris": ([("query", "xsd:string", False), ("sort", "xsd:string", False)],
+                              ("queryWorkItemUrisReturn", "xsd:string", True)),
+        "getModuleWorkItems": ([("moduleURI", "xsd:string", False), ("query", "xsd:string", False),
+                                ("deep", "xsd:boolean", False), ("fields", "xsd:string", True)],
+                               ("getModuleWorkItemsReturn", "WorkItem", True)),
+        "getModuleWorkItemUris": ([("moduleURI", "xsd:string", False), ("query", "xsd:string", False),
+                                   ("deep", "xsd:boolean", False)],
+                                  ("getModuleWorkItemUrisReturn", "xsd:string", True)),
+        "createWorkRecord": ([("workitemURI", "xsd:string", False), ("user", "User", False),
+                              ("date", "xsd:date", False), ("timeSpent", "xsd:string", False)], None),
+        "createWorkRecordWithTypeAndComment": ([("workitemURI", "xsd:string", False), ("user", "User", False),
+                                                ("date", "xsd:date", False), ("type", "EnumOptionId", False),
+                                                ("timeSpent", "xsd:string", False),
+                                                ("comment", "xsd:string", False)], None),
+        "getAllEnumOptionIdsForId": ([("projectId", "xsd:string", False), ("enumId", "xsd:string", False)],
+                                     ("getAllEnumOptionIdsForIdReturn", "EnumOptionId", True)),
+    },
+    "ProjectWebService": {
+        "getUser": ([("userId", "xsd:string", False)], ("getUserReturn", "User", False)),
+    },
+}
+
+
+def _element_xsd(name: str, xsd_type: str, repeated: bool) -> str:
+    type_name = xsd_type if xsd_type.startswith("xsd:") else "tns:" + xsd_type
+    return '<xsd:element name="%s" type="%s" minOccurs="0" maxOccurs="%s" nillable="true"/>' % (
+        name, type_name, "unbounded" if repeated else "1")
+
+
+def create_wsdl(service_name: str, location: str) -> str:
+    """WSDL of a fake Library service, in the document/literal wrapped style of the real one"""
+    namespace = "http://ws.polarion.com/" + service_name
+    operations = _SERVICES[service_name]
+    types = "".join('<xsd:complexType name="%s"><xsd:sequence>%s</xsd:sequence></xsd:complexType>' % (
+        name, "".join(_element_xsd(*element) for element in elements)) for name, elements in _COMPLEX_TYPES.items())
+    wrappers = ""
+    messages = ""
+    port_operations = ""
+    binding_operations = ""
+    for operation, (inputs, output) in operations.items():
+        wrappers += '<xsd:element name="%s"><xsd:complexType><xsd:sequence>%s</xsd:sequence></xsd:complexType>' \
+                    '</xsd:element>' % (operation, "".join(_element_xsd(*element) for element in inputs))
+        wrappers += '<xsd:element name="%sResponse"><xsd:complexType><xsd:sequence>%s</xsd:sequence>' \
+                    '</xsd:complexType></xsd:element>' % (operation, _element_xsd(*output) if output else "")
+        messages += '<wsdl:message name="%sRequest"><wsdl:part name="parameters" element="tns:%s"/></wsdl:message>' \
+                    '<wsdl:message name="%sResponse"><wsdl:part name="parameters" element="tns:%sResponse"/>' \
+                    '</wsdl:message>' % (operation, operation, operation, operation)
+        port_operations += '<wsdl:operation name="%s"><wsdl:input message="tns:%sRequest"/>' \
+                           '<wsdl:output message="tns:%sResponse"/></wsdl:operation>' % (operation, operation,
+                                                                                          operation)
+        binding_operations += '<wsdl:operation name="%s"><soap:operation soapAction=""/>' \
+                              '<wsdl:input><soap:body use="literal"/></wsdl:input>' \
+                              '<wsdl:output><soap:body use="literal"/></wsdl:output></wsdl:operation>' % operation
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" '
+            'xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+            'xmlns:tns="{ns}" targetNamespace="{ns}">'
+            '<wsdl:types><xsd:schema targetNamespace="{ns}" elementFormDefault="qualified">{types}{wrappers}'
+            '</xsd:schema></wsdl:types>{messages}'
+            '<wsdl:portType name="{service}">{port_operations}</wsdl:portType>'
+            '<wsdl:binding name="{service}SoapBinding" type="tns:{service}">'
+            '<soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>{binding_operations}'
+            '</wsdl:binding>'
+            '<wsdl:service name="{service}Service"><wsdl:port name="{service}" binding="tns:{service}SoapBinding">'
+            '<soap:address location="{location}"/></wsdl:port></wsdl:service>'
+            '</wsdl:definitions>').format(ns=namespace, types=types, wrappers=wrappers, messages=messages,
+                                          service=service_name, port_operations=port_operations,
+                                          binding_operations=binding_operations, location=location)
+
+
+def _to_xml(name: str, value, xsd_type: str, fields: List[str] = None) -> str:
+    """Serialize a value as a qualified element of the service namespace"""
+    if value is None:
+        return ""
+    if xsd_type.startswith("xsd:"):
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        return "<tns:%s>%s</tns:%s>" % (name, escape(str(value)), name)
+    content = ""
+    for element_name, element_type, repeated in _COMPLEX_TYPES[xsd_type]:
+        if fields is not None and element_name not in fields:
+            continue
+        element_value = value.get(element_name)
+        for item in (element_value or []) if repeated else [element_value]:
+            content += _to_xml(element_name, item, element_type)
+    return "<tns:%s>%s</tns:%s>" % (name, content, name)
+
+
+class FakeQueryError(Exception):
+    """A query the fake Library does not understand"""
+
+
+class FakePolarionServer:
+    """Serves the Session, Tracker and Project web services of a Library over HTTP on localhost.
+    Work items are matched by a subset of the Library query language: id:X, id:(X Y), assignee.id:X,
+    updated:[YYYYMMDD TO $today$] and HAS_VALUE:resolution, joined by AND.  Other clauses match every work item.
+    Requests without a valid session are rejected with a fault, and every request waits latency_seconds."""
+
+    def __init__(self, latency_seconds: float = 0.0, user_name: str = "fake-user", password: str = "fake-password"):
+        self.latency_seconds = latency_seconds
+        self.user_name = user_name
+        self.password = password
+        self.users: Dict[str, dict] = {}
+        self.workitems: Dict[str, dict] = {}
+        self.sessions = set()
+        self.operation_counts: Dict[str, int] = {}
+        self.wsdl_request_counts: Dict[str, int] = {}
+        self._responses_to_drop: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._http_server = ThreadingHTTPServer(("127.0.0.1", 0), self._create_handler())
+        self._http_server.daemon_threads = True
+        self.add_user(user_name)
+
+    @property
+    def url(self) -> str:
+        """Library server URL, as configured in config.cfg"""
+        return "http://127.0.0.1:%d/polarion" % self._http_server.server_address[1]
+
+    def start(self) -> "FakePolarionServer":
+        """Start serving on a background thread"""
+        threading.Thread(target=self._http_server.serve_forever, name="fake-polarion", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving"""
+        self._http_server.shutdown()
+        self._http_server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def create_client(self, library_workitem_query: str = "NOT HAS_VALUE:resolution", **kwargs) \
+            -> LibraryTimeEntryProvider:
+        """A LibraryTimeEntryProvider talking to this server"""
+        kwargs.setdefault("wsdl_cache_days", 0)
+        return LibraryTimeEntryProvider(self.url, self.user_name, self.password, library_workitem_query, **kwargs)
+
+    def drop_responses(self, operation: str, count: int = 1) -> None:
+        """Carry out the next count calls of an operation, but close the connection instead of answering, as when a
+        response is lost on the network"""
+        with self._lock:
+            self._responses_to_drop[operation] = count
+
+    def add_user(self, user_id: str) -> dict:
+        """Add a Library user"""
+        user = {"id": user_id, "name": user_id, "uri": "subterra:data-service:objects:/default/${User}" + user_id}
+        self.users[user_id] = user
+        return user
+
+    def add_workitem(self, workitem_id: str, title: str, project_name: str, assignee: str,
+                     updated: str = "2021-03-01T12:00:00", resolved: bool = False) -> dict:
+        """Add a work item assigned to a user"""
+        workitem = {"id": workitem_id, "title": title, "project": {"id": project_name.lower(), "name": project_name},
+                    "uri": "subterra:data-service:objects:/default/%s${WorkItem}%s" % (project_name, workitem_id),
+                    "updated": updated, "assignee": assignee, "resolved": resolved, "workRecords": {"WorkRecord": []}}
+        with self._lock:
+            self.workitems[workitem_id] = workitem
+        return workitem
+
+    def add_work_record(self, workitem_id: str, user_id: str, date: str, time_spent: str, comment: str = None) -> None:
+        """Add a work record to a work item"""
+        with self._lock:
+            self.workitems[workitem_id]["workRecords"]["WorkRecord"].append({
+                "uri": "subterra:data-service:objects:/default/${WorkRecord}%d" % next(self._ids),
+                "date": date, "timeSpent": {"literal": time_spent}, "comment": comment,
+                "user": {"uri": self.users[user_id]["uri"]}, "type": {"id": "admin"}})
+
+    def get_work_records(self, workitem_id: str) -> List[dict]:
+        """Work records of a work item"""
+        return self.workitems[workitem_id]["workRecords"]["WorkRecord"]
+
+    def query(self, query: str) -> List[dict]:
+        """Work items matching a query"""
+        predicates = []
+        for clause in re.split(r"\s+AND\s+", query.strip()):
+            negate = clause.startswith("NOT ")
+            clause = clause[4:] if negate else clause
+            predicate = self._parse_clause(clause)
+            predicates.append((lambda workitem, p=predicate: not p(workitem)) if negate else predicate)
+        with self._lock:
+            return sorted((workitem for workitem in self.workitems.values()
+                           if all(predicate(workitem) for predicate in predicates)), key=lambda item: item["id"])
+
+    @staticmethod
+    def _parse_clause(clause: str):
+        match = re.fullmatch(r"id:\((.*)\)", clause)
+        if match:
+            ids = set(match.group(1).split())
+            return lambda workitem: workitem["id"] in ids
+        match = re.fullmatch(r"id:(\S+)", clause)
+        if match:
+            return lambda workitem: workitem["id"] == match.group(1)
+        match = re.fullmatch(r"assignee\.id:(\S+)", clause)
+        if match:
+            return lambda workitem: workitem["assignee"] == match.group(1)
+        match = re.fullmatch(r"updated:\[(\d{8}) TO \$today\$\]", clause)
+        if match:
+            since = "%s-%s-%s" % (match.group(1)[:4], match.group(1)[4:6], match.group(1)[6:])
+            return lambda workitem: workitem["updated"][:10] >= since
+        if clause == "HAS_VALUE:resolution":
+            return lambda workitem: workitem["resolved"]
+        return lambda workitem: True
+
+    def _call(self, service_name: str, operation: str, arguments: Dict[str, list], session_id: str):
+        """Run an operation.  Returns the response element content."""
+        if service_name == "SessionWebService" and operation == "logIn":
+            if arguments["userName"] != [self.user_name] or arguments["password"] != [self.password]:
+                raise PermissionError("Authentication failed: invalid user name or password")
+            return None
+        if session_id not in self.sessions:
+            raise PermissionError("Not authorized.")
+        if operation == "getUser":
+            return self.users.get(arguments["userId"][0])
+        if operation in ("queryWorkItems", "getModuleWorkItems"):
+            return [{field: workitem.get(field) for field in arguments.get("fields", [])}
+                    for workitem in self.query(arguments["query"][0])]
+        if operation in ("queryWorkItemUris", "getModuleWorkItemUris"):
+            return [workitem["uri"] for workitem in self.query(arguments["query"][0])]
+        if operation in ("createWorkRecord", "createWorkRecordWithTypeAndComment"):
+            workitem = next((workitem for workitem in self.workitems.values()
+                             if workitem["uri"] == arguments["workitemURI"][0]), None)
+            if workitem is None:
+                raise LookupError("Work item %s does not exist" % arguments["workitemURI"][0])
+            self.add_work_record(workitem["id"], arguments["user"][0], arguments["date"][0],
+                                 arguments["timeSpent"][0], (arguments.get("comment") or [None])[0])
+            return None
+        if operation == "getAllEnumOptionIdsForId":
+            return [{"id": "admin"}, {"id": "development"}]
+        return None
+
+    def _handle_soap_request(self, service_name: str, body: bytes) -> Optional[Tuple[int, str]]:
+        """Status and content of the response, or None to drop it"""
+        envelope = etree.fromstring(body)
+        session_element = envelope.find(".//{%s}sessionID" % SESSION_HEADER_NAMESPACE)
+        request = envelope.find("{%s}Body" % SOAP_ENVELOPE_NAMESPACE)[0]
+        operation = etree.QName(request).localname
+        arguments = {}
+        for argument in request:
+            name = etree.QName(argument).localname
+            ## Complex arguments (the user) are passed by id
+            value = argument.findtext("{*}id") if len(argument) else argument.text
+            arguments.setdefault(name, []).append(value)
+        with self._lock:
+            self.operation_counts[operation] = self.operation_counts.get(operation, 0) + 1
+        try:
+            result = self._call(service_name, operation, arguments,
+                                session_element.text if session_element is not None else None)
+        except (PermissionError, LookupError, FakeQueryError) as error:
+            return 500, self._envelope("", '<soapenv:Fault><faultcode>soapenv:Server</faultcode>'
+                                           '<faultstring>%s</faultstring></soapenv:Fault>' % escape(str(error)))
+        with self._lock:
+            responses_to_drop = self._responses_to_drop.get(operation, 0)
+            if responses_to_drop:
+                self._responses_to_drop[operation] = responses_to_drop - 1
+        if responses_to_drop:
+            return None
+        header = ""
+        if operation == "logIn":
+            session_id = "session-%d" % next(self._ids)
+            with self._lock:
+                self.sessions.add(session_id)
+            header = '<ns1:sessionID xmlns:ns1="%s">%s</ns1:sessionID>' % (SESSION_HEADER_NAMESPACE, session_id)
+        output = _SERVICES[service_name][operation][1]
+        content = ""
+        if output is not None:
+            name, xsd_type, repeated = output
+            fields = arguments.get("fields") if xsd_type == "WorkItem" else None
+            content = "".join(_to_xml(name, item, xsd_type, fields) for item in (result or [] if repeated else [result]))
+        return 200, self._envelope(header, '<tns:%sResponse xmlns:tns="http://ws.polarion.com/%s">%s</tns:%sResponse>'
+                                   % (operation, service_name, content, operation))
+
+    @staticmethod
+    def _envelope(header: str, body: str) -> str:
+        return ('<?xml version="1.0" encoding="UTF-8"?><soapenv:Envelope xmlns:soapenv="%s"><soapenv:Header>%s'
+                '</soapenv:Header><soapenv:Body>%s</soapenv:Body></soapenv:Envelope>' % (SOAP_ENVELOPE_NAMESPACE,
+                                                                                         header, body))
+
+    def _create_handler(self):
+        fake_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Headers and body are written separately; do not wait on delayed ACKs
+
+            def _send(self, status: int, content: str, content_type: str) -> None:
+                data = content.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _get_service_name(self):
+                path = urlparse(self.path).path
+                service_name = path[len(SERVICES_PATH):] if path.startswith(SERVICES_PATH) else None
+                return service_name if service_name in _SERVICES else None
+
+            def do_GET(self):
+                service_name = self._get_service_name()
+                if service_name is None:
+                    self._send(404, "Not found", "text/plain")
+                    return
+                with fake_server._lock:
+                    fake_server.wsdl_request_counts[service_name] = \
+                        fake_server.wsdl_request_counts.get(service_name, 0) + 1
+                location = "http://%s:%d%s%s" % (*fake_server._http_server.server_address[:2], SERVICES_PATH,
+                                                 service_name)
+                self._send(200, create_wsdl(service_name, location), "text/xml; charset=utf-8")
+
+            def do_POST(self):
+                service_name = self._get_service_name()
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if fake_server.latency_seconds:
+                    time.sleep(fake_server.latency_seconds)
+                if service_name is None:
+                    self._send(404, "Not found", "text/plain")
+                    return
+                response = fake_server._handle_soap_request(service_name, body)
+                if response is None:
+                    self.close_connection = True
+                    return
+                self._send(*response, "text/xml; charset=utf-8")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
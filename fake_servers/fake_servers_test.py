@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+from fake_servers.fake_clockify_server import FakeClockifyServer
+from fake_servers.fake_polarion_server import FakePolarionServer
+from time_entry_tools.clockify_task_sync_service import ClockifyTaskSyncService
+from time_entry_tools.import_journal import ImportJournal
+from time_entry_tools.library_work_record_sync_service import LibraryWorkRecordSyncService, resume_imports
+from time_entry_tools.rate_limiter import TokenBucketRateLimiter
+from time_entry_tools.session_token_cache import SessionTokenCache
+from time_entry_tools.sync_snapshot_store import SyncSnapshotStore
+from time_entry_tools.time_entry_provider import SAVE_RETRY, SAVE_SKIPPED, SAVE_SUCCESS
+from time_entry_tools.work_record_ledger import WorkRecordLedger
+from time_entry_tools.workrecord import WorkRecord
+
+
+class ListClockifyClient:
+    def __init__(self, work_records):
+        self.work_records = work_records
+
+    def get_work_records(self, start_date, end_date):
+        return list(self.work_records)
+
+
+class FakeServersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.session_token_cache = SessionTokenCache(os.path.join(self.directory.name, "sessions.json"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_clockify_429_responses_are_retried(self):
+        with FakeClockifyServer(requests_per_second=20) as clockify_server:
+            for index in range(5):
+                clockify_server.add_project("Project %d" % index)
+            clockify_client = clockify_server.create_client(rate_limiter=TokenBucketRateLimiter(1000, 1000),
+                                                            page_size=2)
+            for _ in range(10):
+                self.assertEqual(5, len(clockify_client.get_projects()))
+            clockify_client.close()
+            self.assertGreater(clockify_server.rate_limited_count, 0)
+
+    def test_save_work_records_skips_existing_and_logs_in_again(self):
+        with FakePolarionServer() as library_server:
+            library_server.add_workitem("WI-1", "Design", "Alpha", library_server.user_name)
+            library_server.add_work_record("WI-1", library_server.user_name, "2021-03-01", "1 1/4h", "design")
+            library_client = library_server.create_client(session_token_cache=self.session_token_cache,
+                                                          reconcile_existing=True)
+            self.assertEqual(1, len(library_client.get_workitems_for_user()))
+            library_server.sessions.clear()
+            results = library_client.save_work_records([WorkRecord("2021-03-01", 1.25, "WI-1", "design"),
+                                                        WorkRecord("2021-03-02", 2.0, "WI-1", "build")])
+            self.assertEqual([SAVE_SKIPPED, SAVE_SUCCESS], [result.status for result in results])
+            self.assertEqual(2, len(library_server.get_work_records("WI-1")))
+            self.assertEqual(2, library_server.operation_counts["logIn"])
+
+    def test_save_workers_keep_their_clients_between_saves(self):
+        with FakePolarionServer() as library_server:
+            library_server.add_workitem("WI-1", "Design", "Alpha", library_server.user_name)
+            with library_server.create_client(session_token_cache=self.session_token_cache,
+                                              save_workers=4) as library_client:
+                created_polarions = []
+                create_polarion = library_client.create_polarion
+                library_client.create_polarion = lambda: created_polarions.append(1) or create_polarion()
+                for day in (1, 2):
+                    results = library_client.save_work_records([WorkRecord("2021-03-%02d" % day, 0.25, "WI-1",
+                                                                           "entry %d" % index) for index in range(8)])
+                    self.assertEqual({SAVE_SUCCESS}, {result.status for result in results})
+                    if day == 1:
+                        wsdl_request_counts = dict(library_server.wsdl_request_counts)
+                        worker_count = len(created_polarions)
+            self.assertEqual(wsdl_request_counts, library_server.wsdl_request_counts)
+            self.assertEqual(worker_count, len(created_polarions))
+            self.assertLessEqual(worker_count, 4)
+            self.assertEqual(16, len(library_server.get_work_records("WI-1")))
+
+    def test_resume_does_not_save_again_a_write_whose_response_was_lost(self):
+        ledger = WorkRecordLedger(os.path.join(self.directory.name, "ledger.db"))
+        journal = ImportJournal(os.path.join(self.directory.name, "journal.db"))
+        with FakePolarionServer() as library_server:
+            library_server.add_workitem("WI-1", "Design", "Alpha", library_server.user_name)
+            library_server.drop_responses("createWorkRecordWithTypeAndComment")
+            library_client = library_server.create_client(session_token_cache=self.session_token_cache)
+            work_records = [WorkRecord("2021-03-01", 0.5, "WI-1", "call"),
+                            WorkRecord("2021-03-01", 0.5, "WI-1", "call"),
+                            WorkRecord("2021-03-02", 2.0, "WI-1", "design")]
+            results = LibraryWorkRecordSyncService(library_client, ListClockifyClient(work_records), "2021-03-01",
+                                                   "2021-03-02", ledger, journal=journal).sync()
+            self.assertEqual([SAVE_RETRY, SAVE_SUCCESS, SAVE_SUCCESS], [result.status for result in results])
+            self.assertEqual(3, len(library_server.get_work_records("WI-1")))
+
+            self.assertEqual([], resume_imports(library_client, journal, ledger))
+            self.assertEqual(3, len(library_server.get_work_records("WI-1")))
+            self.assertEqual([], journal.get_unfinished_import_ids(library_server.user_name))
+            self.assertEqual([SAVE_SKIPPED, SAVE_SUCCESS, SAVE_SUCCESS],
+                             [entry.status for entry in journal.get_entries(1)])
+            library_client.close()
+        ledger.close()
+        journal.close()
+
+    def test_workitems_are_fetched_a_page_at_a_time(self):
+        with FakePolarionServer() as library_server:
+            for index in range(5):
+                library_server.add_workitem("WI-%d" % index, "Task %d" % index, "Alpha", library_server.user_name)
+            library_server.add_workitem("WI-9", "Someone else's", "Alpha", "someone-else")
+            library_client = library_server.create_client(session_token_cache=self.session_token_cache)
+            workitems = library_client.polarion.iter_workitems_for_user(library_server.user_name, page_size=2)
+            self.assertEqual(["WI-0", "WI-1", "WI-2", "WI-3", "WI-4"], [workitem.id for workitem in workitems])
+            self.assertEqual(1, library_server.operation_counts["queryWorkItemUris"])
+            self.assertEqual(3, library_server.operation_counts["queryWorkItems"])
+
+    def test_task_sync_brings_clockify_in_line_with_the_library(self):
+        with FakePolarionServer() as library_server, FakeClockifyServer() as clockify_server:
+            library_server.add_workitem("WI-1", "Design", "Alpha", library_server.user_name)
+            library_server.add_workitem("WI-2", "Build", "Beta", library_server.user_name)
+            alpha = clockify_server.add_project("Alpha")
+            clockify_server.add_task(alpha["id"], "WI-9 - Resolved")
+            library_client = library_server.create_client(session_token_cache=self.session_token_cache)
+            clockify_client = clockify_server.create_client(rate_limiter=TokenBucketRateLimiter(1000, 1000))
+            snapshot_store = SyncSnapshotStore(os.path.join(self.directory.name, "snapshot.db"))
+            ClockifyTaskSyncService(library_client, clockify_client, snapshot_store).sync()
+            plan = ClockifyTaskSyncService(library_client, clockify_client, snapshot_store).sync(dry_run=True)
+            snapshot_store.close()
+            clockify_client.close()
+            self.assertTrue(plan.is_empty())
+            self.assertEqual({"Alpha", "Beta"}, {project["name"] for project in clockify_server.projects})
+            self.assertEqual({("WI-1 - Design", "ACTIVE"), ("WI-9 - Resolved", "DONE")},
+                             {(task["name"], task["status"]) for task in clockify_server.tasks[alpha["id"]]})
+
+
+if __name__ == '__main__':
+    unittest.main()
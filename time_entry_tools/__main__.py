@@ -0,0 +1,204 @@
+"""Headless command line entry point: python -m time_entry_tools {import,resume,sync,export,team-sync}
+
+Only the standard library is imported at startup.  The Clockify/Library clients (requests, zeep, lxml) are imported by
+the command that needs them, and the GUI stack (Gooey, wxPython, PySimpleGUI) is never imported."""
+import argparse
+import configparser
+from datetime import datetime
+import getpass
+import os
+import sys
+
+PASSWORD_ENVIRONMENT_VARIABLE = "LIBRARY_PASSWORD"
+
+
+def parse_start_date(date: str) -> datetime:
+    """Beginning of the selected day"""
+    return datetime.strptime(date, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_end_date(date: str) -> datetime:
+    """End of the selected day"""
+    return datetime.strptime(date, "%Y-%m-%d").replace(hour=23, minute=59, second=59, microsecond=999999)
+
+
+def get_password(args) -> str:
+    """Library password from the command line, the environment, or a prompt"""
+    return args.password or os.environ.get(PASSWORD_ENVIRONMENT_VARIABLE) or getpass.getpass("Library password: ")
+
+
+def get_confirmation(prompt: str, assume_yes: bool) -> bool:
+    """Ask the user to confirm on the terminal, unless --yes was given"""
+    if assume_yes:
+        return True
+    return input(prompt + " [y/N] ").strip().lower() in ("y", "yes")
+
+
+def create_clients(args, config):
+    """Create the Library and Clockify clients.  Imports the HTTP and SOAP stacks."""
+    from time_entry_tools.client_factory import create_clockify_client, create_library_client
+    return create_library_client(config, args.user_name, get_password(args)), create_clockify_client(config)
+
+
+def run_import(args, config) -> int:
+    """Import work records from Clockify to the Library"""
+    from time_entry_tools.client_factory import create_work_record_sync_service
+    from time_entry_tools.time_entry_provider import SAVED_STATUSES
+
+    start_date = parse_start_date(args.start_date)
+    end_date = parse_end_date(args.end_date)
+    print("Starting Date: %s" % start_date.isoformat(), flush=True)
+    print("Ending Date: %s" % end_date.isoformat(), flush=True)
+
+    library_client, clockify_client = create_clients(args, config)
+    ## Without a confirmation prompt nothing has to be shown first, so the WorkRecords are saved as they are fetched
+    work_record_sync_service = create_work_record_sync_service(library_client, clockify_client,
+                                                               start_date.isoformat(), end_date.isoformat(),
+                                                               skip_imported=not args.force, prefetch=not args.yes)
+    if not args.yes:
+        work_record_sync_service.show_work_records_to_sync()
+        if not work_record_sync_service.work_records:
+            print("Nothing to import", flush=True)
+            return 0
+        if not get_confirmation("Continue with Import to Library?", args.yes):
+            print("Library Import Cancelled")
+            return 1
+
+    results = work_record_sync_service.sync()
+    if not all(result.status in SAVED_STATUSES for result in results):
+        print("Some WorkRecords were not saved to the Library.  Run the resume command to retry them.", flush=True)
+        return 1
+    return 0
+
+
+def run_resume(args, config) -> int:
+    """Finish interrupted imports from the import journal, fetching the dates they never fetched from Clockify"""
+    from time_entry_tools.import_journal import ImportJournal
+    from time_entry_tools.library_work_record_sync_service import resume_imports
+    from time_entry_tools.time_entry_provider import SAVED_STATUSES
+    from time_entry_tools.work_record_ledger import WorkRecordLedger
+
+    library_client, clockify_client = create_clients(args, config)
+    journal = ImportJournal()
+    if not journal.get_unfinished_import_ids(library_client.library_user):
+        print("No unfinished imports to resume", flush=True)
+        return 0
+    results = resume_imports(library_client, journal, WorkRecordLedger(), clockify_client)
+    return 0 if all(result.status in SAVED_STATUSES for result in results) else 1
+
+
+def run_sync(args, config) -> int:
+    """Sync tasks and projects from the Library to Clockify"""
+    import asyncio
+    from time_entry_tools.client_factory import create_task_sync_service
+
+    library_client, clockify_client = create_clients(args, config)
+    with create_task_sync_service(library_client, clockify_client) as task_sync_service:
+        plan = asyncio.run(task_sync_service.sync_async(dry_run=args.dry_run))
+    return 1 if plan.failed_operations else 0
+
+
+def run_export(args, config) -> int:
+    """Export the user's Library tasks to a CSV file"""
+    from time_entry_tools.client_factory import create_library_client
+    from time_entry_tools.library_task_export import export_library_tasks_to_file
+
+    library_client = create_library_client(config, args.user_name, get_password(args))
+    export_library_tasks_to_file(library_client, args.output_file)
+    print("Exported Library tasks to %s" % args.output_file, flush=True)
+    return 0
+
+
+def run_team_sync(args, config) -> int:
+    """Sync tasks, and optionally import work records, for every member of a team roster"""
+    from time_entry_tools.team_sync import TeamSyncService, read_roster
+
+    start_date = end_date = None
+    if args.import_work_records:
+        start_date = parse_start_date(args.start_date).isoformat()
+        end_date = parse_end_date(args.end_date).isoformat()
+    team_sync_service = TeamSyncService(config, args.user_name, get_password(args), read_roster(args.roster),
+                                        max_workers=args.workers)
+    results = team_sync_service.sync(sync_tasks=not args.skip_task_sync, start_date=start_date, end_date=end_date,
+                                     dry_run=args.dry_run)
+    return 0 if all(result.succeeded for result in results) else 1
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """Command line arguments for every subcommand"""
+    today = datetime.today().strftime("%Y-%m-%d")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("user_name", help="Your library user name", type=str)
+    common.add_argument("-p", "--password", help="Your library password.  Defaults to the %s environment variable, "
+                                                 "otherwise you are prompted" % PASSWORD_ENVIRONMENT_VARIABLE)
+    common.add_argument("-c", "--config", help="Configuration file", default="config.cfg")
+    common.add_argument("--metrics_file", help="At the end of the run, write request metrics to this file: a "
+                                               "Prometheus textfile if it ends in .prom, otherwise JSON")
+
+    parser = argparse.ArgumentParser(prog="python -m time_entry_tools", description="Time Entry Export/Import")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", parents=[common],
+                                          help="Import work records from Clockify to the Library")
+    import_parser.add_argument("-s", "--start_date", help="Beginning date for time entry (inclusive). "
+                                                          "Format YYYY-MM-DD", default=today)
+    import_parser.add_argument("-e", "--end_date", help="End date for time entry (inclusive). Format YYYY-MM-DD",
+                               default=today)
+    import_parser.add_argument("-y", "--yes", help="Do not ask for confirmation before importing",
+                               action="store_true")
+    import_parser.add_argument("-f", "--force", help="Also import WorkRecords that were already imported",
+                               action="store_true")
+    import_parser.set_defaults(run=run_import)
+
+    resume_parser = subparsers.add_parser("resume", parents=[common],
+                                          help="Finish imports that were interrupted or had failed WorkRecords")
+    resume_parser.set_defaults(run=run_resume)
+
+    sync_parser = subparsers.add_parser("sync", parents=[common], help="Sync tasks/projects from the Library to "
+                                                                       "Clockify")
+    sync_parser.add_argument("-d", "--dry_run", help="Only show the changes a sync would make", action="store_true")
+    sync_parser.set_defaults(run=run_sync)
+
+    export_parser = subparsers.add_parser("export", parents=[common], help="Export your Library tasks to CSV")
+    export_parser.add_argument("-o", "--output_file", help="Output csv filename", default="library_tasks.csv")
+    export_parser.set_defaults(run=run_export)
+
+    team_parser = subparsers.add_parser("team-sync", parents=[common],
+                                        help="Sync every member of a team roster, logged in as one Library user")
+    team_parser.add_argument("-r", "--roster", help="Roster CSV with columns library_user, clockify_workspace_id, "
+                                                    "clockify_api_key", default="roster.csv")
+    team_parser.add_argument("-w", "--workers", help="Number of team members synced at the same time", type=int,
+                             default=8)
+    team_parser.add_argument("-i", "--import_work_records", help="Also import work records from Clockify to the "
+                                                                 "Library", action="store_true")
+    team_parser.add_argument("-s", "--start_date", help="Beginning date for time entry (inclusive). "
+                                                        "Format YYYY-MM-DD", default=today)
+    team_parser.add_argument("-e", "--end_date", help="End date for time entry (inclusive). Format YYYY-MM-DD",
+                             default=today)
+    team_parser.add_argument("--skip_task_sync", help="Do not sync tasks/projects", action="store_true")
+    team_parser.add_argument("-d", "--dry_run", help="Only show what would change", action="store_true")
+    team_parser.set_defaults(run=run_team_sync)
+    return parser
+
+
+def main(argv=None) -> int:
+    """Main Program"""
+    args = create_parser().parse_args(argv)
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    try:
+        return args.run(args, config)
+    finally:
+        if args.metrics_file:
+            write_metrics_file(args.metrics_file)
+
+
+def write_metrics_file(path: str) -> None:
+    """Write the request metrics of every client used in this run"""
+    from time_entry_tools.metrics import get_metrics_registry
+    get_metrics_registry().write_file(path)
+    print("Wrote request metrics to %s" % path, flush=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
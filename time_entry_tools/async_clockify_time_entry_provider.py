@@ -0,0 +1,67 @@
+"""Asyncio variant of the Clockify Time Entry Provider"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List
+
+import requests
+from time_entry_tools.clockify_time_entry_provider import ClockifyTimeEntryProvider, Project, Task, URL, \
+    DEFAULT_POOL_SIZE, MAX_RATE_LIMITED_RETRIES
+from time_entry_tools.metrics import SERVICE_CLOCKIFY
+
+
+class AsyncClockifyTimeEntryProvider:
+    """Asyncio Clockify client.
+    Wraps a ClockifyTimeEntryProvider: requests go out on its pooled session and wait on its shared rate limiter, so
+    many requests can be in flight at once while the overall rate stays within Clockify's limit."""
+
+    def __init__(self, clockify_client: ClockifyTimeEntryProvider, max_concurrency: int = DEFAULT_POOL_SIZE):
+        self._clockify_client = clockify_client
+        # requests is blocking, so in-flight requests run on a thread pool sized to the connection pool
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="clockify-async")
+
+    async def close(self) -> None:
+        """Stop the request threads.  The wrapped provider stays open."""
+        ## Waiting for the threads blocks, so it is done on the default executor instead of the event loop
+        await asyncio.get_running_loop().run_in_executor(None, partial(self._executor.shutdown, wait=True))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _request(self, method: str, url: URL, **kwargs) -> requests.Response:
+        """Send a rate limited request to Clockify without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        for attempt in range(MAX_RATE_LIMITED_RETRIES + 1):
+            self._clockify_client.metrics.record_throttle(SERVICE_CLOCKIFY,
+                                                          await self._clockify_client.rate_limiter.acquire_async())
+            response = await loop.run_in_executor(
+                self._executor, partial(self._clockify_client.send, method, url, **kwargs))
+            if not self._clockify_client.should_retry_rate_limited_response(response, attempt):
+                return response
+            response.close()
+
+    async def _get_all_pages(self, url: URL, params: Dict[str, str] = None) -> list:
+        """Follow Clockify's page/page-size pagination and return the items of every page"""
+        page_size = self._clockify_client.page_size
+        items = []
+        page = 1
+        while True:
+            response = await self._request("GET", url, params={**(params or {}), "page": page, "page-size": page_size})
+            page_items = response.json()
+            items.extend(page_items)
+            if len(page_items) < page_size:
+                return items
+            page += 1
+
+    async def get_projects(self) -> List[Project]:
+        """REST Request to get all projects in Clockify"""
+        return self._clockify_client.parse_clockify_response_for_projects(
+            await self._get_all_pages(self._clockify_client.projects_endpoint))
+
+    async def get_tasks_for_project(self, project_id) -> List[Task]:
+        """REST Request to get all tasks, ACTIVE and DONE, for a project in Clockify"""
+        return self._clockify_client.parse_clockify_response_for_project_tasks(
+            await self._get_all_pages(self._clockify_client.projects_endpoint + "/%s/tasks" % project_id))
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from fake_servers.fake_clockify_server import FakeClockifyServer
+from fake_servers.fake_polarion_server import FakePolarionServer
+from time_entry_tools.async_clockify_time_entry_provider import AsyncClockifyTimeEntryProvider
+from time_entry_tools.clockify_task_sync_service import ClockifyTaskSyncService
+from time_entry_tools.clockify_time_entry_provider import TASK_STATUS_DONE
+from time_entry_tools.rate_limiter import TokenBucketRateLimiter
+from time_entry_tools.session_token_cache import SessionTokenCache
+
+
+async def get_tasks_of_every_project(clockify_client, project_ids):
+    async with AsyncClockifyTimeEntryProvider(clockify_client) as async_clockify_client:
+        return await asyncio.gather(*(async_clockify_client.get_tasks_for_project(project_id)
+                                      for project_id in project_ids))
+
+
+class AsyncClockifyTimeEntryProviderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_concurrent_requests_are_retried_after_429(self):
+        with FakeClockifyServer(requests_per_second=10) as clockify_server:
+            projects = [clockify_server.add_project("Project %d" % index) for index in range(25)]
+            for project in projects:
+                clockify_server.add_task(project["id"], "WI-%s - Task" % project["id"])
+            ## The client's own limit is far above the server's, so only the 429 responses hold it back
+            rate_limiter = TokenBucketRateLimiter(1000, 1000)
+            with clockify_server.create_client(rate_limiter=rate_limiter) as clockify_client:
+                project_tasks = asyncio.run(get_tasks_of_every_project(clockify_client,
+                                                                       [project["id"] for project in projects]))
+            self.assertEqual([["WI-%s - Task" % project["id"]] for project in projects],
+                             [[task.name for task in tasks] for tasks in project_tasks])
+            self.assertGreater(clockify_server.rate_limited_count, 0)
+            self.assertEqual(clockify_server.rate_limited_count, rate_limiter.stats()["rate_limited_responses"])
+
+    def test_concurrent_requests_wait_on_the_shared_rate_limiter(self):
+        with FakeClockifyServer() as clockify_server:
+            projects = [clockify_server.add_project("Project %d" % index) for index in range(10)]
+            rate_limiter = TokenBucketRateLimiter(20, 1)
+            with clockify_server.create_client(rate_limiter=rate_limiter) as clockify_client:
+                started = time.perf_counter()
+                asyncio.run(get_tasks_of_every_project(clockify_client, [project["id"] for project in projects]))
+                elapsed = time.perf_counter() - started
+            self.assertGreaterEqual(elapsed, 9 / 20)
+            self.assertEqual(10, rate_limiter.stats()["requests"])
+            self.assertEqual(9, rate_limiter.stats()["throttled_requests"])
+
+    def test_sync_async_fetches_every_project_under_the_server_limit(self):
+        with FakePolarionServer() as library_server, FakeClockifyServer(requests_per_second=10) as clockify_server:
+            for index in range(12):
+                library_server.add_workitem("WI-%d" % index, "Task %d" % index, "Project %d" % index,
+                                            library_server.user_name)
+                project = clockify_server.add_project("Project %d" % index)
+                clockify_server.add_task(project["id"], "WI-%d - Task %d" % (index, index))
+            done_project = clockify_server.add_project("Project 12")
+            clockify_server.add_task(done_project["id"], "WI-12 - Resolved")
+            library_client = library_server.create_client(
+                session_token_cache=SessionTokenCache(os.path.join(self.directory.name, "sessions.json")))
+            rate_limiter = TokenBucketRateLimiter(1000, 1000)
+            with clockify_server.create_client(rate_limiter=rate_limiter) as clockify_client:
+                plan = asyncio.run(ClockifyTaskSyncService(library_client, clockify_client).sync_async())
+            library_client.close()
+            self.assertEqual([], plan.failed_operations)
+            self.assertGreater(clockify_server.rate_limited_count, 0)
+            self.assertEqual(clockify_server.rate_limited_count, rate_limiter.stats()["rate_limited_responses"])
+            self.assertEqual([TASK_STATUS_DONE], [task["status"] for task in clockify_server.tasks[done_project["id"]]])
+            self.assertEqual(13, len(clockify_server.projects))
+
+
+if __name__ == '__main__':
+    unittest.main()
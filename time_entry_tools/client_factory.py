@@ -0,0 +1,96 @@
+"""Create the Clockify and Library clients and services from the configuration file"""
+import configparser
+from typing import List, Optional
+
+from time_entry_tools.clockify_task_sync_service import ClockifyTaskSyncService
+from time_entry_tools.clockify_time_entry_provider import ClockifyTimeEntryProvider, DEFAULT_REPORT_WINDOW_DAYS, \
+    DEFAULT_REPORT_WORKERS, DEFAULT_WRITE_WORKERS
+from time_entry_tools.import_journal import ImportJournal
+from time_entry_tools.library_time_entry_provider import LibraryTimeEntryProvider, DEFAULT_WSDL_CACHE_DAYS
+from time_entry_tools.library_work_record_sync_service import LibraryWorkRecordSyncService
+from time_entry_tools.lookup_cache import LookupCache, create_lookup_cache
+from time_entry_tools.session_token_cache import SessionTokenCache
+from time_entry_tools.sync_snapshot_store import SyncSnapshotStore, get_default_snapshot_path
+from time_entry_tools.work_record_aggregation import AggregationRule, DEFAULT_AGGREGATION_RULES, \
+    parse_aggregation_rules
+from time_entry_tools.work_record_ledger import WorkRecordLedger
+
+
+def create_clockify_client(config: configparser.ConfigParser, api_key: str = None,
+                           workspace_id: str = None) -> ClockifyTimeEntryProvider:
+    """Clockify client for the configured workspace.
+    With api_key and workspace_id, the client works in that workspace instead, with the other configured options."""
+    return ClockifyTimeEntryProvider(api_key or config["Clockify"]["api_key"],
+                                     workspace_id or config["Clockify"]["workspace_id"],
+                                     report_window_days=get_report_window_days(config),
+                                     report_workers=config["Clockify"].getint("report_workers",
+                                                                              fallback=DEFAULT_REPORT_WORKERS),
+                                     write_workers=config["Clockify"].getint("write_workers",
+                                                                             fallback=DEFAULT_WRITE_WORKERS),
+                                     stream_reports=config["Clockify"].getboolean("stream_reports", fallback=True),
+                                     aggregation_rules=get_aggregation_rules(config))
+
+
+def get_report_window_days(config: configparser.ConfigParser) -> int:
+    """Configured length in days of the Clockify report windows"""
+    report_window_days = config["Clockify"].getint("report_window_days", fallback=DEFAULT_REPORT_WINDOW_DAYS)
+    if report_window_days < 1:
+        raise ValueError("report_window_days in the [Clockify] section must be at least 1, not %d" %
+                         report_window_days)
+    return report_window_days
+
+
+def get_aggregation_rules(config: configparser.ConfigParser) -> List[AggregationRule]:
+    """Configured rules for aggregating Clockify time entries into WorkRecords, or the default rules"""
+    if "aggregation_rules" not in config["Clockify"]:
+        return list(DEFAULT_AGGREGATION_RULES)
+    return parse_aggregation_rules(config["Clockify"]["aggregation_rules"])
+
+
+def create_library_lookup_cache(config: configparser.ConfigParser) -> Optional[LookupCache]:
+    """Cache of Library lookups as configured: "disk" (the default) shares it between runs, "memory" keeps it for
+    this run, and "off" disables it"""
+    lookup_cache = config['Library'].get('lookup_cache', fallback='disk').strip().lower()
+    if lookup_cache not in ('disk', 'memory', 'off'):
+        raise ValueError("Library lookup_cache must be disk, memory or off, not %r" % lookup_cache)
+    if lookup_cache == 'off':
+        return None
+    return create_lookup_cache(on_disk=lookup_cache == 'disk')
+
+
+def create_library_client(config: configparser.ConfigParser, user_name: str, password: str,
+                          library_user: str = None, session_token_cache: SessionTokenCache = None,
+                          lookup_cache: LookupCache = None) -> LibraryTimeEntryProvider:
+    """Library client for the configured server, logged in as the given user.
+    With library_user, the client works on that user's work items and work records instead.
+    Without a lookup_cache, the client gets its own as configured."""
+    return LibraryTimeEntryProvider(library_url=config['Library']['server_url'], user_name=user_name,
+                                    password=password, library_workitem_query=config['Library']['workitem_query'],
+                                    save_workers=config['Library'].getint('save_workers', fallback=1),
+                                    wsdl_cache_days=config['Library'].getfloat('wsdl_cache_days',
+                                                                               fallback=DEFAULT_WSDL_CACHE_DAYS),
+                                    session_token_cache=session_token_cache or SessionTokenCache(),
+                                    library_user=library_user,
+                                    reconcile_existing=config['Library'].getboolean('reconcile_existing',
+                                                                                    fallback=False),
+                                    lookup_cache=lookup_cache or create_library_lookup_cache(config))
+
+
+def create_task_sync_service(library_client: LibraryTimeEntryProvider,
+                             clockify_client: ClockifyTimeEntryProvider) -> ClockifyTaskSyncService:
+    """Task sync service using the local snapshot of the user's Library and Clockify workspace.
+    The service owns the snapshot store: close it, or use it in a with statement, once the sync is done."""
+    return ClockifyTaskSyncService(library_client, clockify_client, SyncSnapshotStore(
+        get_default_snapshot_path(library_client.library_user, clockify_client.clockify_workspace_id)))
+
+
+def create_work_record_sync_service(library_client: LibraryTimeEntryProvider,
+                                    clockify_client: ClockifyTimeEntryProvider, start_date: str, end_date: str,
+                                    skip_imported: bool = True, ledger: WorkRecordLedger = None,
+                                    journal: ImportJournal = None,
+                                    prefetch: bool = True) -> LibraryWorkRecordSyncService:
+    """Work record sync service using the local ledger of already imported WorkRecords and the import journal.
+    Without prefetch, the WorkRecords are streamed from Clockify and saved as they arrive."""
+    return LibraryWorkRecordSyncService(library_client, clockify_client, start_date, end_date,
+                                        ledger or WorkRecordLedger(), skip_imported, journal or ImportJournal(),
+                                        prefetch)
@@ -1,110 +1,173 @@
 """Service to Sync Tasks from the Library to Clockify"""
+import asyncio
 from collections import namedtuple
-from typing import List
+from datetime import datetime
+from typing import List, Tuple
+
+from time_entry_tools.async_clockify_time_entry_provider import AsyncClockifyTimeEntryProvider
+from time_entry_tools.clockify_time_entry_provider import Project, TASK_STATUS_DONE
+from time_entry_tools.sync_plan import SyncPlan, build_sync_plan
+from time_entry_tools.sync_snapshot_store import SnapshotWorkItem, SyncSnapshotStore
 
 LibrayWorkItem = namedtuple("LibrayWorkItem", "project_name workitem_title")
 ClockifyTask = namedtuple("ClockifyTask", "project_id task_name task_id")
 
 
 class ClockifyTaskSyncService:
-    """Service to Sync Tasks from the Library to Clockify"""
+    """Service to Sync Tasks from the Library to Clockify.
+    With a SyncSnapshotStore, only the Library work items and Clockify projects that changed since the last sync are
+    fetched; everything else comes from the snapshot."""
 
-    def __init__(self, library_client, clockify_client):
+    def __init__(self, library_client, clockify_client, snapshot_store: SyncSnapshotStore = None):
         self._library_client = library_client
         self._clockify_client = clockify_client
+        self._snapshot_store = snapshot_store
         self.library_workitems_raw = None
         self.clockify_projects = None
         self.clockify_active_tasks = None
         self.clockify_done_tasks = None
         self.library_workitems = None
+        self.changed_project_names = None  # Library projects with changed work items; None means all of them
+        self.changed_clockify_project_ids = set()
+
+    def close(self) -> None:
+        """Close the snapshot store"""
+        if self._snapshot_store is not None:
+            self._snapshot_store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def initialize_data(self):
         """Get the current state of Clockify and the Library"""
-        self.library_workitems_raw = self._library_client.get_workitems_for_user()
-        self.library_workitems = self.get_library_workitems_from_raw()
-        self.sync_projects()
-        self.clockify_active_tasks = self.get_active_tasks_from_clockify()
-        self.clockify_done_tasks = self.get_done_tasks_from_clockify()
-
-    def sync(self) -> None:
-        """Primary method. Syncs both projects and tasks from the Library to Clockify."""
+        self.load_library_workitems()
+        self.clockify_projects = self._clockify_client.get_projects()
+        projects_to_fetch = self.get_clockify_projects_to_fetch()
+        self.clockify_active_tasks, self.clockify_done_tasks = self.merge_project_tasks(
+            [(project, list(self._clockify_client.iter_tasks_for_project(project.id)))
+             for project in projects_to_fetch])
+
+    def sync(self, dry_run: bool = False) -> SyncPlan:
+        """Primary method. Syncs both projects and tasks from the Library to Clockify.
+        With dry_run, only print the changes that would be made."""
         print("Syncing Tasks and Projects...", flush=True)
         self.initialize_data()
-        self.add_tasks_to_clockify()
-        self.remove_tasks_from_clockify()
-
-    def sync_projects(self) -> None:
-        """Create projects in Clockify that exist in the library."""
-        self.clockify_projects = self._clockify_client.get_projects()
-        self.add_projects_from_library_to_clockify()
-        self.clockify_projects = self._clockify_client.get_projects()  # Update list to include ids of newly created projects
+        return self.apply_sync_plan(dry_run)
+
+    async def initialize_data_async(self):
+        """Get the current state of Clockify and the Library, requesting the tasks of every project concurrently"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.load_library_workitems)
+        self.clockify_projects = await loop.run_in_executor(None, self._clockify_client.get_projects)
+        projects_to_fetch = self.get_clockify_projects_to_fetch()
+        async with AsyncClockifyTimeEntryProvider(self._clockify_client) as async_clockify_client:
+            project_tasks = await asyncio.gather(*(async_clockify_client.get_tasks_for_project(project.id)
+                                                   for project in projects_to_fetch))
+        self.clockify_active_tasks, self.clockify_done_tasks = self.merge_project_tasks(
+            list(zip(projects_to_fetch, project_tasks)))
+
+    async def sync_async(self, dry_run: bool = False) -> SyncPlan:
+        """Asyncio variant of sync.  Task lookups for all projects are sent at the same time, under the rate limit."""
+        print("Syncing Tasks and Projects...", flush=True)
+        await self.initialize_data_async()
+        return await asyncio.get_running_loop().run_in_executor(None, self.apply_sync_plan, dry_run)
+
+    def load_library_workitems(self) -> None:
+        """Get the Library work items, incrementally when the snapshot is recent enough"""
+        synced_at = datetime.now()
+        if self._snapshot_store is None or self._snapshot_store.is_full_refresh_due(synced_at):
+            self.library_workitems_raw = self._library_client.get_workitems_for_user()
+            self.library_workitems = self.get_library_workitems_from_raw()
+            self.changed_project_names = None
+            if self._snapshot_store is not None:
+                self._snapshot_store.replace_library_workitems(self.get_snapshot_workitems_from_raw(), synced_at)
+            return
+
+        last_library_sync = self._snapshot_store.last_library_sync
+        self.library_workitems_raw = self._library_client.get_workitems_for_user(updated_since=last_library_sync)
+        updated_workitems = self.get_snapshot_workitems_from_raw()
+        updated_ids = {workitem.id for workitem in updated_workitems}
+        ## Work items that changed but no longer match the query (e.g. resolved) leave the snapshot
+        removed_ids = set(self._library_client.get_workitem_ids_for_user_updated_since(last_library_sync)) - updated_ids
+        previous_workitems = self._snapshot_store.get_library_workitems()
+        self.changed_project_names = {workitem.project_name for workitem in updated_workitems}
+        self.changed_project_names.update(previous_workitems[workitem_id].project_name
+                                          for workitem_id in removed_ids | updated_ids
+                                          if workitem_id in previous_workitems)
+        self._snapshot_store.update_library_workitems(updated_workitems, removed_ids, synced_at)
+        self.library_workitems = [LibrayWorkItem(project_name=workitem.project_name,
+                                                 workitem_title=workitem.workitem_title)
+                                  for workitem in self._snapshot_store.get_library_workitems().values()]
+
+    def get_clockify_projects_to_fetch(self) -> List[Project]:
+        """Clockify projects whose tasks have to be fetched: all of them without a snapshot, otherwise only
+        projects with changed Library work items or whose tasks are not in the snapshot"""
+        if self._snapshot_store is None or self.changed_project_names is None:
+            return list(self.clockify_projects)
+        project_ids_with_tasks = set(self._snapshot_store.get_clockify_project_ids_with_tasks())
+        return [project for project in self.clockify_projects
+                if project.name in self.changed_project_names or project.id not in project_ids_with_tasks]
+
+    def merge_project_tasks(self, fetched_project_tasks) -> Tuple[List[ClockifyTask], List[ClockifyTask]]:
+        """Combine freshly fetched (project, tasks) pairs with the snapshot.  Return the (ACTIVE, DONE) tasks."""
+        if self._snapshot_store is None:
+            return self.split_tasks_by_status(fetched_project_tasks)
+        fetched_at = datetime.now()
+        for project, tasks in fetched_project_tasks:
+            self._snapshot_store.replace_clockify_tasks(project.id, tasks, fetched_at)
+        snapshot_tasks = self._snapshot_store.get_clockify_tasks()
+        return self.split_tasks_by_status((project, snapshot_tasks.get(project.id, []))
+                                          for project in self.clockify_projects)
+
+    def invalidate_changed_clockify_projects(self) -> None:
+        """Projects this sync wrote to are fetched again on the next sync"""
+        if self._snapshot_store is not None:
+            self._snapshot_store.invalidate_clockify_tasks(self.changed_clockify_project_ids)
+        self.changed_clockify_project_ids = set()
 
     def get_library_workitems_from_raw(self) -> List[LibrayWorkItem]:
         """Parse the workitem library response into WorkItem objects"""
         return [LibrayWorkItem(project_name=workitem.project.name, workitem_title=workitem.id + " - " + workitem.title)
                 for workitem in self.library_workitems_raw]
 
-    def add_projects_from_library_to_clockify(self) -> None:
-        """Add missing projects to Clockify"""
-        clockify_projects_names = {project.name for project in self.clockify_projects}
-        library_projects = {workitem.project.name for workitem in self.library_workitems_raw}
-        projects_not_in_clockify = library_projects.difference(clockify_projects_names)
-        for project in projects_not_in_clockify:
-            self._clockify_client.add_project(project)
-
-    ##TODO could combine this to be a single query, that is then filtered to active and done (helps as # of projects grows N vs N*2)
-    def get_active_tasks_from_clockify(self) -> List[ClockifyTask]:
-        """Get all ACTIVE tasks from all projects in Clockify."""
-        clockify_tasks = []
-        for project in self.clockify_projects:
-            clockify_tasks.extend([ClockifyTask(project_id=project.id, task_name=task.name, task_id=task.id)
-                                   for task in self._clockify_client.get_active_tasks_for_project(project.id)])
-        return clockify_tasks
-
-    def get_done_tasks_from_clockify(self) -> List[ClockifyTask]:
-        """Get all DONE tasks from all projects in Clockify."""
-        clockify_tasks = []
-        for project in self.clockify_projects:
-            clockify_tasks.extend([ClockifyTask(project_id=project.id, task_name=task.name, task_id=task.id)
-                                   for task in self._clockify_client.get_done_tasks_for_project(project.id)])
-        return clockify_tasks
-
-    def add_tasks_to_clockify(self) -> None:
-        """Compare Tasks in Library vs Clockify.  Add tasks not in Clockify to Clockify"""
-        clockify_active_task_names = [task.task_name for task in self.clockify_active_tasks]
-        library_workitems_to_add = [library_workitem for library_workitem in self.library_workitems if
-                                    library_workitem.workitem_title not in clockify_active_task_names]
-        if library_workitems_to_add:
-            clockify_done_task_names = [task.task_name for task in self.clockify_done_tasks]
-            clockify_done_tasks_dict = {task.task_name: (task.project_id, task.task_id) for task in
-                                        self.clockify_done_tasks}
-            clockify_projects_dict = dict(self.clockify_projects)
-            for workitem_to_add in library_workitems_to_add:
-                self.handle_task_addition_to_clockify(workitem_to_add, clockify_done_task_names,
-                                                      clockify_done_tasks_dict, clockify_projects_dict)
-
-    def handle_task_addition_to_clockify(self, workitem_to_add, clockify_done_task_names, clockify_done_tasks_dict,
-                                         clockify_projects_dict) -> None:
-        """Create the task in Clockify if it does not exist.
-        If it does exist and is marked DONE, then mark it ACTIVE."""
-
-        if workitem_to_add.workitem_title in clockify_done_task_names:
-            ## Task needs to be marked active
-            task_to_mark_active = clockify_done_tasks_dict[workitem_to_add.workitem_title]
-            self._clockify_client.mark_task_as_active(task_to_mark_active[0], task_to_mark_active[1],
-                                                      workitem_to_add.workitem_title)
-        else:
-            ## Task does not exist
-            project_id = clockify_projects_dict.get(workitem_to_add.project_name, "notFound")
-            if project_id == "notFound":
-                raise Exception("Project ID not found")
-
-            self._clockify_client.add_task(project_id, workitem_to_add.workitem_title)
-
-    def remove_tasks_from_clockify(self) -> None:
-        """Compare tasks in Library vs Clockify.  Remove tasks not in Library from Clockify."""
-        library_tasks = {workitem.workitem_title for workitem in self.library_workitems}
-        clockify_tasks_to_remove = [task for task in self.clockify_active_tasks if task.task_name not in library_tasks]
-
-        for task in clockify_tasks_to_remove:
-            self._clockify_client.mark_task_as_done(task.project_id, task.task_id, task.task_name)
+    def get_snapshot_workitems_from_raw(self) -> List[SnapshotWorkItem]:
+        """Parse the workitem library response into snapshot rows"""
+        return [SnapshotWorkItem(id=workitem.id, project_name=workitem.project.name,
+                                 workitem_title=workitem.id + " - " + workitem.title,
+                                 updated=str(workitem.updated) if workitem.updated is not None else None)
+                for workitem in self.library_workitems_raw or []]
+
+    @staticmethod
+    def split_tasks_by_status(project_tasks) -> Tuple[List[ClockifyTask], List[ClockifyTask]]:
+        """Split (project, tasks) pairs into lists of ACTIVE and DONE ClockifyTasks"""
+        active_tasks = []
+        done_tasks = []
+        for project, tasks in project_tasks:
+            for task in tasks:
+                clockify_task = ClockifyTask(project_id=project.id, task_name=task.name, task_id=task.id)
+                if task.status == TASK_STATUS_DONE:
+                    done_tasks.append(clockify_task)
+                else:
+                    active_tasks.append(clockify_task)
+        return active_tasks, done_tasks
+
+    def create_sync_plan(self) -> SyncPlan:
+        """Compare the Library with Clockify and plan the changes needed to bring Clockify in line"""
+        return build_sync_plan(self.library_workitems, self.clockify_projects, self.clockify_active_tasks,
+                               self.clockify_done_tasks)
+
+    def apply_sync_plan(self, dry_run: bool = False) -> SyncPlan:
+        """Plan the changes to Clockify and either print them (dry run) or apply them"""
+        plan = self.create_sync_plan()
+        if dry_run:
+            plan.print_dry_run()
+            return plan
+        self.changed_clockify_project_ids.update(plan.get_existing_project_ids())
+        try:
+            plan.execute(self._clockify_client, self._clockify_client.write_workers)
+        finally:
+            self.invalidate_changed_clockify_projects()
+        return plan
@@ -0,0 +1,31 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from time_entry_tools.clockify_task_sync_service import ClockifyTaskSyncService
+from time_entry_tools.sync_snapshot_store import SyncSnapshotStore
+
+
+class ClockifyTaskSyncServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_snapshot_store_is_closed_with_the_service(self):
+        snapshot_store = SyncSnapshotStore(os.path.join(self.directory.name, "snapshot.db"))
+        with ClockifyTaskSyncService(None, None, snapshot_store) as task_sync_service:
+            self.assertEqual({}, snapshot_store.get_library_workitems())
+        with self.assertRaises(sqlite3.ProgrammingError):
+            snapshot_store.get_library_workitems()
+        task_sync_service.close()
+
+    def test_service_without_snapshot_store_closes(self):
+        with ClockifyTaskSyncService(None, None):
+            pass
+
+
+if __name__ == '__main__':
+    unittest.main()
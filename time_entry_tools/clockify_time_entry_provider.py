@@ -1,53 +1,183 @@
 """Clockify Specific Time Entry Provider"""
 
-from collections import namedtuple, deque
-from datetime import datetime, timedelta
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 import time
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Tuple
+from urllib.parse import urlparse
 
 import requests
-from time_entry_tools.workrecord import WorkRecord, convert_to_hours, get_workitem_id_from_task_name
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from time_entry_tools.json_stream import iter_json_array_items
+from time_entry_tools.metrics import MetricsRegistry, SERVICE_CLOCKIFY, get_metrics_registry
+from time_entry_tools.rate_limiter import TokenBucketRateLimiter, get_shared_rate_limiter
+from time_entry_tools.work_record_aggregation import AggregationRule, DEFAULT_AGGREGATION_RULES, \
+    DEFAULT_AGGREGATOR, GRANULARITY_ENTRY, WorkRecordAggregator
+from time_entry_tools.workrecord import WorkRecord, WorkRecordBatch, get_workitem_id_from_task_name
 from time_entry_tools.time_entry_provider import TimeEntryProvider
 
 Project = namedtuple('Project', 'name id')
-Task = namedtuple('Task', 'name id')
+Task = namedtuple('Task', 'name id status', defaults=(None,))
 
 URL = str
 
+CLOCKIFY_API_URL = "https://api.clockify.me/api/v1"
+CLOCKIFY_REPORTS_URL = "https://reports.api.clockify.me/v1"
+CLOCKIFY_REQUESTS_PER_SECOND = 10
+CLOCKIFY_BURST_SIZE = 1  # Any larger and a burst plus the refill can exceed 10 requests in a one second window
+MAX_RATE_LIMITED_RETRIES = 5
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+CLOCKIFY_PAGE_SIZE = 5000  # Largest page size Clockify accepts
+TASK_STATUS_ACTIVE = "ACTIVE"
+TASK_STATUS_DONE = "DONE"
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.5  # seconds, doubled after every retry
+DEFAULT_REPORT_WINDOW_DAYS = 7
+DEFAULT_REPORT_WORKERS = 4
+DEFAULT_REPORT_WINDOW_RETRIES = 2
+DEFAULT_WRITE_WORKERS = 4
+REPORT_STREAM_CHUNK_SIZE = 64 * 1024
+_ID_PARENT_SEGMENTS = ("workspaces", "projects", "tasks")  # URL path segments followed by an id
 
-def api_rate_limit(func):
-    """Decorator to limit how often a function can be called"""
-    def inner(self, *args, **kwargs):
-        if self._previous_request_timestamps[0] >= datetime.now() - timedelta(seconds=1):
-            print("API Rate Limiting... 10 Requests per second")
-            time.sleep(self.api_rate_limit_delay) # Rate limit to less than 10 API requests per second
-        self._previous_request_timestamps.append(datetime.now())
-        return func(self,*args, **kwargs)
-    return inner
+
+def create_clockify_session(pool_size: int = DEFAULT_POOL_SIZE,
+                            max_retries: int = DEFAULT_MAX_RETRIES) -> requests.Session:
+    """Create a keep-alive HTTP session for Clockify.
+    Connection errors are retried for every request.  5xx responses are only retried for idempotent methods, so a
+    project or task is never created twice.  429 responses are left to the rate limiter."""
+    retry = Retry(total=max_retries, connect=max_retries, read=max_retries, status=max_retries,
+                  backoff_factor=RETRY_BACKOFF_FACTOR, status_forcelist=(500, 502, 503, 504),
+                  raise_on_status=False, respect_retry_after_header=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_retry_after_seconds(response: requests.Response) -> float:
+    """Read the Retry-After header of a 429 response.  It may be a number of seconds or an HTTP date."""
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return DEFAULT_RETRY_AFTER_SECONDS
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+
+def get_endpoint_name(method: str, url: URL) -> str:
+    """Method and URL path of a Clockify request with the ids left out, e.g. GET /api/v1/workspaces/{id}/projects"""
+    segments = urlparse(url).path.split("/")
+    return method + " " + "/".join("{id}" if index and segments[index - 1] in _ID_PARENT_SEGMENTS else segment
+                                   for index, segment in enumerate(segments))
+
+
+def get_response_size(response: requests.Response, streamed: bool = False) -> int:
+    """Bytes of the response body as sent, without reading a streamed body"""
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit():
+        return int(content_length)
+    return 0 if streamed else len(response.content)
+
+
+def split_date_range(start_date_time: str, end_date_time: str, window_days: int) -> List[Tuple[str, str]]:
+    """Split an inclusive date range into consecutive windows of whole days.
+    Windows start at midnight, so the time entries of one day are always in the same window."""
+    if window_days < 1:
+        raise ValueError("Report windows must be at least 1 day long, not %r" % (window_days,))
+    start = datetime.fromisoformat(start_date_time)
+    end = datetime.fromisoformat(end_date_time)
+    windows = []
+    window_start = start
+    next_boundary = start.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=window_days)
+    while window_start <= end:
+        window_end = min(next_boundary - timedelta(microseconds=1), end)
+        windows.append((window_start.isoformat(), window_end.isoformat()))
+        window_start = next_boundary
+        next_boundary += timedelta(days=window_days)
+    return windows
+
+
+class ClockifyApiError(Exception):
+    """Clockify answered a request with an unexpected status"""
+
+    def __init__(self, message: str, status_code: int, response_text: str = ""):
+        super().__init__("%s Response code: %d %s" % (message, status_code, response_text[:200]))
+        self.status_code = status_code
+        self.response_text = response_text
+
+
+def check_response_status(response: requests.Response, expected_status: int, message: str) -> None:
+    """Raise ClockifyApiError with the message when the response does not have the expected status"""
+    if response.status_code != expected_status:
+        raise ClockifyApiError(message, response.status_code, response.text)
+
+
+class ReportWindowError(Exception):
+    """Fetching the summary report of one window failed.  Every earlier window was already returned, so the fetch can
+    be resumed from window_start."""
+
+    def __init__(self, window_start: str, window_end: str, error: Exception):
+        super().__init__("Clockify report for %s to %s failed: %r" % (window_start, window_end, error))
+        self.window_start = window_start
+        self.window_end = window_end
+        self.error = error
 
 
 class ClockifyTimeEntryProvider(TimeEntryProvider):
     """Clockify Interface Class"""
-    def __init__(self, clockify_api_key, clockify_workspace_id):
+    def __init__(self, clockify_api_key, clockify_workspace_id, rate_limiter: TokenBucketRateLimiter = None,
+                 pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES,
+                 page_size: int = CLOCKIFY_PAGE_SIZE, report_window_days: int = DEFAULT_REPORT_WINDOW_DAYS,
+                 report_workers: int = DEFAULT_REPORT_WORKERS, api_url: URL = CLOCKIFY_API_URL,
+                 reports_url: URL = CLOCKIFY_REPORTS_URL, metrics: MetricsRegistry = None,
+                 write_workers: int = DEFAULT_WRITE_WORKERS, stream_reports: bool = True,
+                 aggregation_rules: Iterable[AggregationRule] = DEFAULT_AGGREGATION_RULES):
         self.clockify_api_key = clockify_api_key
         self.clockify_workspace_id = clockify_workspace_id
-        self._api_rate_limit_delay = 0.11  # seconds, rate limit to less than 10 requests per second
-        self._previous_request_timestamps = deque(10*[datetime.min], maxlen=10)
+        self.page_size = page_size
+        self.report_window_days = report_window_days
+        self.report_workers = report_workers
+        self.write_workers = write_workers
+        self.stream_reports = stream_reports
+        self.aggregator = WorkRecordAggregator(aggregation_rules)
+        self.api_url = api_url
+        self.reports_url = reports_url
+        self.metrics = metrics or get_metrics_registry()
+        # Clockify limits requests per API key, so every provider using the key shares one limiter
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter(clockify_api_key, CLOCKIFY_REQUESTS_PER_SECOND,
+                                                                    CLOCKIFY_BURST_SIZE)
+        self.session = create_clockify_session(pool_size, max_retries)
+        self.session.headers.update(self.headers)
 
-    @property
-    def api_rate_limit_delay(self) -> float:
-        """Number of seconds to delay between requests to ensure the api usage limit is not exceeded"""
-        return self._api_rate_limit_delay
+    def close(self) -> None:
+        """Close the pooled connections to Clockify"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     @property
     def summary_report_endpoint(self) -> URL:
         """URL for the Clockify Summary Report endpoint"""
-        return "https://reports.api.clockify.me/v1/workspaces/%s/reports/summary" % self.clockify_workspace_id
+        return "%s/workspaces/%s/reports/summary" % (self.reports_url, self.clockify_workspace_id)
 
     @property
     def projects_endpoint(self) -> URL:
         """URL for the Clockify Projects endpoint"""
-        return "https://api.clockify.me/api/v1/workspaces/%s/projects" % self.clockify_workspace_id
+        return "%s/workspaces/%s/projects" % (self.api_url, self.clockify_workspace_id)
 
     @property
     def headers(self) -> Dict[str, str]:
@@ -57,10 +187,126 @@ class ClockifyTimeEntryProvider(TimeEntryProvider):
             "x-api-key": self.clockify_api_key
         }
 
-    @api_rate_limit
+    def _request(self, method: str, url: URL, **kwargs) -> requests.Response:
+        """Send a rate limited request to Clockify.
+        When Clockify answers 429 Too Many Requests, hold back all callers for Retry-After and try again."""
+        for attempt in range(MAX_RATE_LIMITED_RETRIES + 1):
+            self.metrics.record_throttle(SERVICE_CLOCKIFY, self.rate_limiter.acquire())
+            response = self.send(method, url, **kwargs)
+            if not self.should_retry_rate_limited_response(response, attempt):
+                return response
+            response.close()
+
+    def send(self, method: str, url: URL, **kwargs) -> requests.Response:
+        """Send one request on the pooled session, recording its latency, size and connection/5xx retries.
+        Unlike _request, this does not wait on the rate limiter or retry 429 responses."""
+        endpoint = get_endpoint_name(method, url)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.metrics.record_request(SERVICE_CLOCKIFY, endpoint, time.perf_counter() - started)
+            raise
+        self.metrics.record_request(SERVICE_CLOCKIFY, endpoint, time.perf_counter() - started, response.status_code,
+                                    len(response.request.body or b""),
+                                    get_response_size(response, kwargs.get("stream", False)))
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None:
+            self.metrics.record_retry(SERVICE_CLOCKIFY, endpoint, "transport", len(retries.history))
+        return response
+
+    def should_retry_rate_limited_response(self, response: requests.Response, attempt: int) -> bool:
+        """Check a response for 429 Too Many Requests.  If it should be retried, hold back callers for Retry-After."""
+        if response.status_code != 429 or attempt == MAX_RATE_LIMITED_RETRIES:
+            return False
+        self.rate_limiter.penalize(get_retry_after_seconds(response))
+        self.metrics.record_retry(SERVICE_CLOCKIFY, get_endpoint_name(response.request.method, response.request.url),
+                                  "rate_limited")
+        return True
+
+    def _iter_pages(self, url: URL, params: Dict[str, str] = None) -> Iterator[list]:
+        """Follow Clockify's page/page-size pagination, yielding the JSON list of each page.
+        A page shorter than the page size is the last one."""
+        page = 1
+        while True:
+            response = self._request("GET", url, params={**(params or {}), "page": page, "page-size": self.page_size})
+            items = response.json()
+            yield items
+            if len(items) < self.page_size:
+                return
+            page += 1
+
     def get_work_records(self, start_date_time: str, end_date_time: str) -> List[WorkRecord]:
-        """REST Request to get work records in clockify between the selected dates."""
-        json_request = {
+        """REST Requests to get work records in clockify between the selected dates, one window at a time."""
+        return list(self.iter_work_records(start_date_time, end_date_time))
+
+    def iter_work_records(self, start_date_time: str, end_date_time: str, window_days: int = None,
+                          max_workers: int = None) -> Iterator[WorkRecord]:
+        """Fetch the summary reports of the date range in windows, several at a time, and yield the work records in
+        date order.  A window that still fails after its retries raises ReportWindowError."""
+        windows = split_date_range(start_date_time, end_date_time, window_days or self.report_window_days)
+        max_workers = max_workers or self.report_workers
+        if max_workers <= 1 or len(windows) == 1:
+            for window_start, window_end in windows:
+                yield from self._get_work_records_for_window(window_start, window_end)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clockify-report")
+        try:
+            # Only fetch a few windows ahead of the consumer, so a long backfill is not held in memory all at once
+            pending = deque()
+            remaining_windows = iter(windows)
+            for window_start, window_end in remaining_windows:
+                pending.append(executor.submit(self._get_work_records_for_window, window_start, window_end))
+                if len(pending) == max_workers * 2:
+                    break
+            while pending:
+                work_records = pending.popleft().result()
+                next_window = next(remaining_windows, None)
+                if next_window is not None:
+                    pending.append(executor.submit(self._get_work_records_for_window, *next_window))
+                yield from work_records
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _get_work_records_for_window(self, window_start: str, window_end: str,
+                                     retries: int = DEFAULT_REPORT_WINDOW_RETRIES) -> List[WorkRecord]:
+        """Fetch the summary report of one window, retrying only that window if it fails"""
+        for attempt in range(retries + 1):
+            try:
+                return self.get_summary_report_work_records(window_start, window_end)
+            except requests.RequestException as error:
+                if attempt == retries:
+                    raise ReportWindowError(window_start, window_end, error) from error
+                self.metrics.record_retry(SERVICE_CLOCKIFY, get_endpoint_name("POST", self.summary_report_endpoint),
+                                          "report_window")
+                print("Retrying Clockify report for %s to %s: %r" % (window_start, window_end, error), flush=True)
+
+    def get_summary_report_work_records(self, start_date_time: str, end_date_time: str) -> List[WorkRecord]:
+        """REST Request to get work records in clockify between the selected dates, as a single summary report.
+        With stream_reports, the report is parsed while it is downloaded."""
+        if self.stream_reports:
+            return list(self.iter_summary_report_work_records(start_date_time, end_date_time))
+        response = self._request("POST", self.summary_report_endpoint,
+                                 json=self.get_summary_report_request(start_date_time, end_date_time))
+        response.raise_for_status()
+        return self.parse_clockify_response_for_work_records(response.json(), self.aggregator)
+
+    def iter_summary_report_work_records(self, start_date_time: str, end_date_time: str) -> Iterator[WorkRecord]:
+        """REST Request to get work records in clockify between the selected dates, as a single summary report.
+        The response is read in chunks and the work records of each date are yielded as soon as that date's group is
+        complete, so neither the whole response nor its parsed JSON tree is ever held in memory."""
+        response = self._request("POST", self.summary_report_endpoint,
+                                 json=self.get_summary_report_request(start_date_time, end_date_time), stream=True)
+        with response:
+            response.raise_for_status()
+            yield from self.parse_clockify_date_groups(
+                iter_json_array_items(response.iter_content(REPORT_STREAM_CHUNK_SIZE), "groupOne"), self.aggregator)
+
+    @staticmethod
+    def get_summary_report_request(start_date_time: str, end_date_time: str) -> dict:
+        """JSON request for a summary report of every time entry between the dates, grouped by date and task"""
+        return {
             "dateRangeStart": start_date_time,
             "dateRangeEnd": end_date_time,
             "summaryFilter": {
@@ -71,80 +317,78 @@ class ClockifyTimeEntryProvider(TimeEntryProvider):
                 ]
             }
         }
-        response = requests.post(self.summary_report_endpoint, headers=self.headers, json=json_request)
-        return self.parse_clockify_response_for_work_records(response.json())
 
-    @api_rate_limit
+    def iter_projects(self) -> Iterator[Project]:
+        """REST Requests to get all projects in Clockify, one page at a time"""
+        for page in self._iter_pages(self.projects_endpoint):
+            yield from self.parse_clockify_response_for_projects(page)
+
     def get_projects(self) -> List[Project]:
         """REST Request to get all projects in Clockify"""
-        response = requests.get(self.projects_endpoint, headers=self.headers)
-        return self.parse_clockify_response_for_projects(response.json())
+        return list(self.iter_projects())
 
     def save_work_records(self, work_records: List[WorkRecord]):
         raise NotImplementedError
 
-    @api_rate_limit
-    def add_project(self, project_name) -> None:
-        """REST Request to add a project to Clockify"""
+    def add_project(self, project_name) -> Project:
+        """REST Request to add a project to Clockify.  Returns the new project, including its id."""
         json_request = {
             "name": project_name,
         }
-        response = requests.post(self.projects_endpoint, headers=self.headers, json=json_request)
-        if response.status_code != 201:
-            raise Exception("Project creation failed in Clockify! Response code : ", response.status_code)
+        response = self._request("POST", self.projects_endpoint, json=json_request)
+        check_response_status(response, 201, "Project creation failed in Clockify!")
+        return self.parse_clockify_response_for_projects([response.json()])[0]
+
+    def iter_tasks_for_project(self, project_id, is_active: bool = None) -> Iterator[Task]:
+        """REST Requests to get the tasks of a project in Clockify, one page at a time.
+        Without is_active, both ACTIVE and DONE tasks are returned."""
+        params = {} if is_active is None else {"is-active": str(is_active).lower()}
+        for page in self._iter_pages(self.projects_endpoint + "/%s/tasks" % project_id, params):
+            yield from self.parse_clockify_response_for_project_tasks(page)
+
+    def get_tasks_for_project(self, project_id) -> List[Task]:
+        """REST Request to get all tasks, ACTIVE and DONE, for a project in Clockify"""
+        return list(self.iter_tasks_for_project(project_id))
 
-    @api_rate_limit
     def get_active_tasks_for_project(self, project_id) -> List[Task]:
         """REST Request to get all active tasks for a project in Clockify"""
-        response = requests.get(self.projects_endpoint + "/%s/tasks?is-active=true" % project_id, headers=self.headers)
-        return self.parse_clockify_response_for_project_tasks(response.json())
+        return list(self.iter_tasks_for_project(project_id, is_active=True))
 
-    @api_rate_limit
     def get_done_tasks_for_project(self, project_id) -> List[Task]:
         """REST Request to get all non-active tasks for a project in Clockify"""
-        response = requests.get(self.projects_endpoint + "/%s/tasks?is-active=false" % project_id, headers=self.headers)
-        return self.parse_clockify_response_for_project_tasks(response.json())
+        return list(self.iter_tasks_for_project(project_id, is_active=False))
 
-    @api_rate_limit
-    def add_task(self, project_id, task_name) -> None:
-        """REST Request to add a task to Clockify"""
+    def add_task(self, project_id, task_name) -> Task:
+        """REST Request to add a task to Clockify.  Returns the new task, including its id."""
         json_request = {
             "name": task_name,
         }
-        response = requests.post(self.projects_endpoint + "/%s/tasks" % project_id, headers=self.headers,
-                                 json=json_request)
-        if response.status_code != 201:
-            raise Exception("Task creation failed in Clockify! Response code : ", response.status_code)
+        response = self._request("POST", self.projects_endpoint + "/%s/tasks" % project_id, json=json_request)
+        check_response_status(response, 201, "Task creation failed in Clockify!")
+        return self.parse_clockify_response_for_project_tasks([response.json()])[0]
 
-    @api_rate_limit
     def mark_task_as_done(self, project_id, task_id, task_name) -> None:
         """REST Request to mark a Clockify Task as DONE"""
         json_request = {
           "name": task_name,
-          "status": "DONE"
+          "status": TASK_STATUS_DONE
         }
-        response = requests.put(self.projects_endpoint + f'/{project_id}/tasks/{task_id}', headers=self.headers, json=json_request)
-        if response.status_code != 200:
-            raise Exception("Task update failed in Clockify! Response code : ", response.status_code)
+        response = self._request("PUT", self.projects_endpoint + f'/{project_id}/tasks/{task_id}', json=json_request)
+        check_response_status(response, 200, "Task update failed in Clockify!")
 
-    @api_rate_limit
     def mark_task_as_active(self, project_id, task_id, task_name) -> None:
         """REST Request to mark a Clockify Task as ACTIVE"""
         json_request = {
             "name": task_name,
-            "status": "ACTIVE"
+            "status": TASK_STATUS_ACTIVE
         }
-        response = requests.put(self.projects_endpoint + f'/{project_id}/tasks/{task_id}', headers=self.headers,
-                                json=json_request)
-        if response.status_code != 200:
-            raise Exception("Task update failed in Clockify! Response code : ", response.status_code)
+        response = self._request("PUT", self.projects_endpoint + f'/{project_id}/tasks/{task_id}', json=json_request)
+        check_response_status(response, 200, "Task update failed in Clockify!")
 
-    @api_rate_limit
     def delete(self, project_id, task_id) -> None:
         """REST Request to Delete a Task in Clockify"""
-        response = requests.delete(self.projects_endpoint + f'/{project_id}/tasks/{task_id}', headers=self.headers)
-        if response.status_code != 200:
-            raise Exception("Task deletion failed in Clockify! Response code : ", response.status_code)
+        response = self._request("DELETE", self.projects_endpoint + f'/{project_id}/tasks/{task_id}')
+        check_response_status(response, 200, "Task deletion failed in Clockify!")
 
 
     @staticmethod
@@ -152,7 +396,7 @@ class ClockifyTimeEntryProvider(TimeEntryProvider):
         """Parse JSON response to get a list of tasks"""
         tasks = []
         for task_json in json_response:
-            tasks.append(Task(str(task_json.get('name')), str(task_json.get('id'))))
+            tasks.append(Task(str(task_json.get('name')), str(task_json.get('id')), task_json.get('status')))
         return tasks
 
     @staticmethod
@@ -166,31 +410,49 @@ class ClockifyTimeEntryProvider(TimeEntryProvider):
         # print(projects)
 
     @staticmethod
-    def parse_clockify_response_for_work_records(json_response) -> List[WorkRecord]:
+    def parse_clockify_response_for_work_records(json_response,
+                                                 aggregator: WorkRecordAggregator = DEFAULT_AGGREGATOR
+                                                 ) -> List[WorkRecord]:
         """Parse Clockify response into WorkRecord objects.
-        Aggregates WorkRecords together if they are for the same WorkItem.
-        If the WorkItem is for Sales, do NOT aggregate WorkRecords."""
-        dates = json_response.get('groupOne')
-        work_records = []
-        for date in dates:
-            for task in date.get("children"):
-                # NOTE: This sums up all clockify time entries into a single Work Record and concats the descriptions
-                # together
-                # NOTE: Do not concatenate if it is a sales cost center work item
-                if 'Sales' in task.get("name"):
-                    # logic to deal with sales workItems that should not concatenate time_records
-                    for time_record in task.get("children"):
-                        work_records.append(WorkRecord(date=date.get("name"),
-                                                       time_spent=convert_to_hours(time_record.get('duration')),
-                                                       work_item_id=get_workitem_id_from_task_name(task.get("name")),
-                                                       description=time_record.get("name")))
-                else:
-                    task_work_records = task.get("children")
-                    task_work_record_descriptions = [task_workRecord.get("name")
-                                                     for task_workRecord in task_work_records]
-
-                    work_records.append(WorkRecord(date=date.get("name"),
-                                                   time_spent=convert_to_hours(task.get('duration')),
-                                                   work_item_id=get_workitem_id_from_task_name(task.get("name")),
-                                                   description=",".join(task_work_record_descriptions)))
-        return work_records
+        Aggregates WorkRecords together if they are for the same WorkItem, unless the aggregator's rules say the task
+        is imported entry by entry (by default, Sales WorkItems).
+        Durations are collected first and converted to hours in one batch."""
+        columns = ([], [], [], [])
+        for date in json_response.get('groupOne'):
+            ClockifyTimeEntryProvider.parse_clockify_date_group(date, *columns, aggregator=aggregator)
+        return WorkRecordBatch.from_durations(*columns).to_work_records()
+
+    @staticmethod
+    def parse_clockify_date_groups(date_groups: Iterable[dict],
+                                   aggregator: WorkRecordAggregator = DEFAULT_AGGREGATOR) -> Iterator[WorkRecord]:
+        """Parse DATE groups of a summary report one at a time, yielding the WorkRecords of each group"""
+        for date in date_groups:
+            columns = ([], [], [], [])
+            ClockifyTimeEntryProvider.parse_clockify_date_group(date, *columns, aggregator=aggregator)
+            yield from WorkRecordBatch.from_durations(*columns)
+
+    @staticmethod
+    def parse_clockify_date_group(date, work_record_dates: List[str], durations: List[float],
+                                  work_item_ids: List[str], descriptions: List[str],
+                                  aggregator: WorkRecordAggregator = DEFAULT_AGGREGATOR) -> None:
+        """Collect the date, duration, WorkItem id and description of the WorkRecords of one DATE group"""
+        date_name = date.get("name")
+        for task in date.get("children"):
+            # NOTE: This sums up all clockify time entries into a single Work Record and concats the descriptions
+            # together
+            # NOTE: Do not concatenate if the aggregation rules ask for one Work Record per entry, e.g. for the sales
+            # cost center work items
+            task_name = task.get("name")
+            work_item_id = get_workitem_id_from_task_name(task_name)
+            if aggregator.get_granularity(task_name) == GRANULARITY_ENTRY:
+                for time_record in task.get("children"):
+                    work_record_dates.append(date_name)
+                    durations.append(time_record.get('duration'))
+                    work_item_ids.append(work_item_id)
+                    descriptions.append(time_record.get("name"))
+            else:
+                task_work_records = task.get("children")
+                work_record_dates.append(date_name)
+                durations.append(task.get('duration'))
+                work_item_ids.append(work_item_id)
+                descriptions.append(",".join(task_workRecord.get("name") for task_workRecord in task_work_records))
@@ -0,0 +1,68 @@
+import random
+import time
+import unittest
+
+import requests
+
+from time_entry_tools.clockify_time_entry_provider import ClockifyTimeEntryProvider, ReportWindowError, \
+    split_date_range
+from time_entry_tools.rate_limiter import TokenBucketRateLimiter
+from time_entry_tools.workrecord import WorkRecord
+
+
+class WindowedClockifyClient(ClockifyTimeEntryProvider):
+    """Answers each summary report with one work record per window, after a random delay"""
+
+    def __init__(self, failures_per_window=0):
+        super().__init__("api-key", "workspace", rate_limiter=TokenBucketRateLimiter(1000, 1000))
+        self.failures_per_window = failures_per_window
+        self.requested_windows = []
+
+    def get_summary_report_work_records(self, start_date_time, end_date_time):
+        self.requested_windows.append(start_date_time)
+        if self.requested_windows.count(start_date_time) <= self.failures_per_window:
+            raise requests.ConnectionError("connection reset")
+        time.sleep(random.uniform(0, 0.02))
+        return [WorkRecord(start_date_time[:10], 1.0, "WI-1", start_date_time)]
+
+
+class SplitDateRangeTestCase(unittest.TestCase):
+    def test_windows_cover_the_range_and_start_at_midnight(self):
+        windows = split_date_range("2021-03-03T00:00:00", "2021-03-20T23:59:59.999999", 7)
+        self.assertEqual([("2021-03-03T00:00:00", "2021-03-09T23:59:59.999999"),
+                          ("2021-03-10T00:00:00", "2021-03-16T23:59:59.999999"),
+                          ("2021-03-17T00:00:00", "2021-03-20T23:59:59.999999")], windows)
+
+    def test_windows_shorter_than_a_day_are_rejected(self):
+        with self.assertRaises(ValueError):
+            split_date_range("2021-03-01T00:00:00", "2021-03-05T23:59:59", 0)
+
+    def test_short_range_is_a_single_window(self):
+        self.assertEqual([("2021-03-03T12:00:00", "2021-03-04T08:00:00")],
+                         split_date_range("2021-03-03T12:00:00", "2021-03-04T08:00:00", 7))
+
+
+class IterWorkRecordsTestCase(unittest.TestCase):
+    def test_concurrent_windows_are_yielded_in_date_order(self):
+        client = WindowedClockifyClient()
+        work_records = list(client.iter_work_records("2021-01-01T00:00:00", "2021-03-31T23:59:59.999999",
+                                                     window_days=7, max_workers=4))
+        self.assertEqual(13, len(work_records))
+        self.assertEqual(sorted(work_record.date for work_record in work_records),
+                         [work_record.date for work_record in work_records])
+
+    def test_failed_window_is_retried_on_its_own(self):
+        client = WindowedClockifyClient(failures_per_window=1)
+        work_records = client.get_work_records("2021-03-01T00:00:00", "2021-03-14T23:59:59.999999")
+        self.assertEqual(2, len(work_records))
+        self.assertEqual(4, len(client.requested_windows))
+
+    def test_window_failing_every_retry_raises_with_the_window(self):
+        client = WindowedClockifyClient(failures_per_window=10)
+        with self.assertRaises(ReportWindowError) as context:
+            list(client.iter_work_records("2021-03-01T00:00:00", "2021-03-14T23:59:59.999999", max_workers=1))
+        self.assertEqual("2021-03-01T00:00:00", context.exception.window_start)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Concurrent pipeline for writes to Clockify"""
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator
+
+from time_entry_tools.clockify_time_entry_provider import DEFAULT_WRITE_WORKERS
+
+# value is what the write returned, error the exception it raised; exactly one of them is set (value may be None)
+WriteResult = namedtuple("WriteResult", "operation value error")
+
+
+class ClockifyWritePipeline:
+    """Queue of writes to Clockify, sent by max_workers threads at the same time.
+    The writes go through the client, so they share its rate limiter and 429 handling.  A write that fails is reported
+    in its WriteResult and never stops the others.  A write can be given a callback that queues dependent writes, e.g.
+    the tasks of a project once the project is created."""
+
+    def __init__(self, max_workers: int = DEFAULT_WRITE_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clockify-write")
+        self._pending = {}  # future -> (operation, then)
+        self._ready = deque()
+
+    def close(self) -> None:
+        """Stop the write threads, after the queued writes are sent"""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, operation, write: Callable, *args, then: Callable[[WriteResult], None] = None) -> None:
+        """Queue write(*args).  operation identifies the write in its WriteResult.
+        then is called with the WriteResult, on the thread reading the results, before the result is returned."""
+        self._pending[self._executor.submit(write, *args)] = (operation, then)
+
+    def fail(self, operation, error: Exception) -> None:
+        """Report an operation as failed without sending it, e.g. because a write it depends on failed"""
+        self._ready.append(WriteResult(operation, None, error))
+
+    def results(self) -> Iterator[WriteResult]:
+        """WriteResults of the queued writes as they finish, until no write is left, including those queued by
+        callbacks"""
+        while self._pending or self._ready:
+            while self._ready:
+                yield self._ready.popleft()
+            if not self._pending:
+                return
+            done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                operation, then = self._pending.pop(future)
+                error = future.exception()
+                result = WriteResult(operation, None if error else future.result(), error)
+                self._ready.append(result)
+                if then is not None:
+                    then(result)
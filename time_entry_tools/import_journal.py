@@ -0,0 +1,154 @@
+"""Write-ahead journal of Library imports, so an interrupted import can be resumed instead of started over"""
+from collections import namedtuple
+from datetime import datetime
+import sqlite3
+import threading
+from typing import List, Optional
+
+from time_entry_tools.local_storage import default_data_path
+from time_entry_tools.time_entry_provider import SaveResult, SAVED_STATUSES
+from time_entry_tools.workrecord import WorkRecord
+
+DEFAULT_JOURNAL_FILENAME = "import_journal.db"
+JOURNAL_PENDING = "PENDING"  # Planned, with no outcome recorded yet
+
+JournalEntry = namedtuple("JournalEntry", "position work_record ledger_key status error")
+# unfetched_start is the start of the dates still to be fetched from Clockify, or None once every date is journaled
+JournaledImport = namedtuple("JournaledImport", "import_id library_user start_date end_date unfetched_start")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS imports (
+    id INTEGER PRIMARY KEY,
+    library_user TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    finished_at TEXT,
+    unfetched_start TEXT
+);
+CREATE INDEX IF NOT EXISTS unfinished_imports ON imports (library_user, finished_at);
+CREATE TABLE IF NOT EXISTS journal_entries (
+    import_id INTEGER NOT NULL REFERENCES imports (id),
+    position INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    work_item_id TEXT NOT NULL,
+    time_spent REAL NOT NULL,
+    description TEXT,
+    ledger_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (import_id, position)
+);
+"""
+
+
+class ImportJournal:
+    """SQLite journal of every planned WorkRecord of an import and its outcome.
+    The plan is written before anything is sent to the Library and each outcome as soon as it is known, so after a
+    crash the journal shows exactly which WorkRecords still need saving."""
+
+    def __init__(self, path: str = None):
+        self.path = path or default_data_path(DEFAULT_JOURNAL_FILENAME)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+            ## Journals written before imports were fetched in batches lack the column; all their dates are journaled
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(imports)")]
+            if "unfetched_start" not in columns:
+                self._connection.execute("ALTER TABLE imports ADD COLUMN unfetched_start TEXT")
+
+    def close(self) -> None:
+        """Close the journal database"""
+        self._connection.close()
+
+    def start_import(self, library_user: str, start_date: str, end_date: str, work_records: List[WorkRecord],
+                     ledger_keys: List[tuple], unfetched_start: str = None) -> int:
+        """Journal the WorkRecords an import is about to save.  Returns the id of the import.
+        An import fetched from Clockify in batches passes the start of the dates it has not fetched yet."""
+        now = datetime.now().isoformat()
+        with self._lock, self._connection:
+            import_id = self._connection.execute(
+                "INSERT INTO imports (library_user, start_date, end_date, created_at, unfetched_start) "
+                "VALUES (?, ?, ?, ?, ?)", (library_user, start_date, end_date, now, unfetched_start)).lastrowid
+            self._insert_entries(import_id, 0, work_records, ledger_keys, now)
+        return import_id
+
+    def add_entries(self, import_id: int, first_position: int, work_records: List[WorkRecord],
+                    ledger_keys: List[tuple], unfetched_start: str) -> None:
+        """Journal the next batch of WorkRecords of an import that is fetched and saved in batches, before they are
+        saved, together with the start of the dates that are still to be fetched after the batch"""
+        with self._lock, self._connection:
+            self._insert_entries(import_id, first_position, work_records, ledger_keys, datetime.now().isoformat())
+            self._connection.execute("UPDATE imports SET unfetched_start = ? WHERE id = ?",
+                                     (unfetched_start, import_id))
+
+    def finish_fetching(self, import_id: int) -> None:
+        """Record that every WorkRecord of the import's dates was fetched and journaled"""
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE imports SET unfetched_start = NULL WHERE id = ?", (import_id,))
+
+    def _insert_entries(self, import_id: int, first_position: int, work_records: List[WorkRecord],
+                        ledger_keys: List[tuple], now: str) -> None:
+        self._connection.executemany(
+            "INSERT INTO journal_entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+            ((import_id, position, work_record.date, work_record.work_item_id, work_record.time_spent,
+              work_record.description, ledger_key[2], JOURNAL_PENDING, now)
+             for position, (work_record, ledger_key) in enumerate(zip(work_records, ledger_keys), first_position)))
+
+    def record_result(self, import_id: int, position: int, result: SaveResult) -> None:
+        """Record the outcome of saving one journaled WorkRecord"""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE journal_entries SET status = ?, error = ?, updated_at = ? WHERE import_id = ? AND position = ?",
+                (result.status, None if result.error is None else str(result.error), datetime.now().isoformat(),
+                 import_id, position))
+
+    def finish_import(self, import_id: int) -> bool:
+        """Mark the import finished if every date was fetched and every WorkRecord was saved or skipped.  Returns
+        whether it is finished."""
+        with self._lock, self._connection:
+            remaining = self._connection.execute(
+                "SELECT COUNT(*) FROM journal_entries WHERE import_id = ? AND status NOT IN (%s)" % ", ".join(
+                    "?" * len(SAVED_STATUSES)), (import_id,) + SAVED_STATUSES).fetchone()[0]
+            remaining += self._connection.execute(
+                "SELECT COUNT(*) FROM imports WHERE id = ? AND unfetched_start IS NOT NULL", (import_id,)).fetchone()[0]
+            if remaining == 0:
+                self._connection.execute("UPDATE imports SET finished_at = ? WHERE id = ?",
+                                         (datetime.now().isoformat(), import_id))
+        return remaining == 0
+
+    def get_unfinished_import_ids(self, library_user: str) -> List[int]:
+        """Ids of the user's imports that still have WorkRecords to save, oldest first"""
+        with self._lock:
+            return [row[0] for row in self._connection.execute(
+                "SELECT id FROM imports WHERE library_user = ? AND finished_at IS NULL ORDER BY id", (library_user,))]
+
+    def get_import(self, import_id: int) -> Optional[JournaledImport]:
+        """The user, date range and unfetched dates of an import"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, library_user, start_date, end_date, unfetched_start FROM imports WHERE id = ?",
+                (import_id,)).fetchone()
+        return None if row is None else JournaledImport(*row)
+
+    def get_next_position(self, import_id: int) -> int:
+        """Position of the next WorkRecord journaled for an import"""
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM journal_entries "
+                                            "WHERE import_id = ?", (import_id,)).fetchone()[0]
+
+    def get_entries_to_resume(self, import_id: int) -> List[JournalEntry]:
+        """The journaled WorkRecords of an import that are pending or were not saved"""
+        return [entry for entry in self.get_entries(import_id) if entry.status not in SAVED_STATUSES]
+
+    def get_entries(self, import_id: int) -> List[JournalEntry]:
+        """Every journaled WorkRecord of an import, in the order they were planned"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT position, date, work_item_id, time_spent, description, ledger_hash, status, error "
+                "FROM journal_entries WHERE import_id = ? ORDER BY position", (import_id,)).fetchall()
+        return [JournalEntry(position, WorkRecord(date, time_spent, work_item_id, description),
+                             (date, work_item_id, ledger_hash), status, error)
+                for position, date, work_item_id, time_spent, description, ledger_hash, status, error in rows]
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from time_entry_tools.import_journal import ImportJournal, JOURNAL_PENDING
+from time_entry_tools.library_work_record_sync_service import LibraryWorkRecordSyncService, resume_imports
+from time_entry_tools.time_entry_provider import SAVE_SUCCESS
+from time_entry_tools.work_record_ledger import WorkRecordLedger
+from time_entry_tools.work_record_ledger_test import FakeClockifyClient, FakeLibraryClient
+from time_entry_tools.workrecord import WorkRecord
+
+
+class InterruptedLibraryClient(FakeLibraryClient):
+    """Saves the first few WorkRecords, then loses the connection"""
+
+    def __init__(self, records_before_interruption):
+        super().__init__()
+        self.records_before_interruption = records_before_interruption
+
+    def save_work_records(self, work_records, on_result=None):
+        def interrupting_on_result(index, result):
+            on_result(index, result)
+            if index + 1 == self.records_before_interruption:
+                raise ConnectionError("network blip")
+        return super().save_work_records(work_records, interrupting_on_result)
+
+
+class ImportJournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = ImportJournal(os.path.join(self.directory.name, "journal.db"))
+        self.ledger = WorkRecordLedger(os.path.join(self.directory.name, "ledger.db"))
+        self.work_records = [WorkRecord("2021-03-0%d" % day, 1.0, "WI-%d" % day, "work") for day in range(1, 6)]
+
+    def tearDown(self):
+        self.journal.close()
+        self.ledger.close()
+        self.directory.cleanup()
+
+    def interrupted_import(self):
+        service = LibraryWorkRecordSyncService(InterruptedLibraryClient(2), FakeClockifyClient(self.work_records),
+                                               "start", "end", self.ledger, journal=self.journal)
+        with self.assertRaises(ConnectionError):
+            service.sync()
+
+    def test_interrupted_import_journals_every_outcome(self):
+        self.interrupted_import()
+        import_id, = self.journal.get_unfinished_import_ids("jdoe")
+        self.assertEqual([SAVE_SUCCESS, SAVE_SUCCESS, JOURNAL_PENDING, JOURNAL_PENDING, JOURNAL_PENDING],
+                         [entry.status for entry in self.journal.get_entries(import_id)])
+
+    def test_resume_saves_only_the_remaining_work_records(self):
+        self.interrupted_import()
+        library_client = FakeLibraryClient()
+        results = resume_imports(library_client, self.journal, self.ledger)
+        self.assertEqual(["WI-3", "WI-4", "WI-5"], [work_record.work_item_id for work_record in library_client.saved])
+        self.assertTrue(all(result.status == SAVE_SUCCESS for result in results))
+        self.assertEqual([], self.journal.get_unfinished_import_ids("jdoe"))
+
+    def test_resume_skips_work_records_imported_since(self):
+        self.interrupted_import()
+        LibraryWorkRecordSyncService(FakeLibraryClient(), FakeClockifyClient(self.work_records), "start", "end",
+                                     self.ledger, journal=self.journal).sync()
+        library_client = FakeLibraryClient()
+        resume_imports(library_client, self.journal, self.ledger)
+        self.assertEqual([], library_client.saved)
+        self.assertEqual([], self.journal.get_unfinished_import_ids("jdoe"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,18 @@
 """Time Entry Tool to import time records from Clockify to the Library"""
 
+import asyncio
 import configparser
-from datetime import datetime, timedelta
-import os.path
-from typing import List
+from datetime import datetime
 
 from gooey import Gooey, GooeyParser
 import PySimpleGUI as sg
 
-from time_entry_tools.clockify_task_sync_service import ClockifyTaskSyncService
-from time_entry_tools.library_work_record_sync_service import LibraryWorkRecordSyncService
-from time_entry_tools.clockify_time_entry_provider import ClockifyTimeEntryProvider
-from time_entry_tools.library_time_entry_provider import LibraryTimeEntryProvider
+from time_entry_tools.client_factory import create_clockify_client, create_library_client, create_task_sync_service, \
+    create_work_record_sync_service
+from time_entry_tools.import_journal import ImportJournal
+from time_entry_tools.library_work_record_sync_service import resume_imports
+from time_entry_tools.time_entry_provider import SAVED_STATUSES
+from time_entry_tools.work_record_ledger import WorkRecordLedger
 
 
 def get_user_confirmation(prompt: str) -> bool:
@@ -26,29 +27,6 @@ def get_user_confirmation(prompt: str) -> bool:
     return event == 'Continue'
 
 
-def get_previously_completed_dates() -> List[str]:
-    """Get a list of dates the tool has already imported time entry.  Used to avoid duplication of time entry."""
-    if not os.path.exists('completed_dates.txt'):
-        return []
-    with open('completed_dates.txt', 'r') as file:
-        return file.read().splitlines()
-
-
-def is_selected_date_range_already_complete(start_date: datetime, end_date: datetime) -> bool:
-    """Verify the selected dates have not been selected for a past import."""
-    dates = [(start_date + timedelta(days=i)).isoformat() for i in range((end_date - start_date).days + 1)]
-    completed_dates = get_previously_completed_dates()
-    return any(date in completed_dates for date in dates)
-
-
-def save_dates_as_completed(start_date: datetime, end_date: datetime) -> None:
-    """Record the selected dates as completed."""
-    dates = [(start_date + timedelta(days=i)).isoformat() for i in range((end_date - start_date).days + 1)]
-    with open('completed_dates.txt', 'a') as file:
-        file.write('\n'.join(dates))
-        file.write('\n')
-
-
 # TODO Should add some version check/date built as a menu option
 @Gooey(program_name="Time Entry Export/Import", auto_start=True, use_cmd_args=True, default_size=(610, 610),
        menu=[{'name': 'Help', 'items': [{
@@ -89,42 +67,40 @@ def main():
     config = configparser.ConfigParser()
     config.read("config.cfg")
 
-    clockify_client = ClockifyTimeEntryProvider(config["Clockify"]["api_key"], config["Clockify"]["workspace_id"])
-    library_client = LibraryTimeEntryProvider(library_url=config['Library']['server_url'], user_name=args.user_name,
-                                              password=args.password,
-                                              library_workitem_query=config['Library']['workitem_query'])
+    clockify_client = create_clockify_client(config)
+    library_client = create_library_client(config, args.user_name, args.password)
 
     if args.only_sync:
-        task_sync_service = ClockifyTaskSyncService(library_client, clockify_client)
-        task_sync_service.sync()
+        with create_task_sync_service(library_client, clockify_client) as task_sync_service:
+            asyncio.run(task_sync_service.sync_async())
         return
 
-    if is_selected_date_range_already_complete(args.start_date, args.end_date):
-        ignore_warning = get_user_confirmation(
-            "WARNING: You have already exported today's time entry to the Library.  "
-            "Clicking Continue may result in duplicated time entry for today.")
-        if not ignore_warning:
-            return
+    journal = ImportJournal()
+    ledger = WorkRecordLedger()
+    if journal.get_unfinished_import_ids(library_client.library_user) and get_user_confirmation(
+            "An earlier import to the Library did not finish.  Save its remaining WorkRecords first?"):
+        resume_imports(library_client, journal, ledger, clockify_client)
 
-    work_record_sync_service = LibraryWorkRecordSyncService(library_client=library_client,
-                                                            clockify_client=clockify_client,
-                                                            start_date=args.start_date.isoformat(),
-                                                            end_date=args.end_date.isoformat())
+    # WorkRecords already imported to the Library are skipped, so re-running a date range does not duplicate them
+    work_record_sync_service = create_work_record_sync_service(library_client, clockify_client,
+                                                               args.start_date.isoformat(), args.end_date.isoformat(),
+                                                               ledger=ledger, journal=journal)
 
     # Show user the work records retrieved from source application
     work_record_sync_service.show_work_records_to_sync()
 
     user_confirmed = get_user_confirmation("Continue with Import to Library?")
     if user_confirmed:
-        work_record_sync_service.sync()
-        save_dates_as_completed(args.start_date, args.end_date)
+        results = work_record_sync_service.sync()
+        if not all(result.status in SAVED_STATUSES for result in results):
+            print("Some WorkRecords were not saved to the Library.  Run the import again to retry them.", flush=True)
     else:
         print("Library Import Cancelled")
 
     user_confirmed_sync = get_user_confirmation("Optional: Sync Active Tasks from Library to Clockify?")
     if user_confirmed_sync:
-        task_sync_service = ClockifyTaskSyncService(library_client, clockify_client)
-        task_sync_service.sync()
+        with create_task_sync_service(library_client, clockify_client) as task_sync_service:
+            asyncio.run(task_sync_service.sync_async())
     else:
         print("Active Task Sync Cancelled")
 
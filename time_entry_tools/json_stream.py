@@ -0,0 +1,131 @@
+"""Incremental decoding of the items of one large array in a JSON document, e.g. a Clockify summary report"""
+import codecs
+import json
+import re
+from typing import Iterable, Iterator, List
+
+_STRUCTURE = re.compile(r'[\[\]{}":]')  # Outside strings, only these characters change the scanner's state
+_STRING_SPECIAL = re.compile(r'["\\]')
+_BETWEEN_ITEMS = re.compile(r'[\s,]*')
+
+
+class JsonArrayItemScanner:
+    """Scans JSON text fed in pieces and decodes the items of the array stored under key in the top level object,
+    as soon as each item's text is complete.
+    Only the text of the item being read is kept, so memory is bounded by the largest item, not the document."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start = None
+        self._last_string = None  # Last string of the top level object, the key when followed by ':'
+        self._current_key = None
+        self._in_array = False
+        self._next_attempt_length = 0
+        self.finished = False  # The array was read to its end
+
+    def feed(self, text: str, final: bool = False) -> List:
+        """Scan more of the document, final when there is no more.  Returns the items completed by this text."""
+        items = []
+        buffer = self._buffer + text
+        position = self._position
+        if not self._in_array and not self.finished:
+            position = self._find_array(buffer, position)
+        if self._in_array:
+            position = self._read_items(buffer, position, items, final)
+        if final and self._in_array:
+            raise ValueError("JSON document ended inside the %r array" % self.key)
+        ## Keep only the text that is still needed: the current item, or the current top level string
+        keep_from = position
+        if self._in_string and self._depth == 1:
+            keep_from = self._string_start
+            self._string_start = 0
+        self._buffer = buffer[keep_from:]
+        self._position = position - keep_from
+        return items
+
+    def _find_array(self, buffer: str, position: int) -> int:
+        """Follow the structure of the document up to the start of the array.  Returns the position reached."""
+        while True:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, position)
+                if match is None:
+                    return len(buffer)
+                if match.group() == "\\":
+                    if match.end() == len(buffer):
+                        return match.start()  # The escaped character is in the next piece
+                    position = match.end() + 1
+                    continue
+                self._in_string = False
+                if self._depth == 1:
+                    self._last_string = buffer[self._string_start + 1:match.start()]
+                position = match.end()
+                continue
+            match = _STRUCTURE.search(buffer, position)
+            if match is None:
+                return len(buffer)
+            character = match.group()
+            position = match.end()
+            if character == '"':
+                self._in_string = True
+                self._string_start = match.start()
+            elif character == ":":
+                if self._depth == 1:
+                    self._current_key = self._last_string
+            elif character in "[{":
+                self._depth += 1
+                if self._depth == 2 and character == "[" and self._current_key == self.key:
+                    self._in_array = True
+                    return position
+            else:
+                self._depth -= 1
+
+    def _read_items(self, buffer: str, position: int, items: List, final: bool) -> int:
+        """Decode the complete items from position on.  Returns the start of the first incomplete item."""
+        while True:
+            position = _BETWEEN_ITEMS.match(buffer, position).end()
+            if position == len(buffer):
+                return position
+            if buffer[position] == "]":
+                self._in_array = False
+                self.finished = True
+                return position + 1
+            ## Decoding fails until the item is complete; wait for twice the text of the last attempt, so a large
+            ## item spread over many pieces is not decoded again for every piece
+            if not final and len(buffer) - position < self._next_attempt_length:
+                return position
+            try:
+                item, end = self._decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                self._next_attempt_length = 2 * (len(buffer) - position)
+                return position
+            if not isinstance(item, (dict, list, str)) and not _ends_value(buffer, end):
+                ## A number or literal is only complete when followed by a separator, e.g. "12." may go on as "12.5"
+                if final:
+                    raise ValueError("Incomplete JSON value in the %r array" % self.key)
+                self._next_attempt_length = len(buffer) - position + 1
+                return position
+            self._next_attempt_length = 0
+            items.append(item)
+            position = end
+
+
+def _ends_value(buffer: str, end: int) -> bool:
+    return end < len(buffer) and buffer[end] in ",] \t\r\n"
+
+
+def iter_json_array_items(chunks: Iterable[bytes], key: str, encoding: str = "utf-8") -> Iterator:
+    """Decode the items of the array under key in a JSON object given as chunks of bytes, one item at a time"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    scanner = JsonArrayItemScanner(key)
+    for chunk in chunks:
+        yield from scanner.feed(decoder.decode(chunk))
+        if scanner.finished:
+            return
+    yield from scanner.feed(decoder.decode(b"", final=True), final=True)
@@ -0,0 +1,62 @@
+import json
+import random
+import unittest
+
+from fake_servers.fake_clockify_server import FakeClockifyServer
+from time_entry_tools.json_stream import iter_json_array_items
+
+
+def split_randomly(content: bytes, generator: random.Random):
+    position = 0
+    while position < len(content):
+        size = generator.randint(1, 40)
+        yield content[position:position + size]
+        position += size
+
+
+class IterJsonArrayItemsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.document = {
+            "totals": [{"groupOne": "decoy", "nested": {"groupOne": [{"name": "not this one"}]}}],
+            "groupOne": [{"name": "2024-01-0%d" % day,
+                          "children": [{"name": 'Task "%d" \\ é \U0001f600 ]}' % day, "duration": 3600 * day}]}
+                         for day in range(1, 6)] + [[1, 2], "text", 12.5],
+            "after": {"groupOne": ["ignored"]},
+        }
+        self.content = json.dumps(self.document, ensure_ascii=False).encode("utf-8")
+
+    def test_items_are_the_same_for_any_split_of_the_content(self):
+        generator = random.Random(24)
+        for _ in range(50):
+            items = list(iter_json_array_items(split_randomly(self.content, generator), "groupOne"))
+            self.assertEqual(self.document["groupOne"], items)
+        one_byte_chunks = (self.content[index:index + 1] for index in range(len(self.content)))
+        self.assertEqual(self.document["groupOne"], list(iter_json_array_items(one_byte_chunks, "groupOne")))
+
+    def test_missing_key_yields_nothing(self):
+        self.assertEqual([], list(iter_json_array_items([self.content], "groupTwo")))
+
+    def test_truncated_content_raises(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array_items([self.content[:len(self.content) // 2]], "groupOne"))
+
+
+class StreamedSummaryReportTestCase(unittest.TestCase):
+    def test_streamed_report_gives_the_same_work_records(self):
+        with FakeClockifyServer() as server:
+            for day in range(1, 4):
+                for task in ("WI-1 Development", "WI-2 Sales call"):
+                    for entry in range(3):
+                        server.add_time_entry("2024-01-0%d" % day, task, "entry %d" % entry, 900 * (entry + 1))
+            work_records = {}
+            for stream_reports in (False, True):
+                client = server.create_client(stream_reports=stream_reports)
+                work_records[stream_reports] = [
+                    (record.date, record.time_spent, record.work_item_id, record.description) for record in
+                    client.get_summary_report_work_records("2024-01-01T00:00:00Z", "2024-01-03T23:59:59Z")]
+        self.assertEqual(12, len(work_records[True]))
+        self.assertEqual(work_records[False], work_records[True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,14 @@
+"""Export the Library tasks of a user to a CSV file"""
+import csv
+
+
+def export_library_tasks_to_file(library_client, filename):
+    ## The same cached lookup as the task sync, so running both does not query the Library twice
+    workitems = library_client.get_workitems_for_user()
+    formatted_workitems = ([workitem.project.name, workitem.id + " - " + workitem.title] for workitem in workitems)
+    header = ['Project', 'Task']
+
+    with open(filename, "w", newline='') as file:
+        writer = csv.writer(file, delimiter=',')
+        writer.writerow(header)
+        writer.writerows(formatted_workitems)
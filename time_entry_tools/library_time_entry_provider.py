@@ -1,12 +1,31 @@
 """Library specific Time Entry Provider"""
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+import re
 import ssl
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
 from requests import Session
 from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+from lxml import etree
+import zeep
+from zeep.cache import SqliteCache
+from zeep.exceptions import Fault
 from zeep.plugins import HistoryPlugin
 from zeep import Client, Transport
+from zeep.wsdl.utils import etree_to_string
 
-from time_entry_tools.workrecord import round_hours_for_library
-from time_entry_tools.time_entry_provider import TimeEntryProvider
+from time_entry_tools.local_storage import default_cache_path
+from time_entry_tools.lookup_cache import LookupCache, CACHE_ENUM_OPTIONS, CACHE_USER, CACHE_WORKITEMS, get_cache_key
+from time_entry_tools.metrics import MetricsRegistry, SERVICE_LIBRARY, get_metrics_registry
+from time_entry_tools.session_token_cache import SessionTokenCache
+from time_entry_tools.workrecord import WorkRecord, get_reconcile_keys, parse_library_duration
+from time_entry_tools.time_entry_provider import TimeEntryProvider, SaveResult, SAVE_SUCCESS, SAVE_FAILED, \
+    SAVE_RETRY, SAVE_SKIPPED
 
 
 class SslContextHttpAdapter(HTTPAdapter):
@@ -20,122 +39,554 @@ class SslContextHttpAdapter(HTTPAdapter):
         return super(SslContextHttpAdapter, self).init_poolmanager(*args, **kwargs)
 
 
+class MetricsTransport(Transport):
+    """zeep Transport recording the latency and size of every SOAP call, by operation"""
+
+    def __init__(self, metrics: MetricsRegistry, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    def post_xml(self, address, envelope, headers):
+        body = envelope.find("{%s}Body" % etree.QName(envelope).namespace)
+        operation = etree.QName(body[0]).localname if body is not None and len(body) else "unknown"
+        message = etree_to_string(envelope)
+        started = time.perf_counter()
+        try:
+            response = self.post(address, message, headers)
+        except Exception:
+            self.metrics.record_request(SERVICE_LIBRARY, operation, time.perf_counter() - started, None, len(message))
+            raise
+        self.metrics.record_request(SERVICE_LIBRARY, operation, time.perf_counter() - started, response.status_code,
+                                    len(message), len(response.content))
+        return response
+
+
+# Fault messages of the Library for a session header that is missing, expired or ended, after the Java exception name
+LIBRARY_SESSION_FAULT_MESSAGES = frozenset(("Not authorized.", "Session expired.", "Invalid session."))
+_JAVA_EXCEPTION_PREFIX = re.compile(r"^(?:[\w$]+\.)+[\w$]+: ")
+WORKITEM_ID_QUERY_CHUNK_SIZE = 100  # Keep id:(...) queries well under the Library's query length limits
+WSDL_CACHE_VERSION = 1  # Bump to discard every cached WSDL/XSD document
+DEFAULT_WSDL_CACHE_DAYS = 7
+
+
+def create_wsdl_cache(max_age_days: float = DEFAULT_WSDL_CACHE_DAYS) -> Optional[SqliteCache]:
+    """On-disk cache of the WSDL and XSD documents of the Library SOAP services.
+    Documents are cached by their full URL, so each Library server has its own entries, and are downloaded again
+    once older than max_age_days.  The file name carries the cache and zeep versions, so upgrades start clean.
+    Returns None (no caching) when max_age_days is 0."""
+    if max_age_days <= 0:
+        return None
+    path = default_cache_path("wsdl_cache_v%d_zeep%s.db" % (WSDL_CACHE_VERSION, zeep.__version__))
+    return SqliteCache(path=path, timeout=int(max_age_days * 24 * 60 * 60))
+
+
+def is_session_fault(fault: Fault) -> bool:
+    """True when the Library rejected a request because its session is missing, expired or invalid.
+    Only the Library's exact session fault messages count: other authorization faults, e.g. for a work item the user
+    may not change, are errors of the request itself and must not cause a login and a retry of a write."""
+    message = _JAVA_EXCEPTION_PREFIX.sub("", (fault.message or "").strip())
+    return message in LIBRARY_SESSION_FAULT_MESSAGES
+
+
+def get_updated_since_query(updated_since: datetime) -> str:
+    """Library query for work items updated on or after the given day"""
+    return "updated:[%s TO $today$]" % updated_since.strftime("%Y%m%d")
+
+
+def get_library_user_id(user) -> Optional[str]:
+    """Id of a Library user, which is only part of the URI when the user is not resolved"""
+    if user is None:
+        return None
+    return user.id or (user.uri or "").rsplit("}", 1)[-1]
+
+
+def get_workitem_id_from_uri(uri: str) -> str:
+    """Id of a work item from its URI, e.g. subterra:data-service:objects:/default/Project${WorkItem}ID"""
+    return uri.rsplit("}", 1)[-1]
+
+
+def get_library_text(text) -> str:
+    """Plain content of a Library text field"""
+    if text is None or isinstance(text, str):
+        return text or ""
+    return text.content or ""
+
+
+def format_library_date(library_date) -> str:
+    """Library date as YYYY-MM-DD, the format of WorkRecord dates"""
+    if isinstance(library_date, datetime):
+        return library_date.date().isoformat()
+    if isinstance(library_date, date):
+        return library_date.isoformat()
+    return str(library_date)[:10]
+
+
 class Polarion:
-    """SOAP Accessor class to Polarion"""
-    def __init__(self, url, username, password, library_workitem_query):
+    """SOAP Accessor class to Polarion.
+    The SOAP clients are created on first use, and the login is skipped when a cached session is still valid.
+    If the Library rejects a session, the accessor logs in again and retries the call once.
+    Only the session client keeps a history, for the session header of the login response.  With keep_history, the
+    tracker and project clients keep their last envelopes too, which can be large, for debugging."""
+    def __init__(self, url, username, password, library_workitem_query, wsdl_cache: SqliteCache = None,
+                 session_token_cache: SessionTokenCache = None, metrics: MetricsRegistry = None,
+                 keep_history: bool = False):
         self.url = url
         self.username = username
         self.password = password
         self.library_workitem_query = library_workitem_query
         self.history = HistoryPlugin()
+        self._plugins = [self.history] if keep_history else []
+        self.session_token_cache = session_token_cache
+        self.metrics = metrics or get_metrics_registry()
+        self.session_header_element = None
+        self._lock = threading.RLock()
+        self.__session = None
+        self.__tracker = None
+        self.__project_service = None
 
         tmp_session = Session()
         tmp_adapter = SslContextHttpAdapter()
         tmp_session.mount("https://librarymanagement.swisslog.com/", tmp_adapter)
-        tmp_transport = Transport(session=tmp_session)
-
-        self.session = Client(wsdl=self.url + '/ws/services/SessionWebService?wsdl', plugins=[self.history],
-                              transport=tmp_transport)
-        self.session.service.logIn(self.username, self.password)
-        tree = self.history.last_received['envelope'].getroottree()
-        self.session_header_element = tree.find('.//{http://ws.polarion.com/session}sessionID')
-
-        self.__tracker = Client(wsdl=self.url + '/ws/services/TrackerWebService?wsdl', plugins=[self.history],
-                                transport=tmp_transport)
-        self.__tracker.set_default_soapheaders([self.session_header_element])
-        self.__tracker.wsdl.messages['{http://ws.polarion.com/TrackerWebService}getModuleWorkItemsRequest'].parts[
-            'parameters'].element.type._element[1].nillable = True
-        self.__tracker.service.getModuleWorkItemUris._proxy._binding.get(
-            'getModuleWorkItemUris').input.body.type._element[1].nillable = True
-        self.__tracker.service.getModuleWorkItemUris._proxy._binding.get('getModuleWorkItems').input.body.type._element[
-            1].nillable = True
-
-        self.__project_service = Client(wsdl=self.url + '/ws/services/ProjectWebService?wsdl', plugins=[self.history],
-                                        transport=tmp_transport)
-        self.__project_service.set_default_soapheaders([self.session_header_element])
+        self._transport = MetricsTransport(self.metrics, session=tmp_session, cache=wsdl_cache)
+
+    @property
+    def session(self):
+        """SOAP Client to the Library Session Service"""
+        with self._lock:
+            if self.__session is None:
+                self.__session = Client(wsdl=self.url + '/ws/services/SessionWebService?wsdl', plugins=[self.history],
+                                        transport=self._transport)
+            return self.__session
+
+    def log_in(self) -> None:
+        """Log in to the Library and use the new session for every SOAP client"""
+        with self._lock:
+            self.session.service.logIn(self.username, self.password)
+            tree = self.history.last_received['envelope'].getroottree()
+            self.session_header_element = tree.find('.//{http://ws.polarion.com/session}sessionID')
+            if self.session_token_cache is not None:
+                self.session_token_cache.set(self.url, self.username,
+                                             etree.tostring(self.session_header_element).decode("utf-8"))
+            for client in (self.__tracker, self.__project_service):
+                if client is not None:
+                    client.set_default_soapheaders([self.session_header_element])
+
+    def close(self) -> None:
+        """Close the HTTP connections of the SOAP clients"""
+        self._transport.session.close()
+
+    def get_session_header(self):
+        """The session header sent with every request, from the session cache or a new login"""
+        with self._lock:
+            if self.session_header_element is None and self.session_token_cache is not None:
+                cached_session_header = self.session_token_cache.get(self.url, self.username)
+                if cached_session_header is not None:
+                    self.session_header_element = etree.fromstring(cached_session_header)
+            if self.session_header_element is None:
+                self.log_in()
+            return self.session_header_element
 
     @property
     def tracker(self):
         """SOAP Client to the Library Tracker Service"""
-        return self.__tracker
+        with self._lock:
+            if self.__tracker is None:
+                tracker = Client(wsdl=self.url + '/ws/services/TrackerWebService?wsdl', plugins=self._plugins,
+                                 transport=self._transport)
+                tracker.set_default_soapheaders([self.get_session_header()])
+                tracker.wsdl.messages['{http://ws.polarion.com/TrackerWebService}getModuleWorkItemsRequest'].parts[
+                    'parameters'].element.type._element[1].nillable = True
+                tracker.service.getModuleWorkItemUris._proxy._binding.get(
+                    'getModuleWorkItemUris').input.body.type._element[1].nillable = True
+                tracker.service.getModuleWorkItemUris._proxy._binding.get(
+                    'getModuleWorkItems').input.body.type._element[1].nillable = True
+                self.__tracker = tracker
+            return self.__tracker
 
     @property
     def project_service(self):
         """SOAP Client to the Library Project Service"""
-        return self.__project_service
+        with self._lock:
+            if self.__project_service is None:
+                project_service = Client(wsdl=self.url + '/ws/services/ProjectWebService?wsdl',
+                                         plugins=self._plugins, transport=self._transport)
+                project_service.set_default_soapheaders([self.get_session_header()])
+                self.__project_service = project_service
+            return self.__project_service
+
+    def _call(self, client_name: str, operation: str, *args):
+        """Call a SOAP operation of the tracker or project_service client.
+        When the Library rejects the session (e.g. it expired), log in again and retry once."""
+        try:
+            return getattr(self, client_name).service[operation](*args)
+        except Fault as fault:
+            if not is_session_fault(fault):
+                raise
+        self.metrics.record_retry(SERVICE_LIBRARY, operation, "session")
+        if self.session_token_cache is not None:
+            self.session_token_cache.invalidate(self.url, self.username)
+        self.log_in()
+        return getattr(self, client_name).service[operation](*args)
 
     def get_user(self, user_id):
         """Query the Library to get the User's Information"""
-        return self.project_service.service.getUser(user_id)
+        return self._call('project_service', 'getUser', user_id)
 
     def get_workitem_by_id(self, work_item_id):
         """Query the Library to get a single Work Item with the selected ID"""
-        return self.tracker.service.queryWorkItems('id:%s' % work_item_id, 'id',
-                                                   ['id', 'title', 'description', 'linkedWorkItems'])[0]
+        return self._call('tracker', 'queryWorkItems', 'id:%s' % work_item_id, 'id',
+                          ['id', 'title', 'description', 'linkedWorkItems'])[0]
 
-    def get_workitems_for_user(self, user_id):
-        """Query the Library to get all work items assigned to the user and matching the configurable query"""
+    def get_workitems_for_user(self, user_id, updated_since: datetime = None) -> list:
+        """Query the Library to get all work items assigned to the user and matching the configurable query.
+        With updated_since, only the work items updated since then."""
+        return list(self.iter_workitems_for_user(user_id, updated_since))
+
+    def iter_workitems_for_user(self, user_id, updated_since: datetime = None,
+                                page_size: int = WORKITEM_ID_QUERY_CHUNK_SIZE) -> Iterator:
+        """Generator of the work items assigned to the user and matching the configurable query, a page at a time"""
         query = self.library_workitem_query + f" AND assignee.id:{user_id}"
-        return self.tracker.service.queryWorkItems(query, 'id', ['id', 'title', 'project'])
+        if updated_since is not None:
+            query += " AND " + get_updated_since_query(updated_since)
+        return self.iter_workitems(query, ['id', 'title', 'project', 'updated'], page_size)
+
+    def iter_workitems(self, query: str, fields: List[str], page_size: int = WORKITEM_ID_QUERY_CHUNK_SIZE) -> Iterator:
+        """Generator of the work items matching a query, in id order.
+        Only the URIs of the matches are fetched in one call.  The work items themselves are fetched page_size at a
+        time with id:(...) queries, so no response holds more than one page however many work items match."""
+        return self._query_workitems_with_ids(self.get_workitem_ids(query), fields, page_size)
+
+    def get_workitem_ids(self, query: str) -> List[str]:
+        """Query the Library for the IDs of the work items matching a query, without fetching the work items"""
+        return [get_workitem_id_from_uri(uri) for uri in self._call('tracker', 'queryWorkItemUris', query, 'id') or []]
+
+    def get_workitem_ids_for_user_updated_since(self, user_id, updated_since: datetime) -> List[str]:
+        """Query the Library for the IDs of all work items assigned to the user and updated since the given day,
+        whether or not they match the configurable query"""
+        return self.get_workitem_ids(f"assignee.id:{user_id} AND " + get_updated_since_query(updated_since))
+
+    def get_workitems_with_ids(self, work_item_ids) -> list:
+        """Query the Library to get all work items with the selected IDs, in chunked bulk queries"""
+        return list(self._query_workitems_with_ids(work_item_ids, ['id', 'title', 'project']))
+
+    def _query_workitems_with_ids(self, work_item_ids: Iterable[str], fields: List[str],
+                                  chunk_size: int = WORKITEM_ID_QUERY_CHUNK_SIZE) -> Iterator:
+        """Query the Library for the selected Work Items in chunked bulk queries.
+        Work Items that do not exist are left out of the result."""
+        work_item_ids = sorted(set(work_item_ids))
+        for chunk_start in range(0, len(work_item_ids), chunk_size):
+            chunk = work_item_ids[chunk_start:chunk_start + chunk_size]
+            yield from self._call('tracker', 'queryWorkItems', 'id:(%s)' % " ".join(chunk), 'id', fields) or []
+
+    def get_workitem_uris_for_ids(self, work_item_ids: Iterable[str],
+                                  chunk_size: int = WORKITEM_ID_QUERY_CHUNK_SIZE) -> Dict[str, str]:
+        """Query the Library for the URIs of the selected Work Items, in chunked bulk queries.
+        Work Items that do not exist are left out of the result."""
+        return {workitem.id: workitem.uri
+                for workitem in self._query_workitems_with_ids(work_item_ids, ['id', 'uri'], chunk_size)}
 
-    def get_workitems_with_ids(self, work_item_ids):
-        """Query the Library to get all work items with the selected IDs"""
-        return self.tracker.service.queryWorkItems('id:(%s)' % " ".join(work_item_ids), 'id',
-                                                   ['id', 'title', 'project'])
+    def get_workitems_with_work_records(self, work_item_ids: Iterable[str],
+                                        chunk_size: int = WORKITEM_ID_QUERY_CHUNK_SIZE) -> list:
+        """Query the Library for the URIs and work records of the selected Work Items, in chunked bulk queries"""
+        return list(self._query_workitems_with_ids(work_item_ids, ['id', 'uri', 'workRecords'], chunk_size))
 
     def add_work_record(self, work_item_uri, user, date, time_spent):
         """Send request to libray to add a work record to a work item"""
-        return self.tracker.service.createWorkRecord(work_item_uri, user, date, time_spent)
+        return self._call('tracker', 'createWorkRecord', work_item_uri, user, date, time_spent)
 
     def add_work_record_with_comment(self, work_item_uri, user, date, time_spent, enum_type, comment):
         """Send request to libray to add a work record to a work item"""
-        return self.tracker.service.createWorkRecordWithTypeAndComment(work_item_uri, user, date, enum_type, time_spent,
-                                                                       comment)
+        return self._call('tracker', 'createWorkRecordWithTypeAndComment', work_item_uri, user, date, enum_type,
+                          time_spent, comment)
 
     def get_all_enum_option_ids_for_id(self, project_id, enum_id):
         """Query the Library to get the possible IDs for a selected enum"""
-        return self.tracker.service.getAllEnumOptionIdsForId(project_id, enum_id)
+        return self._call('tracker', 'getAllEnumOptionIdsForId', project_id, enum_id)
 
 
 class LibraryTimeEntryProvider(TimeEntryProvider):
-    """Library specific Time Entry Provider"""
+    """Library specific Time Entry Provider.
+    Logs in as user_name and works with the work items and work records of library_user, which defaults to the same
+    user.  A different library_user lets one account sync on behalf of a whole team.
+    With reconcile_existing, WorkRecords already in the Library are skipped instead of being saved again.  The Library
+    only returns every work record of a work item, of all users and dates, so this is off by default: the ledger and
+    journal already prevent duplicates of the tools' own imports.
+    With a lookup_cache, the user's work items, users and enum options are looked up once per time to live, except
+    for work items streamed a page at a time by iter_workitems_for_user.  Saving
+    work records invalidates the cached work items, since the Library updates a work item when a record is added.
+    The save workers and their SOAP clients are kept for the next save until the provider is closed."""
 
-    def __init__(self, library_url: str, user_name: str, password: str, library_workitem_query: str):
+    def __init__(self, library_url: str, user_name: str, password: str, library_workitem_query: str,
+                 save_workers: int = 1, wsdl_cache_days: float = DEFAULT_WSDL_CACHE_DAYS,
+                 session_token_cache: SessionTokenCache = None, library_user: str = None,
+                 reconcile_existing: bool = False, metrics: MetricsRegistry = None, keep_soap_history: bool = False,
+                 lookup_cache: LookupCache = None):
         self.library_url = library_url
         self.user_name = user_name
+        self.library_user = library_user or user_name
         self.password = password
         self.library_workitem_query = library_workitem_query
-        self.polarion = Polarion(library_url, user_name, password, library_workitem_query)
+        self.save_workers = save_workers
+        self.reconcile_existing = reconcile_existing
+        self.wsdl_cache = create_wsdl_cache(wsdl_cache_days)
+        self.session_token_cache = session_token_cache
+        self.metrics = metrics or get_metrics_registry()
+        self.keep_soap_history = keep_soap_history
+        self.lookup_cache = lookup_cache
+        self.polarion = self.create_polarion()
+        self._executor = None
+        self._executor_workers = 0
+        self._idle_workers: List[Tuple[Polarion, object]] = []  # Polarion accessor and user of each idle worker
+        self._workers_lock = threading.Lock()
+
+    def close(self) -> None:
+        """Stop the save workers and close the connections of every SOAP client"""
+        with self._workers_lock:
+            executor, self._executor, self._executor_workers = self._executor, None, 0
+            idle_workers, self._idle_workers = self._idle_workers, []
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for polarion, _ in idle_workers:
+            polarion.close()
+        self.polarion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def create_polarion(self) -> Polarion:
+        """Create a Polarion accessor sharing this provider's WSDL and session caches"""
+        return Polarion(self.library_url, self.user_name, self.password, self.library_workitem_query,
+                        self.wsdl_cache, self.session_token_cache, self.metrics, self.keep_soap_history)
+
+    def _cached(self, namespace: str, key: str, load: Callable[[], object]):
+        """Result of a lookup, from the lookup cache when there is one"""
+        if self.lookup_cache is None:
+            return load()
+        return self.lookup_cache.get_or_load(namespace, key, load)
+
+    def invalidate_workitems(self) -> None:
+        """Forget the cached work items of the library user, e.g. after changing them"""
+        if self.lookup_cache is not None:
+            self.lookup_cache.invalidate(CACHE_WORKITEMS, get_cache_key(self.library_url, self.library_user))
+
+    def get_user(self, polarion: Polarion = None):
+        """Get the library user's Information, using the given Polarion accessor if it has to be queried"""
+        polarion = polarion or self.polarion
+        return self._cached(CACHE_USER, get_cache_key(self.library_url, self.library_user),
+                            lambda: polarion.get_user(self.library_user))
 
     def get_enum_options_for_enum(self, project_id, enum_id):
         """Get the possible IDs for a selected library enum"""
-        return self.polarion.get_all_enum_option_ids_for_id(project_id, enum_id)
+        return self._cached(CACHE_ENUM_OPTIONS, get_cache_key(self.library_url, project_id, enum_id),
+                            lambda: self.polarion.get_all_enum_option_ids_for_id(project_id, enum_id))
 
-    def get_workitems_for_user(self):
+    def get_workitems_for_user(self, updated_since: datetime = None):
         """Get workItems for the library user using the configured query"""
-        return self.polarion.get_workitems_for_user(self.user_name)
+        return self._cached(CACHE_WORKITEMS, get_cache_key(self.library_url, self.library_user,
+                                                           self.library_workitem_query, updated_since),
+                            lambda: self.polarion.get_workitems_for_user(self.library_user, updated_since))
+
+    def iter_workitems_for_user(self, updated_since: datetime = None) -> Iterator:
+        """Generator of the library user's workItems matching the configured query, fetched a page at a time.
+        The lookup cache is not used, since caching would hold every work item in memory at once."""
+        return self.polarion.iter_workitems_for_user(self.library_user, updated_since)
+
+    def get_workitem_ids_for_user_updated_since(self, updated_since: datetime) -> List[str]:
+        """Get the IDs of the library user's workItems updated since the given day, matching the query or not"""
+        return self.polarion.get_workitem_ids_for_user_updated_since(self.library_user, updated_since)
 
     def get_workitems_with_ids(self, workitem_ids):
         """Get WorkItems with the specified IDs"""
         return self.polarion.get_workitems_with_ids(workitem_ids)
 
-    def save_work_records(self, work_records: list):
-        """Save a list of WorkRecords to the Library"""
-        ## Get User object from library
-        user = self.polarion.get_user(self.user_name)
-        for work_record in work_records:  ##TODO could paralleize this as each request has to wait for connection/response to the library, meaning it takes awhile (15sec) to do a week's worth of time entry
-            print("Saving work record in Library.  WorkItem: %s, Date:%s, TimeSpent: %s, Comment: %s" % (
-                work_record.work_item_id, work_record.date, round_hours_for_library(work_record.time_spent),
-                work_record.description), flush=True)
-            ## Get WorkItemURI
-            work_item_uri = None
-            work_item_uri = self.polarion.get_workitem_by_id(work_record.work_item_id).uri
+    def save_work_records(self, work_records: List[WorkRecord], max_workers: int = None,
+                          on_result: Callable[[int, SaveResult], None] = None) -> List[SaveResult]:
+        """Save a list of WorkRecords to the Library.
+        With more than one worker the records are written concurrently, each worker using its own SOAP clients.
+        on_result is called with the index and SaveResult of each WorkRecord as soon as it is saved, on the calling
+        thread.  Returns one SaveResult per WorkRecord, in the same order as the input."""
+        if not work_records:
+            return []
+        max_workers = max_workers or self.save_workers
+        on_result = on_result or (lambda index, result: None)
+        ## Resolve every WorkItem URI, and find the work records already saved, up front in bulk queries
+        work_item_ids = [work_record.work_item_id for work_record in work_records]
+        if self.reconcile_existing:
+            workitems = self.polarion.get_workitems_with_work_records(work_item_ids)
+            work_item_uris = {workitem.id: workitem.uri for workitem in workitems}
+            dates = [work_record.date for work_record in work_records]
+            existing_keys = Counter(get_reconcile_keys(self.parse_library_work_records(
+                workitems, self.library_user, min(dates), max(dates))))
+        else:
+            work_item_uris = self.polarion.get_workitem_uris_for_ids(work_item_ids)
+            existing_keys = Counter()
+
+        ## The keys hold the time spent as saved in the Library, rounded for every WorkRecord at once
+        keys = get_reconcile_keys(work_records)
+        library_time_spent = [key[2] for key in keys]
+        results = [None] * len(work_records)
+        indexes_to_save = []
+        for index, (work_record, key) in enumerate(zip(work_records, keys)):
+            if existing_keys[key] > 0:
+                existing_keys[key] -= 1
+                results[index] = SaveResult(work_record, SAVE_SKIPPED, None)
+                on_result(index, results[index])
+            else:
+                indexes_to_save.append(index)
+
+        if not indexes_to_save:
+            return results
+        try:
+            if max_workers <= 1 or len(indexes_to_save) <= 1:
+                user = self.get_user()
+                for index in indexes_to_save:
+                    results[index] = self._save_work_record(self.polarion, user, work_records[index],
+                                                            library_time_spent[index], work_item_uris)
+                    on_result(index, results[index])
+                return results
+
+            if self.lookup_cache is not None:
+                self.get_user()  # Cache the user up front, instead of every worker querying it at the same time
+            self._save_in_workers(self._get_executor(max_workers), max_workers, work_records, library_time_spent,
+                                  indexes_to_save, work_item_uris, results, on_result)
+            return results
+        finally:
+            self.invalidate_workitems()
+
+    def _get_executor(self, max_workers: int) -> ThreadPoolExecutor:
+        """The save worker threads, started on the first concurrent save and kept for the next ones"""
+        with self._workers_lock:
+            if self._executor_workers < max_workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="library-save")
+                self._executor_workers = max_workers
+            return self._executor
+
+    def _save_in_workers(self, executor: ThreadPoolExecutor, max_workers: int, work_records: List[WorkRecord],
+                         library_time_spent: List[str], indexes_to_save: List[int], work_item_uris: Dict[str, str], results: List[SaveResult],
+                         on_result: Callable[[int, SaveResult], None]) -> None:
+        """Save the selected WorkRecords on the executor's threads, max_workers at a time.
+        Only as many writes as there are workers are queued, so when on_result raises or the save is interrupted, no
+        new write is started, and the writes already sent are still handed to on_result before the error is raised.
+        Otherwise a write could reach the Library without being recorded, and be saved again by a resume."""
+        remaining_indexes = iter(indexes_to_save)
+        futures = {}
+
+        def submit_next() -> None:
+            index = next(remaining_indexes, None)
+            if index is not None:
+                futures[executor.submit(self._save_work_record_in_worker, work_records[index],
+                                        library_time_spent[index], work_item_uris)] = index
+
+        for _ in range(max_workers):
+            submit_next()
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures.pop(future)
+                    results[index] = future.result()
+                    on_result(index, results[index])
+                    submit_next()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            for future, index in futures.items():
+                if future.cancelled():
+                    continue
+                try:
+                    results[index] = future.result()
+                    on_result(index, results[index])
+                except Exception as error:
+                    print("Could not record the outcome of saving %s on %s: %r" % (
+                        work_records[index].work_item_id, work_records[index].date, error), flush=True)
+            raise
+
+    def _save_work_record_in_worker(self, work_record: WorkRecord, time_spent: str,
+                                    work_item_uris: Dict[str, str]) -> SaveResult:
+        """Save a single WorkRecord using SOAP clients that no other worker is using at the same time"""
+        try:
+            worker = self._take_worker_polarion()
+        except (RequestsConnectionError, Timeout) as error:
+            return SaveResult(work_record, SAVE_RETRY, error)
+        except Exception as error:
+            return SaveResult(work_record, SAVE_FAILED, error)
+        try:
+            return self._save_work_record(*worker, work_record, time_spent, work_item_uris)
+        finally:
+            with self._workers_lock:
+                self._idle_workers.append(worker)
+
+    def _take_worker_polarion(self) -> Tuple[Polarion, object]:
+        """Take an idle worker's Polarion accessor and Library user, or create them for a new worker.
+        zeep clients keep per-client state, so they are not shared between workers.  They are kept on the provider,
+        so later saves reuse their clients and WSDLs.  With a session token cache, the workers reuse the Library
+        session instead of each logging in."""
+        with self._workers_lock:
+            if self._idle_workers:
+                return self._idle_workers.pop()
+        polarion = self.create_polarion()
+        return polarion, self.get_user(polarion)
+
+    @staticmethod
+    def _save_work_record(polarion: Polarion, user, work_record: WorkRecord, time_spent: str,
+                          work_item_uris: Dict[str, str]) -> SaveResult:
+        """Save a single WorkRecord to the Library, with its time spent already rounded for the Library"""
+        print("Saving work record in Library.  WorkItem: %s, Date:%s, TimeSpent: %s, Comment: %s" % (
+            work_record.work_item_id, work_record.date, time_spent,
+            work_record.description), flush=True)
+        work_item_uri = work_item_uris.get(work_record.work_item_id)
+        if work_item_uri is None:
+            return SaveResult(work_record, SAVE_FAILED, "WorkItem %s not found in the Library" % work_record.work_item_id)
+        try:
             ## Add work record to workItem
             temp_enum = {
                 'id': 'admin'}  ##TODO find a good way to set this enum in clockify or lookup a default in the library project space
-            self.polarion.add_work_record_with_comment(work_item_uri, user, work_record.date,
-                                                       round_hours_for_library(work_record.time_spent), temp_enum,
-                                                       work_record.description)
+            polarion.add_work_record_with_comment(work_item_uri, user, work_record.date, time_spent, temp_enum,
+                                                  work_record.description)
+        except (RequestsConnectionError, Timeout) as error:
+            return SaveResult(work_record, SAVE_RETRY, error)
+        except Exception as error:
+            return SaveResult(work_record, SAVE_FAILED, error)
+        return SaveResult(work_record, SAVE_SUCCESS, None)
+
+    def get_work_records(self, start_date: str, end_date: str, work_item_ids: Iterable[str] = None) -> List[WorkRecord]:
+        """Get the library user's work records between the dates (inclusive), in bulk queries.
+        Without work_item_ids, the work items assigned to the user and updated since start_date are searched."""
+        if work_item_ids is None:
+            work_item_ids = self.polarion.get_workitem_ids_for_user_updated_since(
+                self.library_user, datetime.fromisoformat(start_date))
+        workitems = self.polarion.get_workitems_with_work_records(work_item_ids)
+        return self.parse_library_work_records(workitems, self.library_user, start_date[:10], end_date[:10])
 
-    def get_work_records(self, start_date: str, end_date: str):
-        raise NotImplementedError
+    @staticmethod
+    def parse_library_work_records(workitems, library_user: str, first_date: str = None,
+                                   last_date: str = None) -> List[WorkRecord]:
+        """Parse the work records of Library work items into WorkRecord objects.
+        Only the records of library_user, dated between first_date and last_date (inclusive, YYYY-MM-DD), are kept."""
+        work_records = []
+        for workitem in workitems:
+            library_work_records = workitem.workRecords
+            library_work_records = getattr(library_work_records, 'WorkRecord', library_work_records) or []
+            for library_work_record in library_work_records:
+                work_record_date = format_library_date(library_work_record.date)
+                if get_library_user_id(library_work_record.user) != library_user:
+                    continue
+                if (first_date and work_record_date < first_date) or (last_date and work_record_date > last_date):
+                    continue
+                time_spent = library_work_record.timeSpent
+                time_spent = getattr(time_spent, 'literal', time_spent)
+                try:
+                    hours = parse_library_duration(time_spent or "")
+                except ValueError as error:
+                    print("Ignoring Library work record of %s on %s: %s" % (workitem.id, work_record_date, error),
+                          flush=True)
+                    continue
+                work_records.append(WorkRecord(date=work_record_date, time_spent=hours,
+                                               work_item_id=workitem.id,
+                                               description=get_library_text(library_work_record.comment) or None))
+        return work_records
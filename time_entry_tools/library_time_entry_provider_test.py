@@ -0,0 +1,118 @@
+from datetime import date
+import sqlite3
+import time
+from types import SimpleNamespace
+import unittest
+
+from zeep.exceptions import Fault
+
+from time_entry_tools.library_time_entry_provider import LibraryTimeEntryProvider, Polarion, is_session_fault
+from time_entry_tools.time_entry_provider import SAVE_SKIPPED, SAVE_SUCCESS
+from time_entry_tools.workrecord import WorkRecord
+
+
+def library_work_record(day, time_spent, user_id, comment):
+    return SimpleNamespace(date=date(2021, 3, day), timeSpent=SimpleNamespace(literal=time_spent),
+                           user=SimpleNamespace(id=None, uri="subterra:data-service:objects:/default/${User}" + user_id),
+                           comment=comment)
+
+
+class FakePolarion:
+    def __init__(self, workitems, save_seconds=0.0):
+        self.workitems = workitems
+        self.save_seconds = save_seconds
+        self.created = []
+
+    def get_workitems_with_work_records(self, work_item_ids):
+        return [workitem for workitem in self.workitems if workitem.id in set(work_item_ids)]
+
+    def get_workitem_uris_for_ids(self, work_item_ids):
+        return {workitem.id: workitem.uri for workitem in self.get_workitems_with_work_records(work_item_ids)}
+
+    def get_user(self, user_id):
+        return SimpleNamespace(id=user_id)
+
+    def add_work_record_with_comment(self, work_item_uri, user, date, time_spent, enum_type, comment):
+        time.sleep(self.save_seconds)
+        self.created.append((work_item_uri, date, time_spent, comment))
+
+
+class ReconcileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workitems = [
+            SimpleNamespace(id="WI-1", uri="uri-1", workRecords=SimpleNamespace(WorkRecord=[
+                library_work_record(1, "1 1/4h", "jdoe", "design"),
+                library_work_record(1, "1 1/4h", "asmith", "design"),
+                library_work_record(2, "1/2h", "jdoe", "call"),
+                library_work_record(9, "2h", "jdoe", "outside range"),
+                library_work_record(3, "about an hour", "jdoe", "unreadable")])),
+            SimpleNamespace(id="WI-2", uri="uri-2", workRecords=None)]
+        self.provider = LibraryTimeEntryProvider("https://library", "jdoe", "secret", "type:task", wsdl_cache_days=0,
+                                                 reconcile_existing=True)
+        self.provider.polarion = FakePolarion(self.workitems)
+
+    def test_get_work_records_for_user_and_dates(self):
+        work_records = self.provider.get_work_records("2021-03-01T00:00:00", "2021-03-05T23:59:59",
+                                                      work_item_ids=["WI-1", "WI-2"])
+        self.assertEqual([("2021-03-01", 1.25, "WI-1", "design"), ("2021-03-02", 0.5, "WI-1", "call")],
+                         [(work_record.date, work_record.time_spent, work_record.work_item_id,
+                           work_record.description) for work_record in work_records])
+
+    def test_only_new_work_records_are_saved(self):
+        work_records = [WorkRecord("2021-03-01", 1.13, "WI-1", "design"),
+                        WorkRecord("2021-03-02", 0.5, "WI-1", "call"),
+                        WorkRecord("2021-03-02", 0.5, "WI-1", "call"),
+                        WorkRecord("2021-03-02", 1.0, "WI-2", "new")]
+        results = self.provider.save_work_records(work_records)
+        self.assertEqual([SAVE_SKIPPED, SAVE_SKIPPED, SAVE_SUCCESS, SAVE_SUCCESS],
+                         [result.status for result in results])
+        self.assertEqual([("uri-1", "2021-03-02", "0.5h", "call"), ("uri-2", "2021-03-02", "1.0h", "new")],
+                         self.provider.polarion.created)
+
+
+class ConcurrentSaveTestCase(unittest.TestCase):
+    def test_every_write_sent_is_recorded_when_recording_fails(self):
+        polarion = FakePolarion([SimpleNamespace(id="WI-1", uri="uri-1", workRecords=None)], save_seconds=0.01)
+        provider = LibraryTimeEntryProvider("https://library", "jdoe", "secret", "type:task", wsdl_cache_days=0,
+                                            reconcile_existing=False)
+        provider.polarion = polarion
+        provider.create_polarion = lambda: polarion
+        recorded = []
+
+        def on_result(index, result):
+            recorded.append(index)
+            if len(recorded) == 1:
+                raise sqlite3.OperationalError("database is locked")
+
+        work_records = [WorkRecord("2021-03-01", 0.25, "WI-1", "entry %d" % index) for index in range(40)]
+        with self.assertRaises(sqlite3.OperationalError):
+            provider.save_work_records(work_records, max_workers=4, on_result=on_result)
+        self.assertLessEqual(len(polarion.created), 8)
+        self.assertEqual(len(polarion.created), len(recorded))
+
+
+class SessionFaultTestCase(unittest.TestCase):
+    def test_only_session_faults_are_recognised(self):
+        self.assertTrue(is_session_fault(Fault("Not authorized.")))
+        self.assertTrue(is_session_fault(Fault("com.polarion.platform.security.AccessDeniedException: Not authorized.")))
+        self.assertFalse(is_session_fault(Fault("Not authorized to modify work item WI-1")))
+        self.assertFalse(is_session_fault(Fault("User jdoe is not authorized for project Sales")))
+
+    def test_authorization_fault_of_a_write_is_not_retried(self):
+        calls = []
+
+        def create_work_record(*args):
+            calls.append(args)
+            raise Fault("Not authorized to modify work item WI-1")
+
+        polarion = Polarion("https://library", "jdoe", "secret", "type:task")
+        polarion._Polarion__tracker = SimpleNamespace(
+            service={"createWorkRecordWithTypeAndComment": create_work_record})
+        polarion.log_in = lambda: self.fail("Logged in again after an authorization fault")
+        with self.assertRaises(Fault):
+            polarion.add_work_record_with_comment("uri-1", None, "2021-03-01", "1h", {"id": "admin"}, "design")
+        self.assertEqual(1, len(calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,18 +1,150 @@
 """Service to sync work records from Clockify to the Library"""
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, List, Tuple
+
+from time_entry_tools.import_journal import ImportJournal, JournalEntry, JOURNAL_PENDING
+from time_entry_tools.time_entry_provider import SaveResult, SAVE_RETRY, SAVE_SKIPPED, SAVED_STATUSES
+from time_entry_tools.work_record_ledger import WorkRecordLedger, get_ledger_keys
+from time_entry_tools.workrecord import WorkRecord, get_reconcile_keys
+
+DEFAULT_PIPELINE_BATCH_SIZE = 100
+
+
+def iter_batches_by_date(work_records: Iterable[WorkRecord], batch_size: int) -> Iterator[List[WorkRecord]]:
+    """Group WorkRecords in date order into batches of about batch_size, never splitting a date between batches.
+    The Library reconciles a batch against the work records already saved on its dates, so identical records of one
+    day must be saved in the same batch, or the later ones would be taken for the earlier ones and skipped."""
+    batch = []
+    for work_record in work_records:
+        if len(batch) >= batch_size and work_record.date != batch[-1].date:
+            yield batch
+            batch = []
+        batch.append(work_record)
+    if batch:
+        yield batch
+
+
+def get_next_day_start(work_record_date: str) -> str:
+    """Beginning of the day after a WorkRecord date, as a date range start"""
+    return datetime.combine(date.fromisoformat(work_record_date) + timedelta(days=1), time.min).isoformat()
 
 
 class LibraryWorkRecordSyncService:
-    """Service to sync work records from Clockify to the Library"""
-    def __init__(self, library_client, clockify_client, start_date, end_date):
+    """Service to sync work records from Clockify to the Library.
+    With a ledger, WorkRecords that were already imported are skipped, so a date range can safely be imported again.
+    skip_imported=False imports everything anyway, still recording the saved WorkRecords in the ledger.
+    With a journal, the import is journaled before it starts, so it can be resumed if it is interrupted.
+    With prefetch=False nothing is fetched up front.  sync then streams the WorkRecords from Clockify and saves them a
+    batch at a time, so the Library writes start while later Clockify report windows are still being fetched."""
+    def __init__(self, library_client, clockify_client, start_date, end_date, ledger: WorkRecordLedger = None,
+                 skip_imported: bool = True, journal: ImportJournal = None, prefetch: bool = True):
         self._library_client = library_client
         self._clockify_client = clockify_client
         self.start_date = start_date
         self.end_date = end_date
-        self.work_records = self._clockify_client.get_work_records(self.start_date, self.end_date)
+        self.ledger = ledger
+        self.skip_imported = skip_imported
+        self.journal = journal
+        self.library_user = library_client.library_user
+        self.work_records = None  # Only known up front with prefetch
+        self.skipped_work_records = []
+        self._ledger_keys = None
+        if prefetch:
+            self.work_records = self._clockify_client.get_work_records(self.start_date, self.end_date)
+            self._ledger_keys = get_ledger_keys(self.work_records)
+            if self.ledger is not None and skip_imported:
+                self.skip_imported_work_records()
+
+    def skip_imported_work_records(self) -> None:
+        """Leave out the WorkRecords the ledger has as already imported"""
+        self.work_records, self._ledger_keys = self._leave_out_imported(self.work_records, self._ledger_keys)
+
+    def _leave_out_imported(self, work_records: List[WorkRecord],
+                            ledger_keys: List[tuple]) -> Tuple[List[WorkRecord], List[tuple]]:
+        """The WorkRecords, and their keys, that the ledger does not have as imported.  The others are added to
+        skipped_work_records."""
+        if self.ledger is None or not self.skip_imported:
+            return work_records, ledger_keys
+        imported_keys = self.ledger.get_imported_keys(self.library_user, ledger_keys)
+        work_records_to_save, keys_to_save = [], []
+        for work_record, key in zip(work_records, ledger_keys):
+            if key in imported_keys:
+                self.skipped_work_records.append(work_record)
+            else:
+                work_records_to_save.append(work_record)
+                keys_to_save.append(key)
+        return work_records_to_save, keys_to_save
 
-    def sync(self) -> None:
+    def sync(self) -> List[SaveResult]:
         """Sync workRecords from Clockify to the Libray"""
-        self._library_client.save_work_records(self.work_records)
+        if self.work_records is None:
+            return self.sync_pipelined()
+        import_id = None
+        if self.journal is not None and self.work_records:
+            import_id = self.journal.start_import(self.library_user, self.start_date, self.end_date,
+                                                  self.work_records, self._ledger_keys)
+        results = save_work_records(self._library_client, self.work_records, self._ledger_keys,
+                                    list(range(len(self.work_records))), self.ledger, self.journal, import_id)
+        self.show_results(results)
+        return results
+
+    def sync_pipelined(self, batch_size: int = DEFAULT_PIPELINE_BATCH_SIZE) -> List[SaveResult]:
+        """Stream WorkRecords from Clockify and save them to the Library a batch of whole days at a time.
+        The import is journaled before anything is fetched, so if it is interrupted, resume saves what was journaled
+        and fetches the remaining dates."""
+        import_id = None
+        if self.journal is not None:
+            import_id = self.journal.start_import(self.library_user, self.start_date, self.end_date, [], [],
+                                                  unfetched_start=self.start_date)
+        results = self.save_streamed(import_id, batch_size=batch_size)
+        if self.skipped_work_records:
+            print("Skipped %d WorkRecords already imported to the Library" % len(self.skipped_work_records),
+                  flush=True)
+        self.show_results(results)
+        return results
+
+    def save_streamed(self, import_id: int = None, first_position: int = 0,
+                      batch_size: int = DEFAULT_PIPELINE_BATCH_SIZE) -> List[SaveResult]:
+        """Save the WorkRecords of the date range to the Library as they are fetched, a batch of whole days at a time.
+        Each batch is journaled just before it is saved, in one step with the start of the dates still to fetch, so a
+        resume either saves a batch from the journal or fetches it again, never both.  The journaled import is only
+        finished when the whole range was fetched: an interrupted or failed fetch leaves it to resume."""
+        results = []
+        occurrences = Counter()
+        for batch in iter_batches_by_date(self._clockify_client.iter_work_records(self.start_date, self.end_date),
+                                          batch_size):
+            work_records, ledger_keys = self._leave_out_imported(batch, get_ledger_keys(batch, occurrences))
+            first_batch_position = first_position + len(results)
+            positions = list(range(first_batch_position, first_batch_position + len(work_records)))
+            if import_id is not None:
+                self.journal.add_entries(import_id, first_batch_position, work_records, ledger_keys,
+                                         get_next_day_start(batch[-1].date))
+            if not work_records:
+                continue
+            print("Saving %d WorkRecords from %s to %s" % (len(work_records), work_records[0].date,
+                                                           work_records[-1].date), flush=True)
+            results.extend(save_work_records(self._library_client, work_records, ledger_keys, positions,
+                                             self.ledger, self.journal, import_id, finish=False))
+        if import_id is not None:
+            self.journal.finish_fetching(import_id)
+            self.journal.finish_import(import_id)
+        return results
+
+    def show_results(self, results: List[SaveResult]) -> None:
+        """Show the user how many WorkRecords were already in the Library, and which could not be saved"""
+        skipped = sum(result.status == SAVE_SKIPPED for result in results)
+        if skipped:
+            print("Skipped %d WorkRecords already in the Library" % skipped, flush=True)
+        self.show_failed_work_records(results)
+
+    @staticmethod
+    def show_failed_work_records(results: List[SaveResult]) -> None:
+        """Show the user which WorkRecords could not be saved to the Library"""
+        for result in results:
+            if result.status not in SAVED_STATUSES:
+                print(f"{result.status}: WorkRecord Date: {result.work_record.date} | "
+                      f"WorkItem: {result.work_record.work_item_id} | Error: {result.error}", flush=True)
 
     def show_work_records_to_sync(self) -> None:
         """Show the user what WorkRecords were selected for import to the Library"""
@@ -21,3 +153,97 @@ class LibraryWorkRecordSyncService:
                 f"WorkRecord Date: {work_record.date} | WorkItem: {work_record.work_item_id} | Timespent: {work_record.time_spent} | Description: {work_record.description}")
         total = sum([work_record.time_spent for work_record in self.work_records])
         print("Total hours: ", round(total, 2), flush=True)
+        if self.skipped_work_records:
+            print("Skipping %d WorkRecords already imported to the Library" % len(self.skipped_work_records),
+                  flush=True)
+
+
+def save_work_records(library_client, work_records: List[WorkRecord], ledger_keys: List[tuple], positions: List[int],
+                      ledger: WorkRecordLedger = None, journal: ImportJournal = None,
+                      import_id: int = None, finish: bool = True) -> List[SaveResult]:
+    """Save WorkRecords to the Library, recording each outcome in the journal and ledger as soon as it is known.
+    With finish, the journaled import is finished afterwards if every WorkRecord was saved."""
+    def on_result(index: int, result: SaveResult) -> None:
+        ## Ledger first: resuming skips anything the ledger has, so a crash between the two writes never duplicates
+        if ledger is not None and result.status in SAVED_STATUSES:
+            ledger.record_imported(library_client.library_user, [ledger_keys[index]])
+        if import_id is not None:
+            journal.record_result(import_id, positions[index], result)
+
+    results = library_client.save_work_records(work_records, on_result=on_result)
+    if import_id is not None and finish:
+        journal.finish_import(import_id)
+    return results
+
+
+def resume_imports(library_client, journal: ImportJournal, ledger: WorkRecordLedger = None,
+                   clockify_client=None) -> List[SaveResult]:
+    """Save the pending and failed WorkRecords of the user's unfinished imports, without fetching them again.
+    WorkRecords the ledger has as imported since, e.g. by a later import of the same dates, are marked skipped instead.
+    A WorkRecord that was being saved when the import was interrupted is still pending, and one whose write failed on
+    the connection is to retry: either may have reached the Library, so they are only saved again when the Library
+    does not have them.
+    The dates an import never fetched from Clockify are then fetched with clockify_client, and saved."""
+    results = []
+    for import_id in journal.get_unfinished_import_ids(library_client.library_user):
+        entries = journal.get_entries_to_resume(import_id)
+        if ledger is not None:
+            imported_keys = ledger.get_imported_keys(library_client.library_user,
+                                                     [entry.ledger_key for entry in entries])
+            for entry in entries:
+                if entry.ledger_key in imported_keys:
+                    journal.record_result(import_id, entry.position,
+                                          SaveResult(entry.work_record, SAVE_SKIPPED, None))
+            entries = [entry for entry in entries if entry.ledger_key not in imported_keys]
+        entries = leave_out_found_in_library(library_client, journal, import_id, entries, ledger)
+        print("Resuming import %d: %d WorkRecords left to save" % (import_id, len(entries)), flush=True)
+        import_results = save_work_records(library_client, [entry.work_record for entry in entries],
+                                           [entry.ledger_key for entry in entries],
+                                           [entry.position for entry in entries], ledger, journal, import_id)
+        LibraryWorkRecordSyncService.show_failed_work_records(import_results)
+        results.extend(import_results)
+
+        journaled_import = journal.get_import(import_id)
+        if journaled_import.unfetched_start is None:
+            continue
+        if clockify_client is None:
+            print("Import %d has not fetched %s to %s from Clockify yet" % (
+                import_id, journaled_import.unfetched_start, journaled_import.end_date), flush=True)
+            continue
+        print("Resuming import %d: fetching %s to %s from Clockify" % (
+            import_id, journaled_import.unfetched_start, journaled_import.end_date), flush=True)
+        service = LibraryWorkRecordSyncService(library_client, clockify_client, journaled_import.unfetched_start,
+                                               journaled_import.end_date, ledger, journal=journal, prefetch=False)
+        import_results = service.save_streamed(import_id, journal.get_next_position(import_id))
+        LibraryWorkRecordSyncService.show_failed_work_records(import_results)
+        results.extend(import_results)
+    return results
+
+
+def leave_out_found_in_library(library_client, journal: ImportJournal, import_id: int, entries: List[JournalEntry],
+                               ledger: WorkRecordLedger = None) -> List[JournalEntry]:
+    """The entries to save again, leaving out pending and to retry entries that the Library already has.
+    Their write may have reached the Library with the response lost, e.g. on a timeout, so the user's work records on
+    their work items and dates are looked up.  Library work records matching entries of the import that are already
+    saved are not counted, so identical records of one day are still told apart.  The entries found are marked skipped
+    and added to the ledger."""
+    uncertain_entries = [entry for entry in entries if entry.status in (JOURNAL_PENDING, SAVE_RETRY)]
+    if not uncertain_entries:
+        return entries
+    dates = [entry.work_record.date for entry in uncertain_entries]
+    library_keys = Counter(get_reconcile_keys(library_client.get_work_records(
+        min(dates), max(dates), {entry.work_record.work_item_id for entry in uncertain_entries})))
+    library_keys.subtract(get_reconcile_keys(entry.work_record for entry in journal.get_entries(import_id)
+                                             if entry.status in SAVED_STATUSES))
+    found_positions = set()
+    for entry, key in zip(uncertain_entries, get_reconcile_keys(entry.work_record for entry in uncertain_entries)):
+        if library_keys[key] > 0:
+            library_keys[key] -= 1
+            found_positions.add(entry.position)
+            if ledger is not None:
+                ledger.record_imported(library_client.library_user, [entry.ledger_key])
+            journal.record_result(import_id, entry.position, SaveResult(entry.work_record, SAVE_SKIPPED, None))
+    if found_positions:
+        print("Import %d: %d WorkRecords whose outcome was unknown are already in the Library" % (
+            import_id, len(found_positions)), flush=True)
+    return [entry for entry in entries if entry.position not in found_positions]
@@ -0,0 +1,133 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from time_entry_tools.import_journal import ImportJournal
+from time_entry_tools.library_work_record_sync_service import LibraryWorkRecordSyncService, iter_batches_by_date, \
+    resume_imports
+from time_entry_tools.time_entry_provider import SaveResult, TimeEntryProvider, SAVE_SUCCESS, SAVED_STATUSES
+from time_entry_tools.work_record_ledger import WorkRecordLedger
+from time_entry_tools.workrecord import WorkRecord
+
+
+class StreamingClockifyClient:
+    def __init__(self, work_records, events):
+        self.work_records = work_records
+        self.events = events
+
+    def iter_work_records(self, start_date, end_date):
+        for work_record in self.work_records:
+            self.events.append(("fetched", work_record.date))
+            yield work_record
+
+
+class InterruptedClockifyClient:
+    """Streams the WorkRecords of the requested dates, and is interrupted before the interrupt_date"""
+
+    def __init__(self, work_records, interrupt_date=None):
+        self.work_records = work_records
+        self.interrupt_date = interrupt_date
+
+    def iter_work_records(self, start_date, end_date):
+        for work_record in self.work_records:
+            if work_record.date == self.interrupt_date:
+                raise KeyboardInterrupt()
+            if start_date[:10] <= work_record.date <= end_date[:10]:
+                yield work_record
+
+
+class RecordingLibraryClient:
+    library_user = "jdoe"
+
+    def __init__(self, events):
+        self.events = events
+        self.saved = []
+
+    def save_work_records(self, work_records, on_result=None):
+        results = []
+        for index, work_record in enumerate(work_records):
+            self.events.append(("saved", work_record.date))
+            self.saved.append(work_record)
+            results.append(SaveResult(work_record, SAVE_SUCCESS, None))
+            on_result(index, results[-1])
+        return results
+
+
+class ListProvider(TimeEntryProvider):
+    def __init__(self):
+        self.batches = []
+
+    def get_work_records(self, start_date, end_date):
+        return [WorkRecord(start_date, 1.0, "WI-1", "design")]
+
+    def save_work_records(self, work_records):
+        self.batches.append(work_records)
+
+
+class LibraryWorkRecordSyncServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.ledger = WorkRecordLedger(os.path.join(self.directory.name, "ledger.db"))
+        self.journal = ImportJournal(os.path.join(self.directory.name, "journal.db"))
+        self.work_records = [WorkRecord("2021-03-01", 1.0, "WI-1", "design"),
+                             WorkRecord("2021-03-02", 0.5, "WI-2 - Sales", "call"),
+                             WorkRecord("2021-03-02", 0.5, "WI-2 - Sales", "call"),
+                             WorkRecord("2021-03-03", 2.0, "WI-1", "design")]
+
+    def tearDown(self):
+        self.ledger.close()
+        self.journal.close()
+        self.directory.cleanup()
+
+    def test_batches_never_split_a_date(self):
+        self.assertEqual([["2021-03-01", "2021-03-02", "2021-03-02"], ["2021-03-03"]],
+                         [[work_record.date for work_record in batch]
+                          for batch in iter_batches_by_date(self.work_records, 2)])
+
+    def test_pipelined_sync_saves_before_everything_is_fetched(self):
+        events = []
+        library_client = RecordingLibraryClient(events)
+        service = LibraryWorkRecordSyncService(library_client, StreamingClockifyClient(self.work_records, events),
+                                               "2021-03-01", "2021-03-03", self.ledger, journal=self.journal,
+                                               prefetch=False)
+        results = service.sync_pipelined(batch_size=1)
+        self.assertLess(events.index(("saved", "2021-03-01")), events.index(("fetched", "2021-03-03")))
+        self.assertEqual(self.work_records, library_client.saved)
+        self.assertTrue(all(result.status in SAVED_STATUSES for result in results))
+        self.assertEqual([], self.journal.get_unfinished_import_ids("jdoe"))
+        self.assertEqual(list(range(4)), [entry.position for entry in self.journal.get_entries(1)])
+
+        library_client = RecordingLibraryClient([])
+        LibraryWorkRecordSyncService(library_client, StreamingClockifyClient(self.work_records, []), "2021-03-01",
+                                     "2021-03-03", self.ledger, journal=self.journal, prefetch=False).sync()
+        self.assertEqual([], library_client.saved)
+
+    def test_interrupted_pipelined_import_is_resumed_from_the_dates_never_fetched(self):
+        library_client = RecordingLibraryClient([])
+        clockify_client = InterruptedClockifyClient(self.work_records, "2021-03-03")
+        service = LibraryWorkRecordSyncService(library_client, clockify_client, "2021-03-01T00:00:00",
+                                               "2021-03-03T23:59:59", self.ledger, journal=self.journal,
+                                               prefetch=False)
+        with self.assertRaises(KeyboardInterrupt):
+            service.sync_pipelined(batch_size=1)
+        self.assertEqual(self.work_records[:1], library_client.saved)
+        self.assertEqual([1], self.journal.get_unfinished_import_ids("jdoe"))
+        self.assertEqual("2021-03-02T00:00:00", self.journal.get_import(1).unfetched_start)
+
+        resume_imports(library_client, self.journal, self.ledger, InterruptedClockifyClient(self.work_records))
+        self.assertEqual(self.work_records, library_client.saved)
+        self.assertEqual([], self.journal.get_unfinished_import_ids("jdoe"))
+        self.assertEqual(list(range(4)), [entry.position for entry in self.journal.get_entries(1)])
+
+    def test_provider_defaults_adapt_list_methods(self):
+        provider = ListProvider()
+        results = list(provider.save_work_records_in_batches(iter(self.work_records), batch_size=3))
+        self.assertEqual([3, 1], [len(batch) for batch in provider.batches])
+        self.assertEqual([SAVE_SUCCESS] * 4, [result.status for result in results])
+        self.assertEqual(["2021-03-01"], [work_record.date for work_record in
+                                          asyncio.run(provider.get_work_records_async("2021-03-01", "2021-03-01"))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+"""Locations of the files the tools keep between runs"""
+import os
+
+import appdirs
+
+APP_NAME = "time_entry_tools"
+
+
+def default_data_path(filename: str) -> str:
+    """Path to a file in the per-user data directory, creating the directory if needed"""
+    data_dir = appdirs.user_data_dir(APP_NAME)
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, filename)
+
+
+def default_cache_path(filename: str) -> str:
+    """Path to a file in the per-user cache directory, creating the directory if needed"""
+    cache_dir = appdirs.user_cache_dir(APP_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, filename)
@@ -0,0 +1,124 @@
+"""Time limited cache of Library lookups, so repeated and combined runs do not send the same SOAP queries again"""
+from collections import OrderedDict
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+from time_entry_tools.local_storage import default_cache_path
+
+DEFAULT_LOOKUP_CACHE_FILENAME = "library_lookups.db"
+DEFAULT_MAX_ENTRIES = 256
+CACHE_WORKITEMS = "workitems"
+CACHE_USER = "user"
+CACHE_ENUM_OPTIONS = "enum_options"
+# Seconds an entry stays valid.  Work items change all the time, users and enumerations almost never.
+DEFAULT_TTLS = {
+    CACHE_WORKITEMS: 5 * 60,
+    CACHE_USER: 24 * 60 * 60,
+    CACHE_ENUM_OPTIONS: 24 * 60 * 60,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lookups (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+"""
+
+
+class LookupCache:
+    """Thread-safe cache of lookup results with a time to live per namespace (kind of lookup).
+    Entries are kept in memory, evicting the least recently used beyond max_entries.  With a path, entries are also
+    pickled to an SQLite file, so they outlive the run and are shared by every tool of the same user.
+    Keys are strings; invalidate drops every key of a namespace that starts with a prefix."""
+
+    def __init__(self, path: str = None, ttls: Dict[str, float] = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[object, float]]" = OrderedDict()
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            with self._connection:
+                self._connection.executescript(_SCHEMA)
+                self._connection.execute("DELETE FROM lookups WHERE expires_at <= ?", (clock(),))
+
+    def close(self) -> None:
+        """Close the cache file"""
+        if self._connection is not None:
+            self._connection.close()
+
+    def get_or_load(self, namespace: str, key: str, load: Callable[[], object]):
+        """The cached value for the key, or the value of load(), which is cached for the namespace's time to live"""
+        found, value = self._get(namespace, key)
+        if not found:
+            value = load()
+            self.put(namespace, key, value)
+        return value
+
+    def _get(self, namespace: str, key: str) -> Tuple[bool, object]:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end((namespace, key))
+                return True, entry[0]
+            if self._connection is None:
+                return False, None
+            row = self._connection.execute("SELECT value, expires_at FROM lookups WHERE namespace = ? AND key = ?",
+                                           (namespace, key)).fetchone()
+            if row is None or row[1] <= now:
+                return False, None
+            try:
+                value = pickle.loads(row[0])
+            except Exception:
+                ## Written by an incompatible version of the tools or of zeep: load it again
+                return False, None
+            self._remember(namespace, key, value, row[1])
+            return True, value
+
+    def put(self, namespace: str, key: str, value) -> None:
+        """Cache a value for the namespace's time to live"""
+        expires_at = self._clock() + self.ttls[namespace]
+        with self._lock:
+            self._remember(namespace, key, value, expires_at)
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute("INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?)",
+                                             (namespace, key, pickle.dumps(value), expires_at))
+
+    def _remember(self, namespace: str, key: str, value, expires_at: float) -> None:
+        self._entries[(namespace, key)] = (value, expires_at)
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str, key_prefix: str = "") -> None:
+        """Drop the entries of a namespace whose key starts with key_prefix, e.g. after a write made them stale"""
+        with self._lock:
+            for entry_key in [entry_key for entry_key in self._entries
+                              if entry_key[0] == namespace and entry_key[1].startswith(key_prefix)]:
+                del self._entries[entry_key]
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute("DELETE FROM lookups WHERE namespace = ? AND substr(key, 1, ?) = ?",
+                                             (namespace, len(key_prefix), key_prefix))
+
+
+def create_lookup_cache(on_disk: bool = True, ttls: Dict[str, float] = None) -> LookupCache:
+    """Lookup cache shared by the tools through the per-user cache directory, or for this run only"""
+    return LookupCache(default_cache_path(DEFAULT_LOOKUP_CACHE_FILENAME) if on_disk else None, ttls)
+
+
+def get_cache_key(*parts) -> str:
+    """Cache key of a lookup from its server, user and arguments.  Keys of the same leading parts share a prefix."""
+    return "".join("%s\n" % (part,) for part in parts)
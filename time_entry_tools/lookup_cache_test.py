@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+from fake_servers.fake_polarion_server import FakePolarionServer
+from time_entry_tools.library_task_export import export_library_tasks_to_file
+from time_entry_tools.lookup_cache import LookupCache, CACHE_USER, CACHE_WORKITEMS, get_cache_key
+from time_entry_tools.session_token_cache import SessionTokenCache
+from time_entry_tools.workrecord import WorkRecord
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class LookupCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "lookups.db")
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_entries_expire_after_their_namespace_ttl(self):
+        cache = LookupCache(ttls={CACHE_USER: 60}, clock=self.clock)
+        loads = []
+        load = lambda: loads.append(1) or len(loads)
+        self.assertEqual(1, cache.get_or_load(CACHE_USER, "jdoe", load))
+        self.clock.now += 59
+        self.assertEqual(1, cache.get_or_load(CACHE_USER, "jdoe", load))
+        self.clock.now += 2
+        self.assertEqual(2, cache.get_or_load(CACHE_USER, "jdoe", load))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LookupCache(max_entries=2, clock=self.clock)
+        cache.put(CACHE_USER, "a", 1)
+        cache.put(CACHE_USER, "b", 2)
+        cache.get_or_load(CACHE_USER, "a", lambda: None)
+        cache.put(CACHE_USER, "c", 3)
+        self.assertEqual(1, cache.get_or_load(CACHE_USER, "a", lambda: "loaded"))
+        self.assertEqual(3, cache.get_or_load(CACHE_USER, "c", lambda: "loaded"))
+        self.assertEqual("loaded", cache.get_or_load(CACHE_USER, "b", lambda: "loaded"))
+
+    def test_disk_entries_outlive_the_cache_and_invalidate_by_prefix(self):
+        cache = LookupCache(self.path, clock=self.clock)
+        cache.put(CACHE_WORKITEMS, get_cache_key("url", "jdoe", "query"), ["WI-1"])
+        cache.put(CACHE_WORKITEMS, get_cache_key("url", "jdoe2", "query"), ["WI-2"])
+        cache.close()
+        cache = LookupCache(self.path, clock=self.clock)
+        cache.invalidate(CACHE_WORKITEMS, get_cache_key("url", "jdoe"))
+        self.assertEqual(None, cache.get_or_load(CACHE_WORKITEMS, get_cache_key("url", "jdoe", "query"), lambda: None))
+        self.assertEqual(["WI-2"], cache.get_or_load(CACHE_WORKITEMS, get_cache_key("url", "jdoe2", "query"),
+                                                     lambda: None))
+        cache.close()
+
+    def test_library_lookups_are_cached_until_work_records_are_saved(self):
+        with FakePolarionServer() as library_server:
+            library_server.add_workitem("WI-1", "Design", "Alpha", library_server.user_name)
+            session_token_cache = SessionTokenCache(os.path.join(self.directory.name, "sessions.json"))
+            library_client = library_server.create_client(session_token_cache=session_token_cache,
+                                                          lookup_cache=LookupCache(self.path))
+            library_client.get_workitems_for_user()
+            other_client = library_server.create_client(session_token_cache=session_token_cache,
+                                                        lookup_cache=LookupCache(self.path))
+            self.assertEqual(["WI-1"], [workitem.id for workitem in other_client.get_workitems_for_user()])
+            self.assertEqual(1, library_server.operation_counts["queryWorkItemUris"])
+            export_library_tasks_to_file(other_client, os.path.join(self.directory.name, "tasks.csv"))
+            with open(os.path.join(self.directory.name, "tasks.csv")) as file:
+                self.assertIn("WI-1 - Design", file.read())
+            self.assertEqual(1, library_server.operation_counts["queryWorkItemUris"])
+            other_client.save_work_records([WorkRecord("2021-03-01", 1.0, "WI-1", "design"),
+                                            WorkRecord("2021-03-02", 1.0, "WI-1", "design")])
+            other_client.save_work_records([WorkRecord("2021-03-03", 1.0, "WI-1", "design")])
+            self.assertEqual(1, library_server.operation_counts["getUser"])
+            self.assertEqual(3, len(library_server.get_work_records("WI-1")))
+            library_client.lookup_cache = LookupCache(self.path)
+            library_client.get_workitems_for_user()
+            self.assertEqual(2, library_server.operation_counts["queryWorkItemUris"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+import unittest
+
+IMPORT_TIME_BUDGET_SECONDS = 0.5
+HEAVY_MODULES = ("gooey", "wx", "PySimpleGUI", "zeep", "lxml", "requests", "numpy")
+
+MEASURE_IMPORT = """
+import sys, time
+start = time.perf_counter()
+import time_entry_tools.__main__
+print(time.perf_counter() - start)
+print(",".join(module for module in %r if module in sys.modules))
+""" % (HEAVY_MODULES,)
+
+
+class CommandLineStartupTestCase(unittest.TestCase):
+    def test_import_stays_within_time_budget(self):
+        output = subprocess.run([sys.executable, "-c", MEASURE_IMPORT], capture_output=True, text=True,
+                                check=True).stdout.splitlines()
+        self.assertLess(float(output[0]), IMPORT_TIME_BUDGET_SECONDS)
+
+    def test_import_does_not_load_gui_or_soap_stack(self):
+        output = subprocess.run([sys.executable, "-c", MEASURE_IMPORT], capture_output=True, text=True,
+                                check=True).stdout.splitlines()
+        self.assertEqual("", output[1] if len(output) > 1 else "")
+
+    def test_help_runs_without_heavy_imports(self):
+        result = subprocess.run([sys.executable, "-m", "time_entry_tools", "--help"], capture_output=True, text=True)
+        self.assertEqual(0, result.returncode)
+        self.assertIn("import", result.stdout)
+        self.assertIn("sync", result.stdout)
+        self.assertIn("export", result.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+"""Request metrics for the Clockify and Library clients, exportable as JSON or a Prometheus textfile"""
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+METRIC_PREFIX = "time_entry_tools"
+# Upper bounds in seconds, from a fast local call to a slow Library query
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SERVICE_CLOCKIFY = "clockify"
+SERVICE_LIBRARY = "library"
+
+
+class EndpointMetrics:
+    """Counters of the requests to one endpoint of one service"""
+    __slots__ = ("requests", "errors", "bucket_counts", "latency_sum", "sent_bytes", "received_bytes", "retries")
+
+    def __init__(self, bucket_count: int):
+        self.requests = 0
+        self.errors = 0
+        self.bucket_counts = [0] * (bucket_count + 1)  # The last bucket is +Inf
+        self.latency_sum = 0.0
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.retries: Dict[str, int] = {}
+
+
+class MetricsRegistry:
+    """Thread-safe registry of per endpoint request counts, latency histograms, bytes transferred and retries, plus
+    the time each service spent waiting on its rate limiter.
+    An endpoint is a Clockify method and URL pattern, e.g. "GET /workspaces/{id}/projects", or a Library SOAP
+    operation, e.g. "queryWorkItems"."""
+
+    def __init__(self, latency_buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.latency_buckets = tuple(latency_buckets)
+        self._lock = threading.Lock()
+        self._endpoints: Dict[Tuple[str, str], EndpointMetrics] = {}
+        self._throttled: Dict[str, List[float]] = {}  # service -> [throttled requests, seconds]
+
+    def _get_endpoint(self, service: str, endpoint: str) -> EndpointMetrics:
+        metrics = self._endpoints.get((service, endpoint))
+        if metrics is None:
+            metrics = self._endpoints[(service, endpoint)] = EndpointMetrics(len(self.latency_buckets))
+        return metrics
+
+    def record_request(self, service: str, endpoint: str, seconds: float, status_code: int = None,
+                       sent_bytes: int = 0, received_bytes: int = 0) -> None:
+        """Record one request.  A status code of 400 or more, or None for no response at all, is an error."""
+        bucket = next((index for index, bound in enumerate(self.latency_buckets) if seconds <= bound),
+                      len(self.latency_buckets))
+        with self._lock:
+            metrics = self._get_endpoint(service, endpoint)
+            metrics.requests += 1
+            if status_code is None or status_code >= 400:
+                metrics.errors += 1
+            metrics.bucket_counts[bucket] += 1
+            metrics.latency_sum += seconds
+            metrics.sent_bytes += sent_bytes
+            metrics.received_bytes += received_bytes
+
+    def record_retry(self, service: str, endpoint: str, reason: str, count: int = 1) -> None:
+        """Record that requests to an endpoint were retried, e.g. after a 429 or an expired session"""
+        if count <= 0:
+            return
+        with self._lock:
+            retries = self._get_endpoint(service, endpoint).retries
+            retries[reason] = retries.get(reason, 0) + count
+
+    def record_throttle(self, service: str, seconds: float) -> None:
+        """Record the time a request waited on the service's rate limiter"""
+        if seconds <= 0:
+            return
+        with self._lock:
+            throttled = self._throttled.setdefault(service, [0, 0.0])
+            throttled[0] += 1
+            throttled[1] += seconds
+
+    def reset(self) -> None:
+        """Forget everything recorded so far"""
+        with self._lock:
+            self._endpoints.clear()
+            self._throttled.clear()
+
+    def to_dict(self) -> dict:
+        """Everything recorded, as JSON serializable data"""
+        with self._lock:
+            endpoints = [{
+                "service": service,
+                "endpoint": endpoint,
+                "requests": metrics.requests,
+                "errors": metrics.errors,
+                "latency_seconds_sum": round(metrics.latency_sum, 6),
+                "latency_buckets": {("%g" % bound): count for bound, count in
+                                    zip(self.latency_buckets + (float("inf"),), _cumulative(metrics.bucket_counts))},
+                "sent_bytes": metrics.sent_bytes,
+                "received_bytes": metrics.received_bytes,
+                "retries": dict(metrics.retries),
+            } for (service, endpoint), metrics in sorted(self._endpoints.items())]
+            throttled = {service: {"requests": requests, "seconds": round(seconds, 6)}
+                         for service, (requests, seconds) in sorted(self._throttled.items())}
+        return {"endpoints": endpoints, "throttled": throttled}
+
+    def to_prometheus(self) -> str:
+        """Everything recorded, in the Prometheus text exposition format"""
+        data = self.to_dict()
+        lines = []
+
+        def add_metric(name: str, metric_type: str, help_text: str, samples: List[Tuple[str, dict, float]]) -> None:
+            lines.append("# HELP %s_%s %s" % (METRIC_PREFIX, name, help_text))
+            lines.append("# TYPE %s_%s %s" % (METRIC_PREFIX, name, metric_type))
+            for suffix, labels, value in samples:
+                lines.append("%s_%s%s{%s} %s" % (METRIC_PREFIX, name, suffix, ",".join(
+                    '%s="%s"' % (label, _escape_label_value(label_value)) for label, label_value in labels.items()),
+                                                 _format_value(value)))
+
+        def labels_of(endpoint: dict, **extra_labels) -> dict:
+            return {"service": endpoint["service"], "endpoint": endpoint["endpoint"], **extra_labels}
+
+        endpoints = data["endpoints"]
+        add_metric("requests_total", "counter", "Requests sent, including retried attempts.",
+                   [("", labels_of(endpoint), endpoint["requests"]) for endpoint in endpoints])
+        add_metric("request_errors_total", "counter", "Requests answered with an error status or not answered.",
+                   [("", labels_of(endpoint), endpoint["errors"]) for endpoint in endpoints])
+        histogram_samples = []
+        for endpoint in endpoints:
+            for bound, count in endpoint["latency_buckets"].items():
+                histogram_samples.append(("_bucket", labels_of(endpoint, le=bound.replace("inf", "+Inf")), count))
+            histogram_samples.append(("_sum", labels_of(endpoint), endpoint["latency_seconds_sum"]))
+            histogram_samples.append(("_count", labels_of(endpoint), endpoint["requests"]))
+        add_metric("request_duration_seconds", "histogram", "Time from sending a request to receiving its response.",
+                   histogram_samples)
+        add_metric("sent_bytes_total", "counter", "Request body bytes sent.",
+                   [("", labels_of(endpoint), endpoint["sent_bytes"]) for endpoint in endpoints])
+        add_metric("received_bytes_total", "counter", "Response body bytes received.",
+                   [("", labels_of(endpoint), endpoint["received_bytes"]) for endpoint in endpoints])
+        add_metric("retries_total", "counter", "Requests retried, by reason.",
+                   [("", labels_of(endpoint, reason=reason), count) for endpoint in endpoints
+                    for reason, count in sorted(endpoint["retries"].items())])
+        add_metric("throttled_requests_total", "counter", "Requests held back by the client side rate limiter.",
+                   [("", {"service": service}, throttled["requests"])
+                    for service, throttled in data["throttled"].items()])
+        add_metric("throttled_seconds_total", "counter", "Time requests spent waiting on the rate limiter.",
+                   [("", {"service": service}, throttled["seconds"])
+                    for service, throttled in data["throttled"].items()])
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path: str) -> None:
+        """Write the metrics to a file: a Prometheus textfile when the name ends in .prom, otherwise JSON.
+        The file is replaced in one step, so a collector never reads it half written."""
+        if path.endswith(".prom"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as file:
+            file.write(content)
+        os.replace(temporary_path, path)
+
+
+def _cumulative(counts: List[int]) -> List[int]:
+    total = 0
+    cumulative = []
+    for count in counts:
+        total += count
+        cumulative.append(total)
+    return cumulative
+
+
+def _escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_default_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """The registry every client records to unless it is given its own"""
+    return _default_registry
@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+import unittest
+
+from fake_servers.fake_clockify_server import FakeClockifyServer
+from fake_servers.fake_polarion_server import FakePolarionServer
+from time_entry_tools.metrics import MetricsRegistry, SERVICE_CLOCKIFY, SERVICE_LIBRARY
+from time_entry_tools.rate_limiter import TokenBucketRateLimiter
+from time_entry_tools.session_token_cache import SessionTokenCache
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+    def test_latency_histogram_is_cumulative(self):
+        metrics = MetricsRegistry(latency_buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.5, 0.7, 3.0):
+            metrics.record_request(SERVICE_CLOCKIFY, "GET /projects", seconds, 200, 0, 10)
+        metrics.record_request(SERVICE_CLOCKIFY, "GET /projects", 0.01, None)
+        endpoint = metrics.to_dict()["endpoints"][0]
+        self.assertEqual({"0.1": 2, "1": 4, "inf": 5}, endpoint["latency_buckets"])
+        self.assertEqual((5, 1, 40), (endpoint["requests"], endpoint["errors"], endpoint["received_bytes"]))
+
+    def test_prometheus_textfile(self):
+        metrics = MetricsRegistry(latency_buckets=(1.0,))
+        metrics.record_request(SERVICE_LIBRARY, "queryWorkItems", 0.25, 200, 100, 2000)
+        metrics.record_retry(SERVICE_LIBRARY, "queryWorkItems", "session")
+        metrics.record_throttle(SERVICE_CLOCKIFY, 0.5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.prom")
+            metrics.write_file(path)
+            with open(path) as file:
+                lines = file.read().splitlines()
+        labels = 'service="library",endpoint="queryWorkItems"'
+        self.assertIn('time_entry_tools_request_duration_seconds_bucket{%s,le="+Inf"} 1' % labels, lines)
+        self.assertIn('time_entry_tools_request_duration_seconds_sum{%s} 0.25' % labels, lines)
+        self.assertIn('time_entry_tools_retries_total{%s,reason="session"} 1' % labels, lines)
+        self.assertIn('time_entry_tools_throttled_seconds_total{service="clockify"} 0.5', lines)
+
+    def test_clients_record_requests_retries_and_throttling(self):
+        metrics = MetricsRegistry()
+        with tempfile.TemporaryDirectory() as directory, FakeClockifyServer(requests_per_second=20) as clockify_server, \
+                FakePolarionServer() as library_server:
+            clockify_server.add_project("Alpha")
+            clockify_client = clockify_server.create_client(rate_limiter=TokenBucketRateLimiter(100, 1),
+                                                            metrics=metrics)
+            for _ in range(30):
+                clockify_client.get_projects()
+            clockify_client.close()
+            library_client = library_server.create_client(
+                session_token_cache=SessionTokenCache(os.path.join(directory, "sessions.json")), metrics=metrics)
+            library_client.get_workitems_for_user()
+            library_server.sessions.clear()
+            library_client.get_workitems_for_user()
+            path = os.path.join(directory, "metrics.json")
+            metrics.write_file(path)
+            with open(path) as file:
+                data = json.load(file)
+        endpoints = {(endpoint["service"], endpoint["endpoint"]): endpoint for endpoint in data["endpoints"]}
+        projects = endpoints[(SERVICE_CLOCKIFY, "GET /api/v1/workspaces/{id}/projects")]
+        self.assertEqual(30 + projects["retries"]["rate_limited"], projects["requests"])
+        self.assertGreater(data["throttled"][SERVICE_CLOCKIFY]["requests"], 0)
+        self.assertEqual(2, endpoints[(SERVICE_LIBRARY, "logIn")]["requests"])
+        self.assertEqual({"session": 1}, endpoints[(SERVICE_LIBRARY, "queryWorkItemUris")]["retries"])
+        self.assertGreater(endpoints[(SERVICE_LIBRARY, "queryWorkItemUris")]["received_bytes"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Token bucket rate limiter shared by everything that talks to a rate limited API"""
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+
+class TokenBucketRateLimiter:
+    """Thread-safe token bucket rate limiter.
+    Every caller reserves a token under a lock and is told how long to wait for it, so callers are served in arrival
+    order and a burst never exceeds the bucket capacity.  Works from threads (acquire) and asyncio (acquire_async).
+    When the API still rejects a request, penalize blocks every caller until the API's Retry-After has passed."""
+
+    def __init__(self, rate: float, capacity: float = 1, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._last_refill = clock()  # In the future while blocked: the token balance is then that at the block's end
+        self._blocked_until = self._last_refill
+        self._blocks = 0  # Number of times the block was extended, so callers can tell a reservation was cancelled
+        self.request_count = 0
+        self.throttled_count = 0
+        self.rate_limited_response_count = 0
+        self.total_wait_seconds = 0.0
+
+    def reserve(self) -> float:
+        """Take a token from the bucket.  Return the number of seconds the caller must wait before using it."""
+        return self._reserve()[0]
+
+    def _reserve(self, first_attempt: bool = True) -> Tuple[float, int]:
+        """Take a token.  Returns the seconds to wait and the block count the reservation was made under."""
+        with self._lock:
+            now = self._clock()
+            if now > self._last_refill:
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+            # A negative balance is the queue of callers that already reserved a future token
+            self._tokens -= 1
+            delay = self._last_refill - now + max(-self._tokens / self.rate, 0.0)
+            if first_attempt:
+                self.request_count += 1
+                if delay > 0:
+                    self.throttled_count += 1
+            self.total_wait_seconds += delay
+            return delay, self._blocks
+
+    def _is_cancelled(self, blocks: int) -> bool:
+        with self._lock:
+            return self._blocks != blocks
+
+    def acquire(self) -> float:
+        """Block the calling thread until a token is available.  Returns the seconds waited."""
+        delay, blocks = self._reserve()
+        waited = delay
+        while True:
+            if delay > 0:
+                time.sleep(delay)
+            if not self._is_cancelled(blocks):
+                return waited
+            ## A rejected request blocked every caller while this one waited, so its token is no longer valid
+            delay, blocks = self._reserve(first_attempt=False)
+            waited += delay
+
+    async def acquire_async(self) -> float:
+        """Wait without blocking the event loop until a token is available.  Returns the seconds waited."""
+        delay, blocks = self._reserve()
+        waited = delay
+        while True:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if not self._is_cancelled(blocks):
+                return waited
+            delay, blocks = self._reserve(first_attempt=False)
+            waited += delay
+
+    def penalize(self, retry_after_seconds: float) -> None:
+        """The API rejected a request for exceeding its limit.  Hold back every caller for retry_after_seconds.
+        Callers that already reserved a token reserve again after the block.  Overlapping penalties (e.g. several
+        concurrent requests rejected at once) do not add up: the block lasts until the latest Retry-After ends."""
+        with self._lock:
+            self.rate_limited_response_count += 1
+            blocked_until = self._clock() + retry_after_seconds
+            if blocked_until <= self._blocked_until:
+                return
+            self._blocked_until = self._last_refill = blocked_until
+            ## Waiting callers reserve again, so the queue restarts from one token when the block ends
+            self._tokens = min(self.capacity, 1)
+            self._blocks += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Counters describing how much the limiter has throttled callers"""
+        with self._lock:
+            return {
+                "requests": self.request_count,
+                "throttled_requests": self.throttled_count,
+                "rate_limited_responses": self.rate_limited_response_count,
+                "total_wait_seconds": round(self.total_wait_seconds, 3),
+            }
+
+
+_shared_rate_limiters = {}
+_shared_rate_limiters_lock = threading.Lock()
+
+
+def get_shared_rate_limiter(key: str, rate: float, capacity: float = 1) -> TokenBucketRateLimiter:
+    """Get the rate limiter shared by every client using the same key (e.g. the same API key)"""
+    with _shared_rate_limiters_lock:
+        if key not in _shared_rate_limiters:
+            _shared_rate_limiters[key] = TokenBucketRateLimiter(rate, capacity)
+        return _shared_rate_limiters[key]
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from time_entry_tools.rate_limiter import TokenBucketRateLimiter, get_shared_rate_limiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketRateLimiterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = TokenBucketRateLimiter(rate=10, capacity=2, clock=self.clock)
+
+    def test_burst_up_to_capacity_does_not_wait(self):
+        self.assertEqual(0.0, self.limiter.reserve())
+        self.assertEqual(0.0, self.limiter.reserve())
+
+    def test_waiting_callers_are_served_in_arrival_order(self):
+        self.limiter.reserve()
+        self.limiter.reserve()
+        self.assertAlmostEqual(0.1, self.limiter.reserve())
+        self.assertAlmostEqual(0.2, self.limiter.reserve())
+        self.assertAlmostEqual(0.3, self.limiter.reserve())
+
+    def test_tokens_refill_at_rate(self):
+        self.limiter.reserve()
+        self.limiter.reserve()
+        self.clock.now = 0.1
+        self.assertEqual(0.0, self.limiter.reserve())
+
+    def test_tokens_do_not_refill_past_capacity(self):
+        self.clock.now = 60
+        self.limiter.reserve()
+        self.limiter.reserve()
+        self.assertAlmostEqual(0.1, self.limiter.reserve())
+
+    def test_penalize_holds_back_next_caller_for_retry_after(self):
+        self.limiter.penalize(2)
+        self.assertAlmostEqual(2.0, self.limiter.reserve())
+        self.assertAlmostEqual(2.1, self.limiter.reserve())
+
+    def test_overlapping_penalties_do_not_add_up(self):
+        for _ in range(5):
+            self.limiter.penalize(1)
+        self.assertAlmostEqual(1.0, self.limiter.reserve())
+        self.clock.now = 0.5
+        self.limiter.penalize(1)
+        self.assertAlmostEqual(1.0, self.limiter.reserve())
+        self.assertEqual(6, self.limiter.stats()["rate_limited_responses"])
+
+    def test_caller_that_reserved_before_the_penalty_waits_for_retry_after(self):
+        limiter = TokenBucketRateLimiter(rate=10, capacity=1)
+        limiter.reserve()
+        reserved = threading.Event()
+        finished = []
+
+        def acquire():
+            reserved.set()
+            limiter.acquire()
+            finished.append(time.monotonic())
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        reserved.wait()
+        time.sleep(0.02)
+        penalized = time.monotonic()
+        limiter.penalize(0.3)
+        thread.join()
+        self.assertGreaterEqual(finished[0] - penalized, 0.3)
+
+    def test_async_caller_that_reserved_before_the_penalty_waits_for_retry_after(self):
+        async def acquire_around_penalty():
+            limiter = TokenBucketRateLimiter(rate=10, capacity=1)
+            limiter.reserve()
+            waiter = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            penalized = time.monotonic()
+            limiter.penalize(0.3)
+            await waiter
+            return time.monotonic() - penalized
+
+        self.assertGreaterEqual(asyncio.run(acquire_around_penalty()), 0.3)
+
+    def test_stats_count_throttled_requests_and_wait_time(self):
+        for _ in range(4):
+            self.limiter.reserve()
+        self.limiter.penalize(1)
+        stats = self.limiter.stats()
+        self.assertEqual(4, stats["requests"])
+        self.assertEqual(2, stats["throttled_requests"])
+        self.assertEqual(1, stats["rate_limited_responses"])
+        self.assertAlmostEqual(0.3, stats["total_wait_seconds"])
+
+    def test_acquire_async_waits_for_token(self):
+        limiter = TokenBucketRateLimiter(rate=1000, capacity=1)
+        asyncio.run(limiter.acquire_async())
+        asyncio.run(limiter.acquire_async())
+        self.assertEqual(1, limiter.stats()["throttled_requests"])
+
+    def test_shared_rate_limiter_is_shared_per_key(self):
+        self.assertIs(get_shared_rate_limiter("key-a", 10), get_shared_rate_limiter("key-a", 10))
+        self.assertIsNot(get_shared_rate_limiter("key-a", 10), get_shared_rate_limiter("key-b", 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
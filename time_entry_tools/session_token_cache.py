@@ -0,0 +1,64 @@
+"""On-disk cache of Library session tokens, so short runs can skip logging in"""
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+from time_entry_tools.local_storage import default_cache_path
+
+DEFAULT_SESSION_TOKEN_FILENAME = "library_sessions.json"
+# The Library drops idle sessions; treat cached tokens as expired well before that happens
+DEFAULT_SESSION_TOKEN_MAX_AGE = timedelta(minutes=20)
+
+
+class SessionTokenCache:
+    """Library session headers cached per server and user.
+    Only the session header is stored, never the password.  The file is readable by the current user only."""
+
+    def __init__(self, path: str = None, max_age: timedelta = DEFAULT_SESSION_TOKEN_MAX_AGE):
+        self.path = path or default_cache_path(DEFAULT_SESSION_TOKEN_FILENAME)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(server_url: str, user_name: str) -> str:
+        return hashlib.sha256(("%s\n%s" % (server_url, user_name)).encode("utf-8")).hexdigest()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries: dict) -> None:
+        temp_path = self.path + ".tmp"
+        file_descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(file_descriptor, "w") as file:
+            json.dump(entries, file)
+        os.replace(temp_path, self.path)
+
+    def get(self, server_url: str, user_name: str) -> Optional[str]:
+        """Return the cached session header (serialized XML), or None if there is none or it has expired"""
+        with self._lock:
+            entry = self._read().get(self._key(server_url, user_name))
+        if entry is None or datetime.now() - datetime.fromisoformat(entry["saved_at"]) > self.max_age:
+            return None
+        return entry["session_header"]
+
+    def set(self, server_url: str, user_name: str, session_header: str) -> None:
+        """Cache the session header of a fresh login"""
+        with self._lock:
+            entries = self._read()
+            entries[self._key(server_url, user_name)] = {"session_header": session_header,
+                                                         "saved_at": datetime.now().isoformat()}
+            self._write(entries)
+
+    def invalidate(self, server_url: str, user_name: str) -> None:
+        """Forget a session the Library no longer accepts"""
+        with self._lock:
+            entries = self._read()
+            if entries.pop(self._key(server_url, user_name), None) is not None:
+                self._write(entries)
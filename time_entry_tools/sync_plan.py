@@ -0,0 +1,149 @@
+"""Plan of the changes needed to bring Clockify in line with the Library"""
+from collections import namedtuple
+from typing import Dict, Iterable, Iterator, List, Set
+
+from time_entry_tools.clockify_time_entry_provider import DEFAULT_WRITE_WORKERS
+from time_entry_tools.clockify_write_pipeline import ClockifyWritePipeline, WriteResult
+
+CREATE_PROJECT = "CREATE_PROJECT"
+ADD_TASK = "ADD_TASK"
+MARK_TASK_ACTIVE = "MARK_TASK_ACTIVE"
+MARK_TASK_DONE = "MARK_TASK_DONE"
+
+# project_id is None for tasks added to a project the plan creates; it is known once the project exists
+TaskOperation = namedtuple("TaskOperation", "action project_name project_id task_name task_id")
+
+DEFAULT_BATCH_SIZE = 50  # Progress is shown after every batch of changes
+
+
+class ProjectNotCreatedError(Exception):
+    """A task was not added because creating its project failed"""
+
+
+class SyncPlan:
+    """The projects to create and task changes to make in Clockify"""
+
+    def __init__(self, projects_to_create: List[str], tasks_to_add: List[TaskOperation],
+                 tasks_to_reactivate: List[TaskOperation], tasks_to_mark_done: List[TaskOperation]):
+        self.projects_to_create = projects_to_create
+        self.tasks_to_add = tasks_to_add
+        self.tasks_to_reactivate = tasks_to_reactivate
+        self.tasks_to_mark_done = tasks_to_mark_done
+        self.failed_operations: List[WriteResult] = []
+
+    def is_empty(self) -> bool:
+        """True when Clockify is already in sync"""
+        return not (self.projects_to_create or self.tasks_to_add or self.tasks_to_reactivate or
+                    self.tasks_to_mark_done)
+
+    def get_task_operations(self) -> List[TaskOperation]:
+        """Every task change in the plan"""
+        return self.tasks_to_add + self.tasks_to_reactivate + self.tasks_to_mark_done
+
+    def get_existing_project_ids(self) -> Set[str]:
+        """Ids of the already existing Clockify projects the plan changes"""
+        return {operation.project_id for operation in self.get_task_operations() if operation.project_id is not None}
+
+    def describe(self) -> Iterator[str]:
+        """Human readable lines describing the plan"""
+        for project_name in self.projects_to_create:
+            yield "Create project: %s" % project_name
+        for operation in self.get_task_operations():
+            yield "%s: %s | Project: %s" % (operation.action, operation.task_name, operation.project_name)
+        yield "Projects to create: %d, Tasks to add: %d, Tasks to reactivate: %d, Tasks to mark done: %d" % (
+            len(self.projects_to_create), len(self.tasks_to_add), len(self.tasks_to_reactivate),
+            len(self.tasks_to_mark_done))
+
+    def print_dry_run(self) -> None:
+        """Show the user what a sync would change, without changing anything"""
+        for line in self.describe():
+            print(line, flush=True)
+
+    def execute(self, clockify_client, max_workers: int = DEFAULT_WRITE_WORKERS,
+                batch_size: int = DEFAULT_BATCH_SIZE) -> List[WriteResult]:
+        """Apply the plan to Clockify, sending max_workers changes at the same time.
+        The tasks of a new project are added as soon as the project is created, with the id Clockify returned for it.
+        A failed change is reported and never stops the others; the failures are kept in failed_operations.
+        Returns one WriteResult per project and task change, in the order they finished."""
+        tasks_by_new_project: Dict[str, List[TaskOperation]] = {}
+        for operation in self.tasks_to_add:
+            if operation.project_id is None:
+                tasks_by_new_project.setdefault(operation.project_name, []).append(operation)
+        total = len(self.projects_to_create) + len(self.get_task_operations())
+
+        with ClockifyWritePipeline(max_workers) as pipeline:
+            def add_tasks_of_new_project(result: WriteResult) -> None:
+                for task_operation in tasks_by_new_project.get(result.operation.project_name, []):
+                    if result.error is None:
+                        task_operation = task_operation._replace(project_id=result.value.id)
+                        pipeline.submit(task_operation, apply_task_operation, clockify_client, task_operation)
+                    else:
+                        pipeline.fail(task_operation, ProjectNotCreatedError(
+                            "Project %s was not created" % task_operation.project_name))
+
+            for project_name in self.projects_to_create:
+                pipeline.submit(TaskOperation(CREATE_PROJECT, project_name, None, None, None),
+                                clockify_client.add_project, project_name, then=add_tasks_of_new_project)
+            for operation in self.get_task_operations():
+                if operation.project_id is not None:
+                    pipeline.submit(operation, apply_task_operation, clockify_client, operation)
+
+            results = []
+            for result in pipeline.results():
+                results.append(result)
+                if result.error is not None:
+                    self.failed_operations.append(result)
+                    print("FAILED %s: %s | Project: %s | Error: %s" % (
+                        result.operation.action, result.operation.task_name or "", result.operation.project_name,
+                        result.error), flush=True)
+                if len(results) % batch_size == 0 or len(results) == total:
+                    print("Applied %d of %d Clockify changes" % (len(results), total), flush=True)
+        return results
+
+
+def apply_task_operation(clockify_client, operation: TaskOperation):
+    """Send a single task change to Clockify.  The project_id of the operation must be known."""
+    if operation.action == ADD_TASK:
+        return clockify_client.add_task(operation.project_id, operation.task_name)
+    if operation.action == MARK_TASK_ACTIVE:
+        return clockify_client.mark_task_as_active(operation.project_id, operation.task_id, operation.task_name)
+    if operation.action == MARK_TASK_DONE:
+        return clockify_client.mark_task_as_done(operation.project_id, operation.task_id, operation.task_name)
+    raise ValueError("Unknown task operation: %s" % operation.action)
+
+
+def build_sync_plan(library_workitems: Iterable, clockify_projects: Iterable, clockify_active_tasks: List,
+                    clockify_done_tasks: Iterable) -> SyncPlan:
+    """Compare the Library work items with Clockify and plan the changes.
+    Every input is indexed once, so building the plan is linear in the number of work items and tasks."""
+    project_ids_by_name = {project.name: project.id for project in clockify_projects}
+    project_names_by_id = {project_id: name for name, project_id in project_ids_by_name.items()}
+    active_task_names = {task.task_name for task in clockify_active_tasks}
+    done_tasks_by_name = {task.task_name: task for task in clockify_done_tasks}
+    library_task_names = set()
+
+    projects_to_create = []
+    project_names_to_create = set()
+    tasks_to_add = []
+    tasks_to_reactivate = []
+    for workitem in library_workitems:
+        if workitem.workitem_title in library_task_names:
+            continue
+        library_task_names.add(workitem.workitem_title)
+        if workitem.workitem_title in active_task_names:
+            continue
+        done_task = done_tasks_by_name.get(workitem.workitem_title)
+        if done_task is not None:
+            tasks_to_reactivate.append(TaskOperation(MARK_TASK_ACTIVE, project_names_by_id.get(done_task.project_id),
+                                                     done_task.project_id, done_task.task_name, done_task.task_id))
+            continue
+        project_id = project_ids_by_name.get(workitem.project_name)
+        if project_id is None and workitem.project_name not in project_names_to_create:
+            project_names_to_create.add(workitem.project_name)
+            projects_to_create.append(workitem.project_name)
+        tasks_to_add.append(TaskOperation(ADD_TASK, workitem.project_name, project_id, workitem.workitem_title, None))
+
+    tasks_to_mark_done = [TaskOperation(MARK_TASK_DONE, project_names_by_id.get(task.project_id), task.project_id,
+                                        task.task_name, task.task_id)
+                          for task in clockify_active_tasks if task.task_name not in library_task_names]
+    return SyncPlan(projects_to_create, tasks_to_add, tasks_to_reactivate, tasks_to_mark_done)
@@ -0,0 +1,88 @@
+import unittest
+
+from time_entry_tools.clockify_task_sync_service import ClockifyTask, LibrayWorkItem
+from time_entry_tools.clockify_time_entry_provider import Project
+from time_entry_tools.clockify_time_entry_provider import ClockifyApiError
+from time_entry_tools.sync_plan import build_sync_plan, ProjectNotCreatedError, TaskOperation, ADD_TASK, \
+    CREATE_PROJECT, MARK_TASK_ACTIVE, MARK_TASK_DONE
+
+
+class RecordingClockifyClient:
+    def __init__(self, failing_project_names=()):
+        self.calls = []
+        self.failing_project_names = failing_project_names
+
+    def add_project(self, project_name):
+        self.calls.append(("add_project", project_name))
+        if project_name in self.failing_project_names:
+            raise ClockifyApiError("Project creation failed in Clockify!", 400)
+        return Project(project_name, "new-" + project_name)
+
+    def add_task(self, project_id, task_name):
+        self.calls.append(("add_task", project_id, task_name))
+
+    def mark_task_as_active(self, project_id, task_id, task_name):
+        self.calls.append(("mark_task_as_active", project_id, task_id))
+
+    def mark_task_as_done(self, project_id, task_id, task_name):
+        self.calls.append(("mark_task_as_done", project_id, task_id))
+
+
+class SyncPlanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.projects = [Project("Alpha", "p1"), Project("Beta", "p2")]
+        self.active_tasks = [ClockifyTask("p1", "A-1 - In sync", "t1"), ClockifyTask("p2", "B-1 - Resolved", "t2")]
+        self.done_tasks = [ClockifyTask("p1", "A-2 - Reopened", "t3")]
+        self.library_workitems = [LibrayWorkItem("Alpha", "A-1 - In sync"),
+                                  LibrayWorkItem("Alpha", "A-2 - Reopened"),
+                                  LibrayWorkItem("Alpha", "A-3 - New"),
+                                  LibrayWorkItem("Gamma", "G-1 - New project"),
+                                  LibrayWorkItem("Gamma", "G-2 - New project")]
+        self.plan = build_sync_plan(self.library_workitems, self.projects, self.active_tasks, self.done_tasks)
+
+    def test_projects_missing_from_clockify_are_created_once(self):
+        self.assertEqual(["Gamma"], self.plan.projects_to_create)
+
+    def test_tasks_missing_from_clockify_are_added(self):
+        self.assertEqual([TaskOperation(ADD_TASK, "Alpha", "p1", "A-3 - New", None),
+                          TaskOperation(ADD_TASK, "Gamma", None, "G-1 - New project", None),
+                          TaskOperation(ADD_TASK, "Gamma", None, "G-2 - New project", None)], self.plan.tasks_to_add)
+
+    def test_done_tasks_in_library_are_reactivated(self):
+        self.assertEqual([TaskOperation(MARK_TASK_ACTIVE, "Alpha", "p1", "A-2 - Reopened", "t3")],
+                         self.plan.tasks_to_reactivate)
+
+    def test_active_tasks_not_in_library_are_marked_done(self):
+        self.assertEqual([TaskOperation(MARK_TASK_DONE, "Beta", "p2", "B-1 - Resolved", "t2")],
+                         self.plan.tasks_to_mark_done)
+
+    def test_plan_is_empty_when_in_sync(self):
+        plan = build_sync_plan([LibrayWorkItem("Alpha", "A-1 - In sync")], self.projects,
+                               [ClockifyTask("p1", "A-1 - In sync", "t1")], [])
+        self.assertTrue(plan.is_empty())
+
+    def test_execute_uses_ids_of_created_projects(self):
+        client = RecordingClockifyClient()
+        results = self.plan.execute(client, batch_size=2)
+        self.assertEqual(6, len(results))
+        self.assertEqual([], self.plan.failed_operations)
+        self.assertEqual(("add_project", "Gamma"), client.calls[0])
+        self.assertCountEqual([("add_project", "Gamma"),
+                          ("add_task", "p1", "A-3 - New"),
+                          ("add_task", "new-Gamma", "G-1 - New project"),
+                          ("add_task", "new-Gamma", "G-2 - New project"),
+                          ("mark_task_as_active", "p1", "t3"),
+                          ("mark_task_as_done", "p2", "t2")], client.calls)
+
+    def test_failed_project_fails_only_its_tasks(self):
+        client = RecordingClockifyClient(failing_project_names=("Gamma",))
+        results = self.plan.execute(client)
+        self.assertEqual(6, len(results))
+        self.assertEqual({(CREATE_PROJECT, ClockifyApiError), (ADD_TASK, ProjectNotCreatedError)},
+                         {(result.operation.action, type(result.error)) for result in self.plan.failed_operations})
+        self.assertEqual(3, len(self.plan.failed_operations))
+        self.assertEqual(4, len(client.calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
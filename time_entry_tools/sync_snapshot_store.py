@@ -0,0 +1,144 @@
+"""Local snapshot of the Library and Clockify state, so task syncs only fetch what changed"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from time_entry_tools.clockify_time_entry_provider import Task
+from time_entry_tools.local_storage import default_data_path
+
+SnapshotWorkItem = namedtuple("SnapshotWorkItem", "id project_name workitem_title updated")
+
+# Changes made directly in Clockify, or work items reassigned to someone else, are only seen by a full refresh
+DEFAULT_FULL_REFRESH_AGE = timedelta(days=1)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS library_workitems (
+    id TEXT PRIMARY KEY,
+    project_name TEXT NOT NULL,
+    workitem_title TEXT NOT NULL,
+    updated TEXT
+);
+CREATE TABLE IF NOT EXISTS clockify_task_snapshots (
+    project_id TEXT PRIMARY KEY,
+    fetched_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clockify_tasks (
+    project_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT,
+    PRIMARY KEY (project_id, id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+LAST_FULL_REFRESH = "last_full_refresh"
+LAST_LIBRARY_SYNC = "last_library_sync"
+
+
+def get_default_snapshot_path(library_user: str, clockify_workspace_id: str) -> str:
+    """Each Library user and Clockify workspace pair keeps its own snapshot"""
+    return default_data_path("sync_snapshot_%s_%s.db" % (library_user, clockify_workspace_id))
+
+
+class SyncSnapshotStore:
+    """SQLite backed snapshot of the last known Library work items and Clockify tasks"""
+
+    def __init__(self, path: str, full_refresh_age: timedelta = DEFAULT_FULL_REFRESH_AGE):
+        self.path = path
+        self.full_refresh_age = full_refresh_age
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the snapshot database"""
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_timestamp(self, key: str) -> Optional[datetime]:
+        row = self._connection.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def _set_timestamp(self, key: str, value: datetime) -> None:
+        self._connection.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                                 (key, value.isoformat()))
+
+    @property
+    def last_library_sync(self) -> Optional[datetime]:
+        """When the Library work items were last fetched, full or incremental"""
+        with self._lock:
+            return self._get_timestamp(LAST_LIBRARY_SYNC)
+
+    def is_full_refresh_due(self, now: datetime = None) -> bool:
+        """A full refresh is needed when there is no snapshot yet or the last one is too old"""
+        with self._lock:
+            last_full_refresh = self._get_timestamp(LAST_FULL_REFRESH)
+        return last_full_refresh is None or (now or datetime.now()) - last_full_refresh > self.full_refresh_age
+
+    def replace_library_workitems(self, workitems: Iterable[SnapshotWorkItem], synced_at: datetime) -> None:
+        """Replace the whole Library snapshot with a fresh, complete list of work items"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM library_workitems")
+            self._connection.executemany("INSERT INTO library_workitems VALUES (?, ?, ?, ?)", workitems)
+            self._connection.execute("DELETE FROM clockify_tasks")
+            self._connection.execute("DELETE FROM clockify_task_snapshots")
+            self._set_timestamp(LAST_FULL_REFRESH, synced_at)
+            self._set_timestamp(LAST_LIBRARY_SYNC, synced_at)
+
+    def update_library_workitems(self, updated_workitems: Iterable[SnapshotWorkItem], removed_ids: Iterable[str],
+                                 synced_at: datetime) -> None:
+        """Apply the work items changed since the last sync to the Library snapshot"""
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO library_workitems VALUES (?, ?, ?, ?)",
+                                         updated_workitems)
+            self._connection.executemany("DELETE FROM library_workitems WHERE id = ?",
+                                         ((workitem_id,) for workitem_id in removed_ids))
+            self._set_timestamp(LAST_LIBRARY_SYNC, synced_at)
+
+    def get_library_workitems(self) -> Dict[str, SnapshotWorkItem]:
+        """All Library work items in the snapshot, by id"""
+        with self._lock:
+            rows = self._connection.execute("SELECT id, project_name, workitem_title, updated FROM library_workitems")
+            return {row[0]: SnapshotWorkItem(*row) for row in rows}
+
+    def get_clockify_project_ids_with_tasks(self) -> List[str]:
+        """Ids of the Clockify projects whose task list is in the snapshot"""
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT project_id FROM clockify_task_snapshots")]
+
+    def replace_clockify_tasks(self, project_id: str, tasks: Iterable[Task], fetched_at: datetime) -> None:
+        """Replace the snapshot of one Clockify project's tasks"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM clockify_tasks WHERE project_id = ?", (project_id,))
+            self._connection.executemany("INSERT OR REPLACE INTO clockify_tasks VALUES (?, ?, ?, ?)",
+                                         ((project_id, task.id, task.name, task.status) for task in tasks))
+            self._connection.execute("INSERT OR REPLACE INTO clockify_task_snapshots VALUES (?, ?)",
+                                     (project_id, fetched_at.isoformat()))
+
+    def get_clockify_tasks(self) -> Dict[str, List[Task]]:
+        """All Clockify tasks in the snapshot, by project id"""
+        tasks = {}
+        with self._lock:
+            for project_id, task_id, name, status in self._connection.execute(
+                    "SELECT project_id, id, name, status FROM clockify_tasks"):
+                tasks.setdefault(project_id, []).append(Task(name, task_id, status))
+        return tasks
+
+    def invalidate_clockify_tasks(self, project_ids: Iterable[str]) -> None:
+        """Forget the task lists of projects that were changed, so the next sync fetches them again"""
+        with self._lock, self._connection:
+            for project_id in project_ids:
+                self._connection.execute("DELETE FROM clockify_tasks WHERE project_id = ?", (project_id,))
+                self._connection.execute("DELETE FROM clockify_task_snapshots WHERE project_id = ?", (project_id,))
@@ -1,22 +1,10 @@
-import csv
+import asyncio
 import configparser
 
 from gooey import Gooey, GooeyParser
 
-from time_entry_tools.clockify_task_sync_service import ClockifyTaskSyncService
-from time_entry_tools.clockify_time_entry_provider import ClockifyTimeEntryProvider
-from time_entry_tools.library_time_entry_provider import LibraryTimeEntryProvider
-
-
-def export_library_tasks_to_file(library_client, filename):
-    workitems = library_client.get_workitems_for_user()
-    formatted_workitem_list = [[workitem.project.name, workitem.id + " - " + workitem.title] for workitem in workitems]
-    header = ['Project', 'Task']
-
-    with open(filename, "w", newline='') as file:
-        writer = csv.writer(file, delimiter=',')
-        writer.writerow(header)
-        writer.writerows(formatted_workitem_list)
+from time_entry_tools.client_factory import create_clockify_client, create_library_client, create_task_sync_service
+from time_entry_tools.library_task_export import export_library_tasks_to_file
 
 
 @Gooey(program_name="Task Exporter", auto_start=True, use_cmd_args=True)
@@ -32,16 +20,15 @@ def main():
     config = configparser.ConfigParser()
     config.read("config.cfg")
 
-    library_client = LibraryTimeEntryProvider(library_url=config['Library']['server_url'], user_name=args.user_name,
-                                              password=args.password, library_workitem_query=config['Library']['workitem_query'])
-    clockify_client = ClockifyTimeEntryProvider(config["Clockify"]["api_key"], config["Clockify"]["workspace_id"])
+    library_client = create_library_client(config, args.user_name, args.password)
+    clockify_client = create_clockify_client(config)
 
     ## OLD METHOD - Export to CSV then manual Import
     # export_library_tasks_to_file(library_client, args.output_file)
 
     ## NEW METHOD - Automatic Sync with library and clockify
-    myServiceTest = ClockifyTaskSyncService(library_client, clockify_client)
-    myServiceTest.sync()
+    with create_task_sync_service(library_client, clockify_client) as myServiceTest:
+        asyncio.run(myServiceTest.sync_async())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,113 @@
+"""Run the task and work record syncs for a whole team at once"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import configparser
+import csv
+import time
+from typing import List
+
+from time_entry_tools.client_factory import create_clockify_client, create_library_client, \
+    create_library_lookup_cache, create_task_sync_service, create_work_record_sync_service
+from time_entry_tools.clockify_time_entry_provider import ClockifyTimeEntryProvider
+from time_entry_tools.import_journal import ImportJournal
+from time_entry_tools.session_token_cache import SessionTokenCache
+from time_entry_tools.time_entry_provider import SAVED_STATUSES
+from time_entry_tools.work_record_ledger import WorkRecordLedger
+
+TeamMember = namedtuple("TeamMember", "library_user clockify_workspace_id clockify_api_key")
+TeamSyncResult = namedtuple("TeamSyncResult", "library_user succeeded detail seconds")
+
+DEFAULT_TEAM_SYNC_WORKERS = 8
+
+
+def read_roster(filename: str) -> List[TeamMember]:
+    """Read the team roster CSV (columns: library_user, clockify_workspace_id, clockify_api_key)"""
+    with open(filename, newline='') as file:
+        return [TeamMember(row["library_user"].strip(), row["clockify_workspace_id"].strip(),
+                           row["clockify_api_key"].strip())
+                for row in csv.DictReader(file) if row.get("library_user", "").strip()]
+
+
+class TeamSyncService:
+    """Syncs every member of a team concurrently.
+    One Library account acts for every member, so all members share its cached Library session, WSDLs and lookups.
+    Each member gets their own clients, and a failure for one member never stops the others."""
+
+    def __init__(self, config: configparser.ConfigParser, user_name: str, password: str, roster: List[TeamMember],
+                 max_workers: int = DEFAULT_TEAM_SYNC_WORKERS, ledger: WorkRecordLedger = None,
+                 journal: ImportJournal = None):
+        self.config = config
+        self.user_name = user_name
+        self.password = password
+        self.roster = roster
+        self.max_workers = max_workers
+        self.session_token_cache = SessionTokenCache()
+        self.lookup_cache = create_library_lookup_cache(config)
+        self.ledger = ledger or WorkRecordLedger()
+        self.journal = journal or ImportJournal()
+
+    def sync(self, sync_tasks: bool = True, start_date: str = None, end_date: str = None,
+             dry_run: bool = False) -> List[TeamSyncResult]:
+        """Sync every team member.  Work records are imported when a start and end date are given."""
+        ## Log in once up front, so the members share one Library session instead of all logging in at the same time
+        with create_library_client(self.config, self.user_name, self.password,
+                                   session_token_cache=self.session_token_cache,
+                                   lookup_cache=self.lookup_cache) as library_client:
+            library_client.polarion.get_session_header()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="team-sync") as executor:
+            results = list(executor.map(lambda member: self.sync_member(member, sync_tasks, start_date, end_date,
+                                                                        dry_run), self.roster))
+        self.show_summary(results)
+        return results
+
+    def sync_member(self, member: TeamMember, sync_tasks: bool, start_date: str, end_date: str,
+                    dry_run: bool) -> TeamSyncResult:
+        """Run the syncs for a single team member, catching their failures"""
+        started = time.perf_counter()
+        details = []
+        succeeded = True
+        try:
+            with create_library_client(self.config, self.user_name, self.password, library_user=member.library_user,
+                                       session_token_cache=self.session_token_cache,
+                                       lookup_cache=self.lookup_cache) as library_client, \
+                    self.create_clockify_client(member) as clockify_client:
+                if sync_tasks:
+                    with create_task_sync_service(library_client, clockify_client) as task_sync_service:
+                        plan = task_sync_service.sync(dry_run=dry_run)
+                    details.append("tasks: %d changes" % len(plan.get_task_operations()))
+                    if plan.failed_operations:
+                        details.append("%d Clockify changes failed" % len(plan.failed_operations))
+                        succeeded = False
+                if start_date and end_date:
+                    work_record_sync_service = create_work_record_sync_service(library_client, clockify_client,
+                                                                               start_date, end_date,
+                                                                               ledger=self.ledger,
+                                                                               journal=self.journal,
+                                                                               prefetch=dry_run)
+                    if dry_run:
+                        details.append("work records: %d to import" % len(work_record_sync_service.work_records))
+                    else:
+                        results = work_record_sync_service.sync()
+                        saved = sum(result.status in SAVED_STATUSES for result in results)
+                        details.append("work records: %d of %d saved" % (saved, len(results)))
+                        if saved != len(results):
+                            return TeamSyncResult(member.library_user, False, ", ".join(details),
+                                                  time.perf_counter() - started)
+        except Exception as error:
+            details.append("failed: %r" % error)
+            return TeamSyncResult(member.library_user, False, ", ".join(details), time.perf_counter() - started)
+        return TeamSyncResult(member.library_user, succeeded, ", ".join(details), time.perf_counter() - started)
+
+    def create_clockify_client(self, member: TeamMember) -> ClockifyTimeEntryProvider:
+        """Clockify client for a team member's workspace, with the configured report, write and aggregation options"""
+        return create_clockify_client(self.config, api_key=member.clockify_api_key,
+                                      workspace_id=member.clockify_workspace_id)
+
+    @staticmethod
+    def show_summary(results: List[TeamSyncResult]) -> None:
+        """Show one line per team member and the overall outcome"""
+        for result in results:
+            print("%-20s %-6s %6.1fs  %s" % (result.library_user, "OK" if result.succeeded else "FAILED",
+                                             result.seconds, result.detail), flush=True)
+        failed = sum(not result.succeeded for result in results)
+        print("Team sync finished: %d succeeded, %d failed" % (len(results) - failed, failed), flush=True)
@@ -0,0 +1,61 @@
+import configparser
+import os
+import tempfile
+import unittest
+
+from time_entry_tools.import_journal import ImportJournal
+from time_entry_tools.team_sync import TeamMember, TeamSyncService
+from time_entry_tools.work_record_aggregation import AggregationRule, GRANULARITY_DAY, GRANULARITY_ENTRY, \
+    MATCH_PREFIX
+from time_entry_tools.work_record_ledger import WorkRecordLedger
+
+CONFIG = """
+[Library]
+server_url = http://127.0.0.1:9
+workitem_query = NOT HAS_VALUE:resolution
+lookup_cache = off
+
+[Clockify]
+workspace_id = team-lead-workspace
+api_key = team-lead-key
+report_window_days = 3
+report_workers = 2
+write_workers = 6
+stream_reports = no
+aggregation_rules =
+    prefix:WI-1=entry
+"""
+
+
+class TeamSyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = configparser.ConfigParser()
+        self.config.read_string(CONFIG)
+        self.ledger = WorkRecordLedger(os.path.join(self.directory.name, "ledger.db"))
+        self.journal = ImportJournal(os.path.join(self.directory.name, "journal.db"))
+        self.member = TeamMember("jdoe", "jdoe-workspace", "jdoe-key")
+        self.service = TeamSyncService(self.config, "team-lead", "password", [self.member], ledger=self.ledger,
+                                       journal=self.journal)
+
+    def tearDown(self):
+        self.ledger.close()
+        self.journal.close()
+        self.directory.cleanup()
+
+    def test_member_clockify_client_has_the_configured_options(self):
+        with self.service.create_clockify_client(self.member) as clockify_client:
+            self.assertEqual("jdoe-key", clockify_client.clockify_api_key)
+            self.assertEqual("jdoe-workspace", clockify_client.clockify_workspace_id)
+            self.assertEqual(3, clockify_client.report_window_days)
+            self.assertEqual(2, clockify_client.report_workers)
+            self.assertEqual(6, clockify_client.write_workers)
+            self.assertFalse(clockify_client.stream_reports)
+            self.assertEqual((AggregationRule(MATCH_PREFIX, "WI-1", GRANULARITY_ENTRY),),
+                             clockify_client.aggregator.rules)
+            self.assertEqual(GRANULARITY_ENTRY, clockify_client.aggregator.get_granularity("WI-1 - Design"))
+            self.assertEqual(GRANULARITY_DAY, clockify_client.aggregator.get_granularity("WI-2 - Sales"))
+
+
+if __name__ == '__main__':
+    unittest.main()
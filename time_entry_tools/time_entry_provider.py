@@ -1,9 +1,26 @@
 """Abstract Class for a Time Tracking Provider"""
 from abc import ABC, abstractmethod
+import asyncio
+from collections import namedtuple
+from functools import partial
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+SAVE_SUCCESS = "SUCCESS"
+SAVE_FAILED = "FAILED"
+SAVE_RETRY = "RETRY"  # Transient failure (connection/timeout), safe to try again
+SAVE_SKIPPED = "SKIPPED"  # Already present in the Time Tracking Provider, so not written again
+SAVED_STATUSES = (SAVE_SUCCESS, SAVE_SKIPPED)
+
+SaveResult = namedtuple("SaveResult", "work_record status error")
+
+DEFAULT_SAVE_BATCH_SIZE = 100
 
 
 class TimeEntryProvider(ABC):
-    """Abstract Class for a Time Tracking Provider"""
+    """Abstract Class for a Time Tracking Provider.
+    Providers implement get_work_records and save_work_records.  The streaming, batched and async variants have
+    default implementations on top of those, which providers override when they can do better."""
     @abstractmethod
     def get_work_records(self, start_date: str, end_date: str):
         """Return a list of WorkRecords"""
@@ -13,3 +30,31 @@ class TimeEntryProvider(ABC):
     def save_work_records(self, work_records: list):
         """Save the given WorkRecords to the Time Tracking Provider"""
         raise NotImplementedError
+
+    def iter_work_records(self, start_date: str, end_date: str) -> Iterator:
+        """Yield the WorkRecords between the dates.  By default they are all fetched first."""
+        return iter(self.get_work_records(start_date, end_date))
+
+    def save_work_records_in_batches(self, work_records: Iterable, batch_size: int = DEFAULT_SAVE_BATCH_SIZE) \
+            -> Iterator[SaveResult]:
+        """Save WorkRecords batch_size at a time, yielding one SaveResult per WorkRecord in the same order.
+        The WorkRecords may be a generator; each batch is saved as soon as it is complete.  A provider whose
+        save_work_records returns no results is taken to have saved the whole batch."""
+        work_records = iter(work_records)
+        while True:
+            batch = list(islice(work_records, batch_size))
+            if not batch:
+                return
+            results = self.save_work_records(batch)
+            if results is None:
+                results = [SaveResult(work_record, SAVE_SUCCESS, None) for work_record in batch]
+            yield from results
+
+    async def get_work_records_async(self, start_date: str, end_date: str) -> List:
+        """Asyncio variant of get_work_records.  By default it runs on a worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, partial(self.get_work_records, start_date, end_date))
+
+    async def save_work_records_async(self, work_records: list):
+        """Asyncio variant of save_work_records.  By default it runs on a worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(self.save_work_records, work_records))
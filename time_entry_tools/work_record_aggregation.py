@@ -0,0 +1,80 @@
+"""Rules deciding whether the time entries of a Clockify task are imported one by one or summed up per day"""
+from collections import namedtuple
+from typing import Dict, Iterable, List
+
+import pygtrie
+
+MATCH_PREFIX = "prefix"  # The task name starts with the pattern, e.g. a project's WorkItem id prefix
+MATCH_CONTAINS = "contains"  # The pattern is anywhere in the task name, e.g. a cost center
+GRANULARITY_ENTRY = "entry"  # One WorkRecord per time entry
+GRANULARITY_DAY = "day"  # One WorkRecord per task and day, with the time entry descriptions joined by ","
+
+AggregationRule = namedtuple("AggregationRule", "match pattern granularity")
+# Sales cost center WorkItems are not aggregated
+DEFAULT_AGGREGATION_RULES = (AggregationRule(MATCH_CONTAINS, "Sales", GRANULARITY_ENTRY),)
+
+
+class WorkRecordAggregator:
+    """Finds the granularity of a task from its name: that of the first rule matching it, else default_granularity.
+    The rules are compiled into one trie of prefixes and one of contained patterns, so matching a name takes time in
+    the length of the name and not in the number of rules.  Granularities are remembered per task name, as a report
+    has the same few tasks on every day."""
+
+    def __init__(self, rules: Iterable[AggregationRule] = DEFAULT_AGGREGATION_RULES,
+                 default_granularity: str = GRANULARITY_DAY):
+        self.rules = tuple(rules)
+        self.default_granularity = check_granularity(default_granularity)
+        self._prefixes = pygtrie.CharTrie()
+        self._contained = pygtrie.CharTrie()
+        for priority, rule in enumerate(self.rules):
+            check_granularity(rule.granularity)
+            if not rule.pattern:
+                raise ValueError("Aggregation rule %r has no pattern" % (rule,))
+            if rule.match == MATCH_PREFIX:
+                self._prefixes.setdefault(rule.pattern, priority)
+            elif rule.match == MATCH_CONTAINS:
+                self._contained.setdefault(rule.pattern, priority)
+            else:
+                raise ValueError("Aggregation rule %r must match %r or %r" % (rule, MATCH_PREFIX, MATCH_CONTAINS))
+        self._granularities: Dict[str, str] = {}
+
+    def get_granularity(self, task_name: str) -> str:
+        """Granularity of the WorkRecords of a task"""
+        granularity = self._granularities.get(task_name)
+        if granularity is None:
+            granularity = self._granularities[task_name] = self._match(task_name)
+        return granularity
+
+    def _match(self, task_name: str) -> str:
+        priorities = [priority for _, priority in self._prefixes.prefixes(task_name)]
+        if self._contained:
+            ## A contained pattern is a prefix of one of the suffixes of the name
+            for start in range(len(task_name)):
+                priorities.extend(priority for _, priority in self._contained.prefixes(task_name[start:]))
+        return self.rules[min(priorities)].granularity if priorities else self.default_granularity
+
+
+def check_granularity(granularity: str) -> str:
+    """The granularity, if it is a known one"""
+    if granularity not in (GRANULARITY_ENTRY, GRANULARITY_DAY):
+        raise ValueError("Unknown aggregation granularity %r, expected %r or %r"
+                         % (granularity, GRANULARITY_ENTRY, GRANULARITY_DAY))
+    return granularity
+
+
+def parse_aggregation_rules(text: str) -> List[AggregationRule]:
+    """Parse rules written one per line as <match>:<pattern>=<granularity>, e.g. "contains:Sales=entry"."""
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match, _, rest = line.partition(":")
+        pattern, separator, granularity = rest.rpartition("=")
+        if not separator:
+            raise ValueError("Aggregation rule %r is not written as <match>:<pattern>=<granularity>" % line)
+        rules.append(AggregationRule(match.strip(), pattern.strip(), granularity.strip()))
+    return rules
+
+
+DEFAULT_AGGREGATOR = WorkRecordAggregator()
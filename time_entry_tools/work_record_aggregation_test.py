@@ -0,0 +1,42 @@
+import unittest
+
+from time_entry_tools.clockify_time_entry_provider import ClockifyTimeEntryProvider
+from time_entry_tools.work_record_aggregation import AggregationRule, GRANULARITY_DAY, GRANULARITY_ENTRY, \
+    MATCH_CONTAINS, MATCH_PREFIX, WorkRecordAggregator, parse_aggregation_rules
+
+
+class WorkRecordAggregatorTestCase(unittest.TestCase):
+    def test_first_matching_rule_decides_the_granularity(self):
+        aggregator = WorkRecordAggregator([AggregationRule(MATCH_PREFIX, "WI-1", GRANULARITY_DAY),
+                                           AggregationRule(MATCH_CONTAINS, "Sales", GRANULARITY_ENTRY),
+                                           AggregationRule(MATCH_PREFIX, "WI-", GRANULARITY_ENTRY)])
+        self.assertEqual(GRANULARITY_DAY, aggregator.get_granularity("WI-12 Sales call"))
+        self.assertEqual(GRANULARITY_ENTRY, aggregator.get_granularity("WI-22 Sales call"))
+        self.assertEqual(GRANULARITY_ENTRY, aggregator.get_granularity("WI-22 Development"))
+        self.assertEqual(GRANULARITY_DAY, aggregator.get_granularity("XY-1 Development"))
+
+    def test_default_rules_keep_sales_entries_apart(self):
+        json_response = {"groupOne": [{"name": "2021-03-01", "children": [
+            {"name": "WI-1 Development", "duration": 5400,
+             "children": [{"name": "design", "duration": 1800}, {"name": "review", "duration": 3600}]},
+            {"name": "WI-2 Sales", "duration": 5400,
+             "children": [{"name": "call", "duration": 1800}, {"name": "offer", "duration": 3600}]}]}]}
+        work_records = [(record.work_item_id, record.time_spent, record.description) for record in
+                        ClockifyTimeEntryProvider.parse_clockify_response_for_work_records(json_response)]
+        self.assertEqual([("WI-1", 1.5, "design,review"), ("WI-2", 0.5, "call"), ("WI-2", 1.0, "offer")],
+                         work_records)
+
+    def test_rules_are_parsed_from_the_configuration(self):
+        self.assertEqual([AggregationRule(MATCH_PREFIX, "CC=1", GRANULARITY_ENTRY),
+                          AggregationRule(MATCH_CONTAINS, "Sales", GRANULARITY_DAY)],
+                         parse_aggregation_rules("\nprefix:CC=1=entry\n  contains:Sales = day\n"))
+        with self.assertRaises(ValueError):
+            parse_aggregation_rules("contains:Sales")
+        with self.assertRaises(ValueError):
+            WorkRecordAggregator(parse_aggregation_rules("suffix:Sales=entry"))
+        with self.assertRaises(ValueError):
+            WorkRecordAggregator(parse_aggregation_rules("contains:Sales=week"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Ledger of the work records already imported to the Library, so an import can be re-run without duplicating them"""
+from collections import Counter
+from datetime import datetime
+import hashlib
+import sqlite3
+import threading
+from typing import Iterable, List, Set, Tuple
+
+from time_entry_tools.local_storage import default_data_path
+from time_entry_tools.workrecord import WorkRecord, get_reconcile_keys
+
+DEFAULT_LEDGER_FILENAME = "work_record_ledger.db"
+LOOKUP_CHUNK_SIZE = 500  # Stay under SQLite's limit on the number of query parameters
+
+# (date, work item id, content hash)
+LedgerKey = Tuple[str, str, str]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS imported_work_records (
+    library_user TEXT NOT NULL,
+    date TEXT NOT NULL,
+    work_item_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    imported_at TEXT NOT NULL,
+    PRIMARY KEY (library_user, date, work_item_id, content_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS imported_work_records_by_hash ON imported_work_records (library_user, content_hash);
+"""
+_LOOKUP_QUERY = ("SELECT date, work_item_id, content_hash FROM imported_work_records "
+                 "WHERE library_user = ? AND content_hash IN (%s)")
+
+
+def get_ledger_keys(work_records: Iterable[WorkRecord], occurrences: Counter = None) -> List[LedgerKey]:
+    """Ledger key of every WorkRecord, in the same order.
+    The hash covers what is written to the Library: time spent as rounded for the Library and the comment.  Identical
+    records on the same day (e.g. two equal Sales entries) are numbered, so each one is imported.
+    Pass the same occurrences Counter for consecutive batches of one import, so the numbering continues."""
+    occurrences = Counter() if occurrences is None else occurrences
+    keys = []
+    for reconcile_key in get_reconcile_keys(work_records):
+        content = "\n".join(reconcile_key)
+        occurrences[content] += 1
+        content_hash = hashlib.sha256(("%s\n%d" % (content, occurrences[content])).encode("utf-8")).hexdigest()
+        keys.append((reconcile_key[0], reconcile_key[1], content_hash))
+    return keys
+
+
+class WorkRecordLedger:
+    """SQLite backed record of every WorkRecord imported to the Library, per Library user.
+    Lookups use the (library_user, content_hash) index, so they stay fast however long the history grows."""
+
+    def __init__(self, path: str = None):
+        self.path = path or default_data_path(DEFAULT_LEDGER_FILENAME)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the ledger database"""
+        self._connection.close()
+
+    def get_imported_keys(self, library_user: str, keys: Iterable[LedgerKey]) -> Set[LedgerKey]:
+        """The given keys that are already in the ledger, looked up LOOKUP_CHUNK_SIZE keys per query"""
+        keys = list(set(keys))
+        imported_keys = set()
+        with self._lock:
+            for chunk_start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+                chunk = keys[chunk_start:chunk_start + LOOKUP_CHUNK_SIZE]
+                rows = self._connection.execute(_LOOKUP_QUERY % ", ".join("?" * len(chunk)),
+                                                [library_user] + [key[2] for key in chunk]).fetchall()
+                imported_keys.update(rows)
+        ## The hash already covers the date and work item; comparing whole keys keeps the result exact regardless
+        return {key for key in keys if key in imported_keys}
+
+    def record_imported(self, library_user: str, keys: Iterable[LedgerKey], imported_at: datetime = None) -> None:
+        """Add the keys of WorkRecords that were saved to the Library"""
+        imported_at = (imported_at or datetime.now()).isoformat()
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO imported_work_records VALUES (?, ?, ?, ?, ?)",
+                                         ((library_user,) + key + (imported_at,) for key in keys))
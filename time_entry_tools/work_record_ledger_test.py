@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+
+from time_entry_tools.library_work_record_sync_service import LibraryWorkRecordSyncService
+from time_entry_tools.time_entry_provider import SaveResult, SAVE_FAILED, SAVE_SUCCESS
+from time_entry_tools.work_record_ledger import _LOOKUP_QUERY, WorkRecordLedger, get_ledger_keys
+from time_entry_tools.workrecord import WorkRecord
+
+
+class FakeClockifyClient:
+    def __init__(self, work_records):
+        self.work_records = work_records
+
+    def get_work_records(self, start_date, end_date):
+        return list(self.work_records)
+
+
+class FakeLibraryClient:
+    library_user = "jdoe"
+
+    def __init__(self, failing_work_item_ids=()):
+        self.failing_work_item_ids = failing_work_item_ids
+        self.saved = []
+
+    def get_work_records(self, start_date, end_date, work_item_ids=None):
+        return [work_record for work_record in self.saved if start_date[:10] <= work_record.date <= end_date[:10]
+                and (work_item_ids is None or work_record.work_item_id in work_item_ids)]
+
+    def save_work_records(self, work_records, on_result=None):
+        results = []
+        for index, work_record in enumerate(work_records):
+            if work_record.work_item_id in self.failing_work_item_ids:
+                results.append(SaveResult(work_record, SAVE_FAILED, "failed"))
+            else:
+                self.saved.append(work_record)
+                results.append(SaveResult(work_record, SAVE_SUCCESS, None))
+            if on_result is not None:
+                on_result(index, results[-1])
+        return results
+
+
+class WorkRecordLedgerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.ledger = WorkRecordLedger(os.path.join(self.directory.name, "ledger.db"))
+        self.work_records = [WorkRecord("2021-03-01", 1.0, "WI-1", "design"),
+                             WorkRecord("2021-03-01", 0.5, "WI-2 - Sales", "call"),
+                             WorkRecord("2021-03-01", 0.5, "WI-2 - Sales", "call"),
+                             WorkRecord("2021-03-02", 2.0, "WI-1", "design")]
+
+    def tearDown(self):
+        self.ledger.close()
+        self.directory.cleanup()
+
+    def sync(self, library_client, skip_imported=True):
+        service = LibraryWorkRecordSyncService(library_client, FakeClockifyClient(self.work_records), "start", "end",
+                                               self.ledger, skip_imported)
+        service.sync()
+        return service
+
+    def test_identical_records_get_distinct_keys(self):
+        keys = get_ledger_keys(self.work_records)
+        self.assertEqual(len(self.work_records), len(set(keys)))
+
+    def test_keys_are_looked_up_in_chunks(self):
+        work_records = [WorkRecord("2021-03-01", 0.25, "WI-%d" % index, "call") for index in range(1200)]
+        keys = get_ledger_keys(work_records)
+        self.ledger.record_imported("jdoe", keys[:700])
+        self.assertEqual(set(keys[:700]), self.ledger.get_imported_keys("jdoe", keys))
+        self.assertEqual(set(), self.ledger.get_imported_keys("asmith", keys))
+
+    def test_lookup_uses_the_content_hash_index(self):
+        plan = self.ledger._connection.execute("EXPLAIN QUERY PLAN " + _LOOKUP_QUERY % "?, ?",
+                                               ("jdoe", "hash-1", "hash-2")).fetchall()
+        details = " ".join(row[-1] for row in plan)
+        self.assertIn("INDEX imported_work_records_by_hash (library_user=? AND content_hash=?)", details)
+
+    def test_second_import_skips_everything(self):
+        self.sync(FakeLibraryClient())
+        library_client = FakeLibraryClient()
+        service = self.sync(library_client)
+        self.assertEqual([], library_client.saved)
+        self.assertEqual(4, len(service.skipped_work_records))
+
+    def test_failed_records_are_imported_on_the_next_run(self):
+        self.sync(FakeLibraryClient(failing_work_item_ids=("WI-1",)))
+        library_client = FakeLibraryClient()
+        self.sync(library_client)
+        self.assertEqual([("2021-03-01", "WI-1"), ("2021-03-02", "WI-1")],
+                         [(work_record.date, work_record.work_item_id) for work_record in library_client.saved])
+
+    def test_changed_record_is_imported_again(self):
+        self.sync(FakeLibraryClient())
+        self.work_records[0] = WorkRecord("2021-03-01", 1.5, "WI-1", "design")
+        library_client = FakeLibraryClient()
+        self.sync(library_client)
+        self.assertEqual([1.5], [work_record.time_spent for work_record in library_client.saved])
+
+    def test_skip_imported_false_imports_everything(self):
+        self.sync(FakeLibraryClient())
+        library_client = FakeLibraryClient()
+        self.sync(library_client, skip_imported=False)
+        self.assertEqual(4, len(library_client.saved))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,15 +1,54 @@
 """Class to represent a Work Record"""
-from fractions import Fraction
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+MINIMUM_HOURS = 0.25
+# np.round scales by 100 before rounding, which can land a value on the other side of a tie than Python's round does.
+# Values this close to a tie are rounded by Python instead, so both give identical results.
+_TIE_TOLERANCE = 1e-6
+# Library (Polarion) default working time units
+LIBRARY_HOURS_PER_UNIT = {"w": 40.0, "d": 8.0, "h": 1.0, "m": 1 / 60}
+# e.g. "2h", "1.25h", "1 1/2h", "3/4h", "1d 2h 30m"
+_LIBRARY_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)?\s*(?:(\d+)/(\d+))?\s*([wdhm])")
 
 
 def convert_to_hours(duration_seconds: float) -> float:
     """Convert seconds to hours"""
-    return max(round(duration_seconds / 3600, 2), 0.25)
+    return max(round(duration_seconds / 3600, 2), MINIMUM_HOURS)
 
 
 def round_hours_for_library(hour_duration: float) -> str:
     """Round the input to the nearest quarter hour.  Convert to String"""
-    return str(Fraction(round(hour_duration * 4) / 4)) + "h"
+    return str(round(hour_duration * 4) / 4) + "h"
+
+
+def parse_library_duration(duration: str) -> float:
+    """Convert a Library duration such as "1 1/2h" or "1d 2h 30m" to hours"""
+    parts = _LIBRARY_DURATION_PART.findall(duration.strip().lower())
+    if not parts or any(not whole and not numerator for whole, numerator, _, _ in parts):
+        raise ValueError("Unknown Library duration: %r" % duration)
+    return sum((float(whole or 0) + (int(numerator) / int(denominator) if numerator else 0.0)) *
+               LIBRARY_HOURS_PER_UNIT[unit] for whole, numerator, denominator, unit in parts)
+
+
+def convert_to_hours_batch(durations_seconds: Iterable[float]) -> np.ndarray:
+    """Convert many durations from seconds to hours at once.  Same results as convert_to_hours."""
+    hours = np.fromiter(durations_seconds, dtype=np.float64) / 3600
+    scaled = hours * 100
+    rounded = np.rint(scaled) / 100
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < _TIE_TOLERANCE
+    for index in np.flatnonzero(near_tie):
+        rounded[index] = round(float(hours[index]), 2)
+    return np.maximum(rounded, MINIMUM_HOURS)
+
+
+def round_hours_for_library_batch(hour_durations: Iterable[float]) -> List[str]:
+    """Round many durations to the nearest quarter hour at once.  Same results as round_hours_for_library."""
+    # np.rint rounds half to even like round(); adding 0.0 turns -0.0 into 0.0
+    quarters = np.rint(np.fromiter(hour_durations, dtype=np.float64) * 4) / 4 + 0.0
+    return [str(hours) + "h" for hours in quarters.tolist()]
 
 
 def get_workitem_id_from_task_name(task_name: str):
@@ -19,8 +58,59 @@ def get_workitem_id_from_task_name(task_name: str):
 
 class WorkRecord:
     """Class to represent a Work Record"""
+    __slots__ = ("date", "time_spent", "work_item_id", "description")
+
     def __init__(self, date: str, time_spent: float, work_item_id: str, description: str = None):
         self.date = date
         self.time_spent = time_spent
         self.work_item_id = work_item_id
         self.description = description
+
+
+def get_reconcile_keys(work_records: Iterable[WorkRecord]) -> List[Tuple[str, str, str, str]]:
+    """What makes two work records the same, for every WorkRecord in the same order: date, work item, time spent as
+    saved in the Library, and comment.  The time spent of all of them is rounded in one batch."""
+    work_records = list(work_records)
+    library_time_spent = round_hours_for_library_batch(work_record.time_spent for work_record in work_records)
+    return [(work_record.date, work_record.work_item_id, time_spent, work_record.description or "")
+            for work_record, time_spent in zip(work_records, library_time_spent)]
+
+
+class WorkRecordBatch:
+    """Array backed collection of WorkRecords, for processing many records at once.
+    Hours are kept in one NumPy array instead of a float object per record."""
+
+    def __init__(self, dates: List[str], time_spent: np.ndarray, work_item_ids: List[str],
+                 descriptions: List[str]):
+        self.dates = dates
+        self.time_spent = time_spent
+        self.work_item_ids = work_item_ids
+        self.descriptions = descriptions
+
+    @classmethod
+    def from_work_records(cls, work_records: Iterable[WorkRecord]) -> "WorkRecordBatch":
+        """Collect WorkRecords into a batch"""
+        work_records = list(work_records)
+        return cls([work_record.date for work_record in work_records],
+                   np.fromiter((work_record.time_spent for work_record in work_records), dtype=np.float64,
+                               count=len(work_records)),
+                   [work_record.work_item_id for work_record in work_records],
+                   [work_record.description for work_record in work_records])
+
+    @classmethod
+    def from_durations(cls, dates: List[str], durations_seconds: Iterable[float], work_item_ids: List[str],
+                       descriptions: List[str]) -> "WorkRecordBatch":
+        """Create a batch from Clockify durations in seconds"""
+        return cls(dates, convert_to_hours_batch(durations_seconds), work_item_ids, descriptions)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __iter__(self) -> Iterator[WorkRecord]:
+        for date, time_spent, work_item_id, description in zip(self.dates, self.time_spent.tolist(),
+                                                               self.work_item_ids, self.descriptions):
+            yield WorkRecord(date, time_spent, work_item_id, description)
+
+    def to_work_records(self) -> List[WorkRecord]:
+        """The batch as a list of WorkRecords"""
+        return list(self)
@@ -1,6 +1,7 @@
 import unittest
 
-from time_entry_tools.workrecord import round_hours_for_library
+from time_entry_tools.workrecord import round_hours_for_library, convert_to_hours, convert_to_hours_batch, \
+    round_hours_for_library_batch, WorkRecord, WorkRecordBatch, parse_library_duration
 
 
 class MyTestCase(unittest.TestCase):
@@ -53,5 +54,34 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual("0.0h", round_hours_for_library(0))
 
 
+class LibraryDurationTestCase(unittest.TestCase):
+    def test_parse_library_durations(self):
+        self.assertEqual([2.0, 1.25, 1.5, 0.75, 10.5],
+                         [parse_library_duration(duration) for duration in ("2h", "1.25h", "1 1/2h", "3/4h",
+                                                                            "1d 2h 30m")])
+
+    def test_parse_unknown_duration(self):
+        with self.assertRaises(ValueError):
+            parse_library_duration("soon")
+
+
+class BatchTestCase(unittest.TestCase):
+    def test_batch_conversion_matches_convert_to_hours(self):
+        durations = list(range(0, 200000, 7)) + [18, 3618, 5418, 9018]
+        self.assertEqual([convert_to_hours(duration) for duration in durations],
+                         convert_to_hours_batch(durations).tolist())
+
+    def test_batch_rounding_matches_round_hours_for_library(self):
+        hours = [1.0, 1.12, 1.13, 1.126, 1.125, 1.375, 7.31, -1, -0.1, 0, 234.68, 1.177777777777777777777777]
+        self.assertEqual([round_hours_for_library(hour) for hour in hours], round_hours_for_library_batch(hours))
+
+    def test_work_record_batch_round_trip(self):
+        work_records = [WorkRecord("2021-03-01", 1.13, "WI-1", "a"), WorkRecord("2021-03-02", 2.5, "WI-2", None)]
+        batch = WorkRecordBatch.from_work_records(work_records)
+        self.assertEqual([("2021-03-01", 1.13, "WI-1", "a"), ("2021-03-02", 2.5, "WI-2", None)],
+                         [(record.date, record.time_spent, record.work_item_id, record.description)
+                          for record in batch])
+
+
 if __name__ == '__main__':
     unittest.main()